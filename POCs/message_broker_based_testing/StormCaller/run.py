@@ -0,0 +1,18 @@
+import sys
+
+from storm_test.storm import StormTestRunner, StormTestSuite
+from storm_test.storm_distributed import StormKafkaBroker
+
+"""
+Coordinator of a distributed run.  Publishes the suites' test methods to the remote workers started with
+event_handler.py and reports their results as they stream back.
+"""
+
+if __name__ == '__main__':
+    bootstrap_servers = sys.argv[1] if len(sys.argv) > 1 else "localhost:29092"
+    StormTestRunner(
+        test_suites=[StormTestSuite("Distributed", test_dir="tests")],
+        backend="distributed",
+        broker=StormKafkaBroker({"bootstrap.servers": bootstrap_servers}),
+        max_workers=12,
+    ).run_tests()
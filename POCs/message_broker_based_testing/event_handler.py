@@ -1,41 +1,20 @@
-import asyncio
+import logging
+import sys
 
-import faust
-
-from test_runner_utils import handle_test_request
-
-app = faust.App('Storm', broker='kafka://localhost:29092')
-
-
-class TestRequest(faust.Record):
-    run_name: str
-    run_id: int
-    test_params: dict
-
-class TestResponse(TestRequest):
-    run_name: str
-    run_id: int
-    test_params: dict
-    success: bool
-
-test_request_topic = topic = app.topic("storm_test.request", value_type=TestRequest)
-
-@app.agent(test_request_topic)
-async def run_test(requests):
-    async for request in requests:
-        await handle_test_request(
-            request.run_name,
-            request.run_id,
-            request.test_params
-        )
+from storm_test.storm_distributed import StormKafkaBroker, StormRemoteWorker
 
+"""
+Remote storm worker.  Takes work requests off the storm_test.request topic, runs them on a local process pool and
+streams the results back on storm_test.result.  Start one per machine, and run the suites from a coordinator with
+StormTestRunner(backend="distributed", broker=StormKafkaBroker(...)), see StormCaller/run.py.
+"""
 
 if __name__ == '__main__':
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(app.start())
+    logging.basicConfig(level=logging.INFO)
+    bootstrap_servers = sys.argv[1] if len(sys.argv) > 1 else "localhost:29092"
+    worker = StormRemoteWorker(StormKafkaBroker({"bootstrap.servers": bootstrap_servers}))
     try:
-        loop.run_forever()
+        worker.run()
     except KeyboardInterrupt:
-        print("Shutting down Faust worker...")
-    finally:
-        loop.run_until_complete(app.stop())
+        print("Shutting down storm worker...")
+        worker.stop()
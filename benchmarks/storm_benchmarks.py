@@ -0,0 +1,328 @@
+"""
+Benchmarks of the framework's own overhead, measured with synthetic no-op tests.  Every metric is a cost, so lower is
+better: a per-test or per-step time, a collection or decision matrix time, or a pickled result size.
+
+    python -m benchmarks.storm_benchmarks --output bench.json
+    python -m benchmarks.storm_benchmarks --save-baseline
+    python -m benchmarks.storm_benchmarks --baseline benchmarks/baseline.json --threshold 0.25
+
+Results are compared against the baseline, and the run exits with status 1 if any metric regressed by more than the
+threshold.  Timings only compare on like hardware, so no baseline is committed with the repository: the first run on a
+machine, finding none at ``--baseline``, records itself as the baseline and says so, and later runs compare against
+it.  Record one explicitly with ``--save-baseline``, on the machine class the comparison runs on.
+"""
+import argparse
+import datetime
+import json
+import os
+import pickle
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+from storm_test.storm import (
+    StormTest,
+    StormTestObject,
+    StormTestResult,
+    StormTestSuite,
+    multiprocess_runner,
+    test_case,
+)
+from storm_test.storm_bdd import StormBehaviorDrivenTest, StormTestStepObject, given, then, when
+from storm_test.storm_collection import StormCollectionIndex
+from storm_test.storm_reporters import StormReporter
+from storm_test.storm_scheduler import StormExecutionBackend, create_pool
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+NO_OP_TESTS = 200
+VALIDATE_STEPS = 1000
+
+
+class BenchNoOpTest(StormTest):
+    """
+    ``NO_OP_TESTS`` test cases that do nothing, so everything measured is the framework's.
+    """
+
+
+for _index in range(NO_OP_TESTS):
+    setattr(BenchNoOpTest, f"test_{_index:03d}", test_case(lambda self: None))
+
+
+class BenchValidateTest(StormTest):
+    @test_case
+    def validate_many(self):
+        for _ in range(VALIDATE_STEPS):
+            self.validate("step", True)
+
+    @test_case
+    def validate_none(self):
+        pass
+
+
+class _SilentReporter(StormReporter):
+    def before_run(self, *args, **kwargs):
+        pass
+
+    def after_run(self, *args, **kwargs):
+        pass
+
+    def before_test(self, *args, **kwargs):
+        pass
+
+    def after_test(self, *args, **kwargs):
+        pass
+
+    def before_step(self, *args, **kwargs):
+        pass
+
+    def after_step(self, *args, **kwargs):
+        pass
+
+
+def _best(func, repeat: int) -> float:
+    """
+    Fastest of ``repeat`` runs of ``func`` in seconds.  The fastest run is the one least disturbed by the rest of the
+    machine, so it is the most repeatable.
+    """
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def _decision_matrix_class(givens: int, whens: int, thens: int) -> type:
+    steps = {}
+    for decorator, prefix, count in ((given, "given", givens), (when, "when", whens), (then, "then", thens)):
+        for index in range(count):
+            steps[f"{prefix}_{index}"] = decorator(lambda self, data: data)
+    return type(f"BenchMatrix{givens}x{whens}x{thens}", (StormBehaviorDrivenTest,), steps)
+
+
+def _write_test_modules(directory: Path, count: int, tests_per_class: int = 10):
+    for index in range(count):
+        methods = "".join(
+            f"    @test_case\n    def test_{method}(self):\n        pass\n\n" for method in range(tests_per_class)
+        )
+        (directory / f"bench_{index:04d}_test.py").write_text(
+            "from storm_test.storm import StormTest, test_case\n\n\n"
+            f"class BenchCollected{index:04d}(StormTest):\n{methods}"
+        )
+
+
+class StormBenchmarks:
+    """
+    Runs the overhead benchmarks.
+
+    :param repeat:          Runs per measurement, the fastest one counts
+    :param max_workers:     Largest worker count of the scaling benchmark, defaults to the CPU count
+    :param quick:           Fewer and smaller sizes, for a fast sanity check rather than numbers to compare
+    """
+
+    def __init__(self, repeat: int = 5, max_workers: int = None, quick: bool = False):
+        self.repeat = repeat
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.quick = quick
+        self.results = {}
+
+    def record(self, name: str, value: float, unit: str):
+        self.results[name] = {"value": value, "unit": unit}
+        print(f"{name:<55} {value:>14.3f} {unit}", flush=True)
+
+    def bench_test_run(self):
+        """
+        Per-test cost of StormTest.run on no-op test cases, set_up and tear_down of the class included.
+        """
+        seconds = _best(BenchNoOpTest.run, self.repeat)
+        self.record("storm_test.run.per_test", seconds / NO_OP_TESTS * 1e6, "us")
+
+    def bench_validate(self):
+        """
+        Per-step cost of validate, over the cost of running a test that doesn't validate.
+        """
+        test_class = BenchValidateTest()
+        with_steps = _best(lambda: test_class._run_test_method("validate_many"), self.repeat)
+        without_steps = _best(lambda: test_class._run_test_method("validate_none"), self.repeat)
+        self.record("storm_test.validate.per_step", max(0.0, with_steps - without_steps) / VALIDATE_STEPS * 1e6, "us")
+
+    def bench_bdd_step(self):
+        """
+        Per-step cost of the BDD step runner on a no-op step.
+        """
+        test_class = _decision_matrix_class(1, 1, 1)
+        step = StormTestStepObject(name="GIVEN no op", method=lambda data: data, status=StormTestResult.NOT_RUN)
+        steps = 10_000 if not self.quick else 1000
+
+        def run_steps():
+            for _ in range(steps):
+                test_class._run_step(step)
+
+        self.record("bdd.run_step.per_step", _best(run_steps, self.repeat) / steps * 1e6, "us")
+
+    def bench_collection(self):
+        """
+        Collection time against the number of test modules, cold with an empty index and warm from the index.
+        """
+        for count in (10, 50) if self.quick else (10, 100, 500):
+            with tempfile.TemporaryDirectory() as directory:
+                directory = Path(directory)
+                test_dir = directory / f"bench_collection_{count}"
+                test_dir.mkdir()
+                _write_test_modules(test_dir, count)
+                index_path = directory / "collection.json"
+                # Only the first discovery imports the modules, so the cold time is measured once
+                start = time.perf_counter()
+                StormTestSuite("bench", test_dir=test_dir, collection_index=StormCollectionIndex(index_path))
+                cold = time.perf_counter() - start
+                warm = _best(
+                    lambda: StormTestSuite(
+                        "bench", test_dir=test_dir, collection_index=StormCollectionIndex(index_path)
+                    ),
+                    self.repeat,
+                )
+                for module in [name for name in sys.modules if name.startswith("bench_")]:
+                    del sys.modules[module]
+                if str(test_dir) in sys.path:
+                    sys.path.remove(str(test_dir))
+            self.record(f"collection.modules_{count}.cold", cold * 1e3, "ms")
+            self.record(f"collection.modules_{count}.warm", warm * 1e3, "ms")
+
+    def bench_runner_scaling(self):
+        """
+        Per-test wall time of multiprocess_runner on a warm process pool, from one worker up to ``max_workers``.
+        With no-op tests this is the scheduling and result-passing cost, so it shows how far the parent keeps up.
+        """
+        # Powers of two up to max_workers, and max_workers itself
+        powers = (2 ** power for power in range(self.max_workers.bit_length()))
+        worker_counts = sorted({*powers, self.max_workers})
+        for workers in worker_counts:
+            with create_pool(StormExecutionBackend.PROCESS, max_workers=workers) as pool:
+                # The first batch pays for the imports, only warm batches are measured
+                multiprocess_runner([BenchNoOpTest], pool=pool, reporting=_SilentReporter())
+                seconds = _best(
+                    lambda: multiprocess_runner([BenchNoOpTest], pool=pool, reporting=_SilentReporter()),
+                    self.repeat,
+                )
+            self.record(f"multiprocess_runner.workers_{workers}.per_test", seconds / NO_OP_TESTS * 1e6, "us")
+
+    def bench_result_pickling(self):
+        """
+        Pickled size and pickling time of one test result against the number of steps it validated.
+        """
+        for step_count in (0, 10, 100) if self.quick else (0, 10, 100, 1000):
+            test_object = StormTestObject(
+                name="bench result",
+                method=None,
+                status=StormTestResult.PASS,
+                steps=[{f"step {index}": StormTestResult.PASS} for index in range(step_count)],
+                duration=0.001,
+            )
+            record = test_object.to_record()
+            size = len(pickle.dumps(record))
+            pickles = 1000
+            seconds = _best(lambda: [pickle.dumps(test_object.to_record()) for _ in range(pickles)], self.repeat)
+            self.record(f"result_pickling.steps_{step_count}.bytes", size, "bytes")
+            self.record(f"result_pickling.steps_{step_count}.time", seconds / pickles * 1e6, "us")
+
+    def bench_decision_matrix(self):
+        """
+        run_decision_matrix time against the number of GIVEN, WHEN and THEN steps, each of them a no-op.
+        """
+        for size in (2, 5) if self.quick else (2, 5, 10, 20):
+            test_class = _decision_matrix_class(size, size, size)
+            seconds = _best(test_class.run_decision_matrix, self.repeat)
+            self.record(f"bdd.run_decision_matrix.steps_{size}x{size}x{size}", seconds * 1e3, "ms")
+
+    def run(self) -> dict:
+        for benchmark in (
+                self.bench_test_run,
+                self.bench_validate,
+                self.bench_bdd_step,
+                self.bench_collection,
+                self.bench_runner_scaling,
+                self.bench_result_pickling,
+                self.bench_decision_matrix,
+        ):
+            benchmark()
+        return {
+            "meta": {
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "repeat": self.repeat,
+                "quick": self.quick,
+            },
+            "results": self.results,
+        }
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.25) -> list[dict]:
+    """
+    Compares benchmark results against a baseline.  Metrics missing from either side are skipped.
+
+    :param results:     Output of StormBenchmarks.run
+    :param baseline:    Earlier output to compare against
+    :param threshold:   Relative increase over the baseline that counts as a regression, 0.25 for 25%
+    :return:            One entry per compared metric, with its ratio to the baseline and whether it regressed
+    """
+    comparison = []
+    for name, current in results["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        ratio = current["value"] / previous["value"] if previous["value"] else None
+        comparison.append({
+            "name": name,
+            "baseline": previous["value"],
+            "current": current["value"],
+            "unit": current["unit"],
+            "ratio": ratio,
+            "regressed": ratio is not None and ratio > 1 + threshold,
+        })
+    return comparison
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the storm framework's own overhead")
+    parser.add_argument("--output", "-o", default="storm_benchmarks.json", help="Result file to write")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Relative slowdown that fails the run")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, the fastest one counts")
+    parser.add_argument("--max-workers", type=int, help="Largest worker count to scale to")
+    parser.add_argument("--quick", action="store_true", help="Fewer and smaller sizes")
+    args = parser.parse_args(argv)
+
+    results = StormBenchmarks(args.repeat, args.max_workers, args.quick).run()
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline or not baseline_path.exists():
+        if not args.save_baseline:
+            print(f"No baseline at {baseline_path}, recording this run as the baseline.  Nothing was compared")
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+
+    with open(baseline_path, "r") as f:
+        comparison = compare(results, json.load(f), args.threshold)
+    regressions = [entry for entry in comparison if entry["regressed"]]
+    ratios = [entry["ratio"] for entry in comparison if entry["ratio"]]
+    print(f"Compared {len(comparison)} metrics with {baseline_path}, median ratio "
+          f"{statistics.median(ratios) if ratios else 1.0:.2f}")
+    for entry in regressions:
+        print(
+            f"REGRESSION {entry['name']}: {entry['baseline']:.3f} -> {entry['current']:.3f} {entry['unit']} "
+            f"({entry['ratio']:.2f}x)"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
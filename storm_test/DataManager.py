@@ -4,19 +4,21 @@ import logging
 import os
 import shutil
 import uuid
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from os import PathLike
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class StormTestData:
-    correlation_id: uuid.UUID = uuid.uuid4()
+    correlation_id: uuid.UUID = field(default_factory=uuid.uuid4)
     csv_path: Path | str = None
     json_path: Path | str = None
     backup_path: Path | str = os.path.join(os.getcwd(), 'backups')
-    csv_row_data = []
+    csv_row_data: list = field(default_factory=list)
 
     def add_test_data(self, test_data: dict | object):
         """
@@ -36,9 +38,9 @@ class StormTestData:
             self.add_test_data(test_data)
 
     def add_csv_test_data(self, path: Path, key:str = None):
-        logging.info(f"Adding test data from {path}")
+        logger.info(f"Adding test data from {path}")
         if self.csv_path is not None:
-            logging.warning(f"Overwriting test data from {self.csv_path}.  This will overwrite existing test data.\n"
+            logger.warning(f"Overwriting test data from {self.csv_path}.  This will overwrite existing test data.\n"
                             f"It is recommended to create a new class instance rather than overwriting.")
         self.csv_path = path
         with open(path, "r") as f:
@@ -50,15 +52,15 @@ class StormTestData:
                     if getattr(self, key, False):
                         duplicates += 1
                         new_key = f"{key}_{str(duplicates)}"
-                        logging.warning(f"Duplicate key found.  Adding data as {new_key}.")
+                        logger.warning(f"Duplicate key found.  Adding data as {new_key}.")
                         class_instance.add_test_data(row)
                         setattr(self, new_key, class_instance)
                     class_instance.add_test_data(row)
                     setattr(self, key, class_instance)
                 elif key is not None:
-                    logging.warning(f"{key} is not a valid header value in {path}. Data is added to csv_row_data")
+                    logger.warning(f"{key} is not a valid header value in {path}. Data is added to csv_row_data")
                 else:
-                    logging.info(f"No key provided, adding test data to csv_row_data")
+                    logger.info(f"No key provided, adding test data to csv_row_data")
                 self.csv_row_data.append(class_instance)
 
     def update_csv_test_data(self):
@@ -69,7 +71,7 @@ class StormTestData:
             shutil.copy(self.csv_path, self.backup_path)
         except FileNotFoundError:
             self.csv_path = os.path.join(root, f"StormTestData_{datetime.now()}.csv")
-            logging.error(f"Could not find {self.csv_path}.  Writing new file")
+            logger.error(f"Could not find {self.csv_path}.  Writing new file")
         with open(self.csv_path, "w") as csv_file:
             class_dict = self.__dict__.copy()
             class_dict.pop("__class__")
@@ -86,7 +88,7 @@ class StormTestData:
             shutil.copy(self.json_path, self.backup_path)
         except FileNotFoundError:
             self.json_path = os.path.join(root, f"StormTestData_{datetime.now()}.json")
-            logging.error(f"Could not find {self.json_path}.  Writing new file")
+            logger.error(f"Could not find {self.json_path}.  Writing new file")
         with open(self.json_path, "r") as json_file:
             class_dict = self.__dict__.copy()
             class_dict.pop("__class__")
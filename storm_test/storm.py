@@ -1,18 +1,56 @@
+import asyncio
 import dataclasses
 import datetime
+import functools
 import importlib
 import inspect
 import logging
 import os
+import time
+import types
 from abc import abstractmethod
-from concurrent.futures import ProcessPoolExecutor, wait
+from contextvars import ContextVar
 from dataclasses import dataclass
 from enum import Enum
 from os import PathLike
 from pathlib import Path
-from typing import Callable, Type
+from typing import Callable, Iterator, Type
 
-from storm_test.storm_reporters import StormReporter
+from storm_test.storm_collection import StormCollectedClass, StormCollectionIndex
+from storm_test.storm_distributed import StormBroker
+from storm_test.storm_fixtures import StormFixtureScope, StormFixtureSet, StormFixtureValues, get_fixture
+from storm_test.storm_logging import StormLogConfig, StormLogListener, begin_test_log, end_test_log
+from storm_test.storm_memory import StormMemoryPolicy, StormMemoryTracker, StormMemoryUsage
+from storm_test.storm_profiling import StormProfiler, StormProfileStats
+from storm_test.storm_reporters import StormConsoleReporter, StormReporter
+from storm_test.storm_retry import StormQuarantine, StormRetryPolicy
+from storm_test.storm_rows import StormRowSource
+from storm_test.storm_scheduler import (
+    StormBatchOptions,
+    StormExecutionBackend,
+    StormWorkerMessage,
+    StormWorkerPool,
+    StormWorkItem,
+    StormWorkStealingScheduler,
+    create_pool,
+)
+from storm_test.storm_selection import StormChangeSelector
+from storm_test.storm_sharding import StormShard, write_results
+from storm_test.storm_timings import StormTimingCache
+from storm_test.storm_tracing import StormTrace, StormTraceBuffer, active_trace, record_step, start_steps
+
+logger = logging.getLogger(__name__)
+
+
+# Steps recorded by validate() for the test that is currently running.  A context variable rather than the class-level
+# list, so concurrently running async tests each collect their own steps.
+_current_test_steps: ContextVar[list | None] = ContextVar("_current_test_steps", default=None)
+
+
+async def _maybe_await(result):
+    if inspect.isawaitable(result):
+        return await result
+    return result
 
 
 class StormTestResult(Enum):
@@ -37,6 +75,9 @@ class StormTestStepObject:
     status: StormTestResult
     return_data = None
     error: str = None
+    # Epoch seconds the step started at, and how long it ran
+    start: float = None
+    duration: float = None
 
 
 @dataclass
@@ -46,6 +87,184 @@ class StormTestObject:
     status: StormTestResult
     error: str = None
     steps: list[StormTestStepObject] = None
+    duration: float = None
+    # Epoch seconds the test started at
+    start: float = None
+    # Raw cProfile stats of the test when profiling, merged by the worker rather than sent with the record
+    profile: dict = None
+    memory: StormMemoryUsage = None
+    # Identifies the test's records in the log, and the records themselves when captured.  See storm_test.storm_logging
+    correlation_id: str = None
+    logs: list[str] = None
+
+    def to_record(self) -> "StormTestRecord":
+        return StormTestRecord.from_test_object(self)
+
+
+_STATUSES = list(StormTestResult)
+_STATUS_CODES = {status: code for code, status in enumerate(_STATUSES)}
+
+
+class StormTestRecord:
+    """
+    Compact result of one test method, and the only thing a worker sends back for it.  Holds no reference to the test
+    instance or its methods: the status is stored as its enum code and each step as a (name, status code, fail
+    message) tuple.  Passed steps beyond ``max_steps`` are counted rather than kept, failed ones are kept up to
+    ``max_steps`` more, errors are cut at ``max_error_length`` and captured logs at ``max_log_lines``.  A result stays
+    bounded however much a test validates or logs.
+
+    Exposes the ``name``, ``status``, ``error``, ``steps``, ``start``, ``duration``, ``memory``, ``correlation_id``
+    and ``logs`` of StormTestObject, so reporters take either.
+    """
+
+    __slots__ = (
+        "name", "status_code", "duration", "error", "step_data", "dropped_steps", "attempts", "quarantined", "memory",
+        "start", "correlation_id", "logs",
+    )
+
+    max_steps = 100
+    max_error_length = 2000
+    max_log_lines = 200
+    method = None
+
+    def __init__(
+            self,
+            name: str,
+            status_code: int,
+            duration: float = None,
+            error: str = None,
+            step_data: tuple = (),
+            dropped_steps: int = 0,
+            attempts: list["StormTestRecord"] = None,
+            quarantined: bool = False,
+            memory: StormMemoryUsage = None,
+            start: float = None,
+            correlation_id: str = None,
+            logs: tuple[str, ...] = None,
+    ):
+        self.name = name
+        self.status_code = status_code
+        self.duration = duration
+        self.error = error
+        self.step_data = step_data
+        self.dropped_steps = dropped_steps
+        # Earlier failed attempts of a retried test, oldest first.  The record itself holds the last attempt
+        self.attempts = attempts
+        # A quarantined test's failure does not fail its class, see storm_test.storm_retry
+        self.quarantined = quarantined
+        # Memory use of the test when run with a memory policy, see storm_test.storm_memory
+        self.memory = memory
+        self.start = start
+        self.correlation_id = correlation_id
+        self.logs = logs
+
+    def __reduce__(self):
+        # Positional arguments only, the default slots pickling repeats every attribute name in every result
+        return StormTestRecord, (
+            self.name,
+            self.status_code,
+            self.duration,
+            self.error,
+            self.step_data,
+            self.dropped_steps,
+            self.attempts,
+            self.quarantined,
+            self.memory,
+            self.start,
+            self.correlation_id,
+            self.logs,
+        )
+
+    def __repr__(self):
+        return f"StormTestRecord(name={self.name!r}, status={self.status.value}, error={self.error!r})"
+
+    @classmethod
+    def create(cls, name: str, status: StormTestResult, error: str = None) -> "StormTestRecord":
+        return cls(name, _STATUS_CODES[status], error=cls._bounded_error(error))
+
+    @classmethod
+    def from_test_object(cls, test_object: StormTestObject) -> "StormTestRecord":
+        step_data = []
+        dropped_steps = 0
+        for step in test_object.steps or []:
+            for step_name, step_status in step.items():
+                message = None
+                if isinstance(step_status, dict):
+                    step_status, message = next(iter(step_status.items()))
+                # Past the bound only failed steps are kept, up to as many again
+                if len(step_data) >= cls.max_steps and (
+                        step_status != StormTestResult.FAIL or len(step_data) >= 2 * cls.max_steps
+                ):
+                    dropped_steps += 1
+                    continue
+                step_data.append((step_name, _STATUS_CODES[step_status], cls._bounded_error(message)))
+        return cls(
+            test_object.name,
+            _STATUS_CODES[test_object.status],
+            test_object.duration,
+            cls._bounded_error(test_object.error),
+            tuple(step_data),
+            dropped_steps,
+            memory=test_object.memory,
+            start=test_object.start,
+            correlation_id=test_object.correlation_id,
+            logs=cls._bounded_logs(test_object.logs),
+        )
+
+    @classmethod
+    def _bounded_error(cls, error: str | None) -> str | None:
+        if error is None or len(error) <= cls.max_error_length:
+            return error
+        return f"{error[:cls.max_error_length]}... ({len(error) - cls.max_error_length} more characters)"
+
+    @classmethod
+    def _bounded_logs(cls, logs: list[str] | None) -> tuple[str, ...] | None:
+        if not logs:
+            return None
+        if len(logs) <= cls.max_log_lines:
+            return tuple(logs)
+        return (*logs[:cls.max_log_lines], f"... ({len(logs) - cls.max_log_lines} more lines)")
+
+    @property
+    def status(self) -> StormTestResult:
+        return _STATUSES[self.status_code]
+
+    @property
+    def steps(self) -> list[dict] | None:
+        """
+        The steps in the ``{name: status}`` / ``{name: {FAIL: message}}`` form validate() records them in.
+        """
+        if not self.step_data:
+            return None
+        return [
+            {step_name: _STATUSES[code] if message is None else {_STATUSES[code]: message}}
+            for step_name, code, message in self.step_data
+        ]
+
+
+@dataclass
+class StormClassResult:
+    name: str
+    test_status: StormTestResult = StormTestResult.NOT_RUN
+    test_object: list[StormTestRecord] = dataclasses.field(default_factory=list)
+    # Passed rows of streamed tests that don't keep passed results, counted instead, see StormRowSource
+    passed_rows: int = 0
+    # Module and qualified name of the class, unlike the name unique in a run
+    key: str = None
+
+    def update_status(self, class_failed: bool = False):
+        statuses = {
+            test_object.status for test_object in self.test_object
+            if not (test_object.quarantined and test_object.status == StormTestResult.FAIL)
+        }
+        if class_failed or StormTestResult.FAIL in statuses:
+            self.test_status = StormTestResult.FAIL
+        elif statuses == {StormTestResult.SKIPPED}:
+            self.test_status = StormTestResult.SKIPPED
+        elif statuses <= {StormTestResult.PASS, StormTestResult.SKIPPED}:
+            self.test_status = StormTestResult.PASS
+        else:
+            self.test_status = StormTestResult.NOT_RUN
 
 
 @dataclass
@@ -68,21 +287,64 @@ def test_case(func, dep: Callable = None):
     return func
 
 
-def iter_test_case(func, dep: Callable = None, iter_object: list[dict] = None):
+def _iterated_test_case(func: Callable, test_object, index: int) -> Callable:
+    # A function per row rather than a closure in the loop, so each one keeps its own row
+    if inspect.iscoroutinefunction(func):
+        async def iterated_test_case(self):
+            return await func(self, test_object)
+    else:
+        def iterated_test_case(self):
+            return func(self, test_object)
+
+    iterated_test_case.__name__ = f"{func.__name__} - {index}"
+    return test_case(iterated_test_case)
+
+
+def iter_test_case(func=None, dep: Callable = None, iter_object: list[dict] = None):
+    """
+    Runs a test case once for every item of ``iter_object``, which is passed to it.  The items are held from import
+    on, use stream_test_case for data sets too large for that.  Also usable as ``@iter_test_case(iter_object=...)``.
+    """
+    if func is None:
+        return functools.partial(iter_test_case, dep=dep, iter_object=iter_object)
     func._dependency = dep
     func._iter_test_case = True
-    func.test_funcs = []
-    if iter_object:
-        for test_object in iter_object:
-            @test_case
-            def iterated_test_case():
-                iterated_test_case.__name__ = f"{func.__name__} - {object.__name__}"
-                func(test_object)
-
-            func.test_funcs.append(iterated_test_case)
+    func.test_funcs = [
+        _iterated_test_case(func, test_object, index) for index, test_object in enumerate(iter_object or [])
+    ]
     return func
 
-    # test_funcs.append(iterated_test_case)
+
+def stream_test_case(source: StormRowSource, dep: Callable = None):
+    """
+    Runs a test case once for every row of ``source``, which is passed to it, e.g.
+    ``@stream_test_case(StormCsvRows("orders.csv", id_field="order_id"))``.  Rows are read in batches by the workers
+    as they run them, never all at once, see storm_test.storm_rows.  Each row is reported as a test of its own.
+    """
+    def decorator(func):
+        func._dependency = dep
+        func._row_source = source
+        return func
+
+    return decorator
+
+
+def timeout(seconds: float):
+    """
+    Hard time limit for a test case, or for every test case of a StormTest class when applied to the class.  A sync
+    test that runs past it has its worker process killed and replaced, and is marked FAIL.  Async tests are cancelled
+    on the worker's event loop instead.
+
+    :param seconds:     Time limit of each test case, set_up_each and tear_down_each included
+    """
+    def decorator(target):
+        if inspect.isclass(target):
+            target.timeout = seconds
+        else:
+            target._timeout = seconds
+        return target
+
+    return decorator
 
 
 def set_up(func):
@@ -107,14 +369,20 @@ def teardown_each(func):
 
 class StormTest:
     _test_data = dict()
-    _test_steps = []
     scenario: Scenario or [Scenario] or None = None
     preconditions = None
     postconditions = None
     test_id = None
-    test_object: list[StormTestObject] = []
+    # Results of run(), set per instance so finished runs don't pile up on the class
+    test_object: list[StormTestRecord] = None
     test_status: StormTestResult = StormTestResult.NOT_RUN
     name = None
+    # How many async test cases of this class may run at the same time on one worker
+    async_concurrency = 10
+    # Time limit in seconds of each test case of this class, see the timeout decorator
+    timeout: float = None
+    # Merged profile of the test cases when run() is asked to profile them
+    profile_stats: StormProfileStats = None
 
     @classmethod
     def set_up(cls):
@@ -132,55 +400,296 @@ class StormTest:
     def tear_down_each(cls):
         pass
 
+    @staticmethod
+    def fixture(name: str):
+        """
+        Returns the value of a session or suite fixture, see storm_test.storm_fixtures.
+        """
+        return get_fixture(name)
+
     @classmethod
-    def run(cls, test_data=None):
-        test_class = cls()
-        test_class.name = cls.__name__
-        logging.info(f"Running test item: {cls.__name__}")
-        test_class.test_status = StormTestResult.IN_PROGRESS
-        for name, method in inspect.getmembers(test_class, inspect.ismethod):
-            name_string = name.replace("_", " ")
-            if hasattr(method, "_test_case"):
-                test_object = StormTestObject(
-                    name=name_string,
-                    method=method,
-                    status=StormTestResult.NOT_RUN,
-                )
-                test_class.test_object.append(test_object)
-            if hasattr(method, "_iter_test_case"):
-                iter_tests = getattr(method, "test_funcs", method)
-                for test in iter_tests:
-                    test_object = StormTestObject(
-                        name=test.__name__.replace("_", " "),
-                        method=test,
-                        status=StormTestResult.NOT_RUN,
-                    )
-                    test_class.test_object.append(test_object)
-        try:
-            test_class.set_up()
-        except Exception as e:
-            logging.error("Test setup failed.  Reason: %s", e)
-            test_class.test_status = StormTestResult.FAIL
-        for test_object in cls.test_object:
+    def collect_test_methods(cls) -> list[tuple[str, int | None]]:
+        """
+        Lists the test methods of the class as (method name, iteration index) pairs, without instantiating it.
+        The iteration index is None for plain and streamed test cases, the rows of a streamed one are only listed
+        when it is run.  The scan runs once per class and is then memoized.
+        """
+        if "_collected_test_methods" in cls.__dict__:
+            return cls._collected_test_methods
+        collected = []
+        for name, member in inspect.getmembers(cls, inspect.isfunction):
+            if hasattr(member, "_test_case") or hasattr(member, "_row_source"):
+                collected.append((name, None))
+            if hasattr(member, "_iter_test_case"):
+                for index, _ in enumerate(getattr(member, "test_funcs", [])):
+                    collected.append((name, index))
+        cls._collected_test_methods = collected
+        return collected
+
+    @classmethod
+    def row_source(cls, method_name: str) -> StormRowSource | None:
+        """
+        The rows of a streamed test case, None for other test cases.
+        """
+        return getattr(getattr(cls, method_name, None), "_row_source", None)
+
+    def _resolve_test_method(self, method_name: str, index: int | str = None) -> tuple[Callable, str]:
+        method = getattr(self, method_name)
+        name_string = method_name.replace("_", " ")
+        if index is not None:
+            # The index of a streamed test's row is the row's id, the method itself is passed the row
+            if not hasattr(method, "_row_source"):
+                method = types.MethodType(method.test_funcs[index], self)
+            name_string = f"{name_string} {index}"
+        return method, name_string
+
+    def timeout_for(self, method_name: str, index: int = None, default: float = None) -> float | None:
+        """
+        Time limit of a test method: its own, else its class's, else ``default``.
+        """
+        method_timeout = getattr(getattr(type(self), method_name), "_timeout", None)
+        return method_timeout or self.timeout or default
+
+    def _is_async_test(self, method_name: str, index: int = None) -> bool:
+        return inspect.iscoroutinefunction(self._resolve_test_method(method_name, index)[0])
+
+    @staticmethod
+    def _finish_test_object(
+            test_object: StormTestObject,
+            start: int,
+            steps_token,
+            log_token,
+            trace: StormTraceBuffer = None,
+    ):
+        end = time.perf_counter_ns()
+        test_object.duration = (end - start) / 1_000_000_000
+        if trace is not None:
+            trace.add(test_object.name, "test", start, end)
+        steps = _current_test_steps.get()
+        _current_test_steps.reset(steps_token)
+        if steps:
+            test_object.steps = steps
+        test_object.correlation_id, test_object.logs = end_test_log(log_token)
+
+    @staticmethod
+    def _record_memory_usage(test_object: StormTestObject, tracker: StormMemoryTracker):
+        if tracker.usage is None:
+            return
+        test_object.memory = tracker.usage
+        if (
+                tracker.usage.over_budget and tracker.policy.fail_over_budget
+                and test_object.status == StormTestResult.PASS
+        ):
+            test_object.status = StormTestResult.FAIL
+            test_object.error = f"Over its memory budget of {tracker.policy.budget} bytes: {tracker.usage.describe()}"
+
+    def _run_test_method(
+            self,
+            method_name: str,
+            index: int = None,
+            test_data=None,
+            profile: bool = False,
+            memory: StormMemoryPolicy = None,
+    ) -> StormTestObject:
+        """
+        Runs a single test method, wrapped in set_up_each/tear_down_each, and returns its result object.
+
+        :param profile:     Profile the test with cProfile, the stats are left in the result object's ``profile``
+        :param memory:      Trace the test's memory use and hold it to the policy's budget
+        """
+        method, name_string = self._resolve_test_method(method_name, index)
+        if inspect.iscoroutinefunction(method):
+            with StormProfiler(profile) as profiler:
+                test_object = asyncio.run(self._run_test_method_async(
+                    method_name, index, test_data, self.timeout_for(method_name, index), memory
+                ))
+            test_object.profile = profiler.stats
+            return test_object
+        test_object = StormTestObject(
+            name=name_string,
+            method=method,
+            status=StormTestResult.IN_PROGRESS,
+        )
+        log_token = begin_test_log()
+        logger.info(f"Running test item: {name_string}")
+        steps_token = _current_test_steps.set([])
+        # Fetched once, spans are recorded from timestamps taken anyway so a run that doesn't trace pays no more
+        trace = active_trace()
+        test_object.start = time.time()
+        start = time.perf_counter_ns()
+        # The profiler wraps the tracker, so the profile it builds on exit isn't counted against the test's memory
+        with StormProfiler(profile) as profiler, StormMemoryTracker(memory) as tracker:
             try:
-                logging.info(f"Running test item: {getattr(test_object, 'name')}")
-                test_object.status = StormTestResult.IN_PROGRESS
-                test_class.set_up_each()
-                test_data and test_object.method(test_class, test_data) or test_object.method(test_class)
-                test_class.tear_down_each()
+                self.set_up_each()
+                if trace is not None:
+                    trace.add("set_up_each", "fixture", start, start_steps())
+                # Iterated test cases are bound to their item, streamed ones are passed their row as test data
+                if test_data is not None and (index is None or hasattr(method, "_row_source")):
+                    method(test_data)
+                else:
+                    method()
+                tear_down_start = time.perf_counter_ns() if trace is not None else None
+                self.tear_down_each()
+                if trace is not None:
+                    trace.add("tear_down_each", "fixture", tear_down_start, time.perf_counter_ns())
                 test_object.status = StormTestResult.PASS
             except Exception as e:
                 test_object.status = StormTestResult.FAIL
                 test_object.error = str(e)
+        test_object.profile = profiler.stats
+        self._finish_test_object(test_object, start, steps_token, log_token, trace)
+        self._record_memory_usage(test_object, tracker)
+        return test_object
+
+    async def _run_test_method_async(
+            self,
+            method_name: str,
+            index: int = None,
+            test_data=None,
+            timeout: float = None,
+            memory: StormMemoryPolicy = None,
+    ) -> StormTestObject:
+        """
+        Async counterpart of _run_test_method.  set_up_each/tear_down_each may be plain or async methods.
+
+        :param timeout:     Seconds after which the test is cancelled and marked FAIL
+        :param memory:      Trace the test's memory use, only meaningful while no other test runs on the loop
+        """
+        method, name_string = self._resolve_test_method(method_name, index)
+        test_object = StormTestObject(
+            name=name_string,
+            method=method,
+            status=StormTestResult.IN_PROGRESS,
+        )
+        log_token = begin_test_log()
+        logger.info(f"Running test item: {name_string}")
+        steps_token = _current_test_steps.set([])
+        trace = active_trace()
+        test_object.start = time.time()
+        start = time.perf_counter_ns()
+        deadline = asyncio.timeout(timeout)
+        with StormMemoryTracker(memory) as tracker:
+            try:
+                async with deadline:
+                    await _maybe_await(self.set_up_each())
+                    if trace is not None:
+                        trace.add("set_up_each", "fixture", start, start_steps())
+                    if test_data is not None and (index is None or hasattr(method, "_row_source")):
+                        await method(test_data)
+                    else:
+                        await method()
+                    tear_down_start = time.perf_counter_ns() if trace is not None else None
+                    await _maybe_await(self.tear_down_each())
+                    if trace is not None:
+                        trace.add("tear_down_each", "fixture", tear_down_start, time.perf_counter_ns())
+                test_object.status = StormTestResult.PASS
+            except Exception as e:
+                test_object.status = StormTestResult.FAIL
+                test_object.error = f"Timed out after {timeout}s" if deadline.expired() else str(e)
+        self._finish_test_object(test_object, start, steps_token, log_token, trace)
+        self._record_memory_usage(test_object, tracker)
+        return test_object
+
+    async def _run_async_test_methods(
+            self,
+            methods: list[tuple[str, int | None]],
+            test_data=None,
+            on_start: Callable = None,
+            on_result: Callable = None,
+            default_timeout: float = None,
+            memory: StormMemoryPolicy = None,
+            row_data: dict = None,
+    ) -> list[StormTestObject]:
+        """
+        Runs async test methods concurrently, at most ``async_concurrency`` at a time.  With a memory policy they run
+        one at a time, so each test's allocations can be measured on their own.
+
+        :param methods:         (method name, iteration index) pairs
+        :param on_start:        Called with (method name, index) as each test starts
+        :param on_result:       Called with (method name, index, test object) as each test finishes
+        :param default_timeout: Time limit of the methods without one of their own
+        :param memory:          Memory policy the tests are traced and budgeted with
+        :param row_data:        Rows of streamed test cases by (method name, row id), run with instead of test_data
+        :return:                The test objects, in the order the methods were given
+        """
+        semaphore = asyncio.Semaphore(1 if memory else self.async_concurrency)
+        row_data = row_data or {}
 
-            if test_class._test_steps:
-                test_object.steps = cls._test_steps
-                test_class._test_steps = None
-            test_class.test_status = StormTestResult.PASS
+        async def run_one(method_name, index):
+            async with semaphore:
+                if on_start:
+                    on_start(method_name, index)
+                test_object = await self._run_test_method_async(
+                    method_name,
+                    index,
+                    row_data.get((method_name, index), test_data),
+                    self.timeout_for(method_name, index, default_timeout),
+                    memory,
+                )
+                if on_result:
+                    on_result(method_name, index, test_object)
+                return test_object
+
+        return list(await asyncio.gather(*(run_one(method_name, index) for method_name, index in methods)))
+
+    @classmethod
+    def run(cls, test_data=None, profile: bool = False, memory: StormMemoryPolicy = None):
+        """
+        Runs every test case of the class in this process.
+
+        :param test_data:   Test data passed to every test method
+        :param profile:     Profile each test case with cProfile and merge the profiles into ``profile_stats``
+        :param memory:      Trace each test case's memory use and hold it to the policy's budget
+        """
+        test_class = cls()
+        test_class.name = cls.__name__
+        test_class.test_object = []
+        test_class.profile_stats = StormProfileStats() if profile else None
+        logger.info(f"Running test item: {cls.__name__}")
+        test_class.test_status = StormTestResult.IN_PROGRESS
+        set_up_failed = False
+        try:
+            test_class.set_up()
+        except Exception as e:
+            logger.error("Test setup failed.  Reason: %s", e)
+            set_up_failed = True
+        methods = cls.collect_test_methods()
+        async_methods = [
+            method for method in methods
+            if cls.row_source(method[0]) is None and test_class._is_async_test(*method)
+        ]
+        async_results = {}
+        if async_methods:
+            # Async test cases run concurrently, so they are profiled together
+            with StormProfiler(profile) as profiler:
+                async_results = dict(zip(async_methods, asyncio.run(
+                    test_class._run_async_test_methods(async_methods, test_data, memory=memory)
+                )))
+            if profile:
+                test_class.profile_stats.add(profiler.stats)
+        for method_name, index in methods:
+            source = cls.row_source(method_name)
+            if source is not None:
+                # Streamed, one test per row as the rows are read
+                test_objects = (
+                    test_class._run_test_method(method_name, source.row_id(number, row), row, profile, memory)
+                    for number, row in source.rows()
+                )
+            else:
+                test_objects = [async_results.get((method_name, index)) or test_class._run_test_method(
+                    method_name, index, test_data, profile, memory
+                )]
+            for test_object in test_objects:
+                if profile:
+                    test_class.profile_stats.add(test_object.profile)
+                test_class.test_object.append(test_object.to_record())
+        test_class.test_status = StormTestResult.FAIL if set_up_failed or any(
+            test_object.status == StormTestResult.FAIL for test_object in test_class.test_object
+        ) else StormTestResult.PASS
         try:
             test_class.tear_down()
         except Exception as e:
-            logging.error("Test teardown failed.  Reason: %s", e)
+            logger.error("Test teardown failed.  Reason: %s", e)
             test_class.test_status = StormTestResult.FAIL
         return test_class
 
@@ -204,47 +713,66 @@ class StormTest:
         If so, adds storm_test and passes.
         If not, adds to failures with fail message.
         """
+        steps = _current_test_steps.get()
+        if steps is None:
+            # Outside a test case, e.g. in set_up, there is no result to add the step to
+            logger.info(f"{name}: {'PASS' if test else f'FAIL {fail_msg}'}")
+            return
+        record_step(name, test)
         if test:
-            cls._test_steps.append({name: StormTestResult.PASS})
+            steps.append({name: StormTestResult.PASS})
         else:
-            cls._test_steps.append({name: {StormTestResult.FAIL: fail_msg}})
+            steps.append({name: {StormTestResult.FAIL: fail_msg}})
 
 
 class StormTestSuite:
+    """
+    :param name:                Suite name used in the results
+    :param tests:               StormTest classes to run
+    :param test_data:           Test data passed to every test method
+    :param test_dir:            Directory to discover StormTest classes in, in addition to ``tests``
+    :param pattern:             File name glob used for discovery
+    :param collection_index:    Discovery index, defaults to .storm_cache/collection.json.  Unchanged files are
+                                listed from the index without being imported.
+    :param backend:             Execution backend for this suite, process, thread or inline.  Defaults to the
+                                runner's backend.
+    :param fixtures:            Fixtures set up once in the parent before the suite runs and torn down after it
+    """
+
     def __init__(
             self,
             name: str,
             tests: list[StormTest] = None,
-            # test_dir: PathLike = os.path.join(os.getcwd(), "tests"),
             test_data: dict = None,
+            test_dir: PathLike = None,
+            pattern: str = "*_test.py",
+            collection_index: StormCollectionIndex = None,
+            backend: StormExecutionBackend | str = None,
+            fixtures: list[Callable] = None,
     ):
         self.tests = tests or []
         self.name = name
+        self.backend = StormExecutionBackend(backend) if backend else None
+        self.fixtures = fixtures or []
         self.test_results = []
-        # self.test_dir = test_dir
+        self.test_dir = test_dir
         self.test_data = test_data
 
-        # if self.test_dir:
-        #     if self.tests is None:
-        #         self.tests = []
-        #     for file in Path(self.test_dir).glob("*_test.py"):
-        #         module_name = file.stem
-        #
-        #         module = importlib.import_module(module_name)
-        #
-        #         for name, cls in inspect.getmembers(module, inspect.isclass):
-        #             if getattr(cls, "StormTestCase", False):
-        #                 self.tests.append(cls)
-        #
-        #         for item in module.__all__:
-        #             if isinstance(item, StormTest):
-        #                 self.tests.append(item)
+        if self.test_dir:
+            collection_index = collection_index or StormCollectionIndex()
+            self.tests = self.tests + collection_index.discover(
+                self.test_dir,
+                base_class=StormTest,
+                collector=lambda cls: cls.collect_test_methods(),
+                pattern=pattern,
+            )
+            collection_index.save()
 
     def map_results(self, results):
         """
-        Function that automatically runs upon initialization, or if test results is None.  Also maps test retries, but
-        does not process them, so one will need to run the "process retries" as a followup, AFTER executing the retry
-        logic, which is not included in this class.
+        Function that automatically runs upon initialization, or if test results is None.  Retries are already
+        resolved by the time results reach the suite: each test object holds its last attempt, with the earlier failed
+        ones in ``attempts``.  See StormTestRunner's ``retry``.
 
         :return:
         """
@@ -278,13 +806,37 @@ class StormTestRunner:
             test_suites: list[StormTestSuite] = None,
             test_data: dict = None,
             reporting: StormReporter = None,
+            fail_fast: bool = False,
+            timings: StormTimingCache = None,
+            max_workers: int = None,
+            preload: list[str] = None,
+            backend: StormExecutionBackend | str = StormExecutionBackend.PROCESS,
+            fixtures: list[Callable] = None,
+            changed_only: bool = False,
+            retry: StormRetryPolicy = None,
+            quarantine: StormQuarantine = None,
+            default_timeout: float = None,
+            shard: StormShard | str = None,
+            results_path: PathLike = None,
+            broker: StormBroker = None,
+            profile: bool = False,
+            profile_path: PathLike = None,
+            profile_top: int = 20,
+            memory: StormMemoryPolicy = None,
+            trace: bool = False,
+            trace_path: PathLike = None,
+            log_config: StormLogConfig = None,
     ):
         #Setup logging
 
         time_stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        log_path = Path.cwd() / "logs" / f"storm_test_{time_stamp}.log"
-        logging.basicConfig(level=logging.INFO, filename=log_path, filemode="w+")
-
+        # Every process logs through a queue to one listener here, which writes in batches.  See
+        # storm_test.storm_logging
+        log_config = log_config or StormLogConfig()
+        if log_config.path is None:
+            log_config = dataclasses.replace(log_config, path=Path.cwd() / "logs" / f"storm_test_{time_stamp}.log")
+        # Started for the length of each run_tests()
+        self.log_listener = StormLogListener(log_config)
 
         self.test_suites = test_suites or []
         if test_cases:
@@ -294,27 +846,155 @@ class StormTestRunner:
                     tests=test_cases,
                     test_data=test_data))
         self.test_results = []
+        self.reporting = reporting or StormConsoleReporter()
+        self.fail_fast = fail_fast
+        self.timings = timings or StormTimingCache()
+        self.max_workers = max_workers
+        self.preload = preload
+        self.backend = StormExecutionBackend(backend)
+        # Session fixtures are set up once per run, suite fixtures given here once per suite
+        self.fixtures = fixtures or []
+        # Only run tests affected by the files changed since the last run, plus last run's failures
+        self.selector = StormChangeSelector() if changed_only else None
+        # Failed test methods are resubmitted to the same pool, tests that keep failing end up in quarantine
+        self.retry = retry
+        self.quarantine = quarantine or (StormQuarantine() if retry else None)
+        # Time limit of the tests that don't set one through the timeout decorator
+        self.default_timeout = default_timeout
+        # Only run this node's slice of every suite, e.g. 3/12.  Defaults to --shard on the command line
+        self.shard = StormShard.parse(shard) if isinstance(shard, str) else shard or StormShard.from_argv()
+        # Every suite is partitioned by the timings as loaded, the same on every node, not by the durations this node
+        # recorded in earlier suites, which the other nodes don't have
+        self.shard_timings = self.timings.snapshot() if self.shard else None
+        # Result file merge_results combines across shards, written per shard by default
+        self.results_path = results_path or (
+            Path.cwd() / f"storm_results.shard-{self.shard.index}-of-{self.shard.count}.json" if self.shard else None
+        )
+        # Broker the distributed backend publishes work to, see storm_test.storm_distributed
+        self.broker = broker
+        # Every test is profiled and the profiles of all workers are merged into one per run, see
+        # storm_test.storm_profiling.  The collapsed stacks for flame graphs are written next to the profile
+        self.profile_stats = StormProfileStats() if profile else None
+        self.profile_path = profile_path or Path.cwd() / "profiles" / f"storm_{time_stamp}.prof"
+        self.profile_top = profile_top
+        # Trace every test's memory use, hold tests to a budget and recycle workers that grow.  See
+        # storm_test.storm_memory
+        self.memory = memory
+        # Timing spans of the run, its suites and every class, test and step, written as a Chrome trace.  See
+        # storm_test.storm_tracing
+        self.trace = StormTrace() if trace else None
+        self.trace_path = trace_path or Path.cwd() / "traces" / f"storm_{time_stamp}.trace.json"
+        # One warm pool per backend serves every suite in the run, see StormWorkerPool for the preload behaviour
+        self.pools = {}
+
+    def get_pool(self, backend: StormExecutionBackend):
+        if backend not in self.pools:
+            kwargs = {}
+            if backend == StormExecutionBackend.DISTRIBUTED:
+                kwargs["broker"] = self.broker
+            elif backend == StormExecutionBackend.PROCESS:
+                kwargs["log_listener"] = self.log_listener
+            self.pools[backend] = create_pool(backend, max_workers=self.max_workers, preload=self.preload, **kwargs)
+        return self.pools[backend]
+
+    def run_suite(self, test_suite: StormTestSuite, test_data=None, session_fixtures: StormFixtureValues = None):
+        logger.info(f"Running test suite {test_suite.name}")
+        suite_start = time.perf_counter_ns()
+        suite_fixtures = StormFixtureSet(
+            [
+                fixture for fixture in self.fixtures
+                if getattr(fixture, "_fixture_scope", None) == StormFixtureScope.SUITE
+            ] + test_suite.fixtures,
+            inherited=session_fixtures,
+        )
+        try:
+            results = multiprocess_runner(
+                test_suite.tests,
+                test_data,
+                reporting=self.reporting,
+                fail_fast=self.fail_fast,
+                timings=self.timings,
+                pool=self.get_pool(test_suite.backend or self.backend),
+                fixtures=suite_fixtures.set_up(),
+                selector=self.selector,
+                retry=self.retry,
+                quarantine=self.quarantine,
+                default_timeout=self.default_timeout,
+                shard=self.shard,
+                shard_timings=self.shard_timings,
+                profile_stats=self.profile_stats,
+                memory=self.memory,
+                trace=self.trace,
+            )
+        finally:
+            suite_fixtures.tear_down()
+            if self.trace is not None:
+                self.trace.runner.add(test_suite.name, "suite", suite_start, time.perf_counter_ns())
+        self.timings.save()
+        if self.quarantine:
+            self.quarantine.save()
+        test_suite.test_results += results
+        print(f"Test result {test_suite.name}:")
+        for test_result in test_suite.test_results:
+            print(f"{test_result.name}: {test_result.test_status.value}")
+            if self.reporting.prints_results:
+                # Every test's result was printed as it arrived
+                continue
+            print("Steps:")
+            for test_object in test_result.test_object:
+                print(f"{test_object.name}: {test_object.status.value}")
 
     def run_tests(self, test_data=None):
-        logging.info("Starting test run")
-        if self.test_suites:
-            for test_suite in self.test_suites:
-                logging.info(f"Running test suite {test_suite.name}")
-                test_data = test_data or test_suite.test_data
-                results = multiprocess_runner(test_suite.tests, test_data)
-                for result in results:
-                    result = result.result()
-                    test_suite.test_results.append(result)
-                print(f"Test result {test_suite.name}:")
-                for test_result in test_suite.test_results:
-                    print(f"{test_result.name}: {test_result.test_status.value}")
-                    print("Steps:")
-                    for test_object in test_result.test_object:
-                        print(f"{test_object.name}: {test_object.status.value}")
+        self.log_listener.start()
+        try:
+            self._run_tests(test_data)
+        finally:
+            # Also when the run fails, so the log is complete and its file closed
+            self.log_listener.stop()
 
+    def _run_tests(self, test_data=None):
+        logger.info("Starting test run")
+        run_start = time.perf_counter_ns()
+        if self.test_suites:
+            self.reporting.before_run(self.test_suites)
+            session_fixtures = StormFixtureSet(
+                [
+                    fixture for fixture in self.fixtures
+                    if getattr(fixture, "_fixture_scope", StormFixtureScope.SESSION) == StormFixtureScope.SESSION
+                ]
+            )
+            try:
+                session_values = session_fixtures.set_up()
+                for test_suite in self.test_suites:
+                    test_data = test_data or test_suite.test_data
+                    self.run_suite(test_suite, test_data, session_values)
+                    if self.fail_fast and any(
+                            test_result.test_status == StormTestResult.FAIL for test_result in test_suite.test_results
+                    ):
+                        logger.warning(f"Fail fast: skipping test suites after {test_suite.name}")
+                        break
+                else:
+                    # Only a run that reached every suite may move the change snapshot forward
+                    if self.selector:
+                        self.selector.save()
+            finally:
+                session_fixtures.tear_down()
+                for pool in self.pools.values():
+                    pool.shutdown()
+            if self.results_path:
+                write_results(self.results_path, self.test_suites, self.shard)
+            self.reporting.after_run(self.test_suites)
+            if self.trace is not None:
+                self.trace.runner.add("run", "run", run_start, time.perf_counter_ns())
+                print(f"Trace written to {self.trace.write(self.trace_path)}")
+            if self.profile_stats:
+                profile_path, collapsed_path = self.profile_stats.write(self.profile_path)
+                print(f"Profile written to {profile_path}, collapsed stacks to {collapsed_path}")
+                print(f"Slowest {self.profile_top} functions by own time:")
+                print(self.profile_stats.summary(self.profile_top))
         else:
-            logging.warning("No test suites defined")
-        logging.info("Finished test run")
+            logger.warning("No test suites defined")
+        logger.info("Finished test run")
 
         # print(
         #     f"Test results: "
@@ -322,7 +1002,7 @@ class StormTestRunner:
         #     f"Failed:{self.test_results.failed} "
         #     f"Skipped:{self.test_results.skipped}"
         # )
-        # logging.info(
+        # logger.info(
         #     f"Test results: "
         #     f"Passed:{self.test_results.passed} "
         #     f"Failed:{self.test_results.failed} "
@@ -346,29 +1026,367 @@ class StormTestRunner:
         # ]
 
 
+class StormTestStream:
+    """
+    Iterates over test results as the workers report them.  Reporter hooks fire as each result arrives rather than
+    once the whole suite has finished.
+
+    :param tests:           StormTest classes, or classes discovered through the collection index, to run
+    :param test_data:       Test data passed to every test method
+    :param scheduler:       Scheduler to run the tests on, defaults to a StormWorkStealingScheduler
+    :param reporting:       Reporter whose before_test/after_test/after_step hooks fire in real time
+    :param fail_fast:       Stop handing out work after the first failed test
+    :param timings:         Timing cache the test and class durations are recorded to, defaults to the scheduler's
+    :param fixtures:        Session and suite fixture values made available to the tests through get_fixture
+    :param selector:        Change selector, tests it does not select are reported SKIPPED without running
+    :param retry:           Retry policy.  Failed tests are resubmitted after the round and only their last attempt
+                            is yielded and reported
+    :param quarantine:      Quarantine the outcome of retried tests is recorded to
+    :param shard:           Only run this shard's slice of the tests, balanced by the recorded durations
+    :param shard_timings:   Durations the shards are balanced by, defaults to ``timings``.  Every node must pass the
+                            same ones, see StormTimingCache.snapshot
+    :param profile_stats:   Stats the workers' profiles are merged into.  Only filled when the scheduler profiles
+    :param trace:           Trace the workers' timing spans are added to.  Only filled when the scheduler traces
+    """
+
+    def __init__(
+            self,
+            tests: list[StormTest],
+            test_data: dict = None,
+            scheduler: StormWorkStealingScheduler = None,
+            reporting: StormReporter = None,
+            fail_fast: bool = False,
+            timings: StormTimingCache = None,
+            fixtures: StormFixtureValues = None,
+            selector: StormChangeSelector = None,
+            retry: StormRetryPolicy = None,
+            quarantine: StormQuarantine = None,
+            shard: StormShard = None,
+            shard_timings: StormTimingCache = None,
+            profile_stats: StormProfileStats = None,
+            trace: StormTrace = None,
+    ):
+        self.test_data = test_data
+        self.profile_stats = profile_stats
+        self.trace = trace
+        self.fixtures = fixtures
+        self.selector = selector
+        self.retry = retry
+        self.quarantine = quarantine
+        self.scheduler = scheduler or StormWorkStealingScheduler(timings=timings)
+        self.timings = timings or self.scheduler.timings
+        self.reporting = reporting
+        self.fail_fast = fail_fast
+        self.aborted = False
+        self.class_results = {}
+        self.work_items = []
+        # Batches of streamed tests with a failed row in this run
+        self.failed_batches = set()
+        for test in tests:
+            if isinstance(test, StormCollectedClass):
+                # Discovered from the collection index, scheduled without importing the module
+                module, class_name, name, methods = test.module, test.class_name, test.name, test.methods
+                streamed = set(test.streamed)
+            else:
+                module, class_name, name = test.__module__, test.__qualname__, test.__name__
+                methods = test.collect_test_methods()
+                streamed = {method_name for method_name, _ in methods if test.row_source(method_name) is not None}
+            self.class_results[f"{module}.{class_name}"] = StormClassResult(
+                name=name,
+                key=f"{module}.{class_name}",
+                test_status=StormTestResult.IN_PROGRESS,
+            )
+            for method_name, index in methods:
+                if method_name not in streamed:
+                    self.work_items.append(StormWorkItem(module, class_name, method_name, index))
+                    continue
+                # Only the batch boundaries are scanned here, the workers read the rows
+                test_class = test.load() if isinstance(test, StormCollectedClass) else test
+                for batch in test_class.row_source(method_name).batches():
+                    self.work_items.append(StormWorkItem(module, class_name, method_name, rows=batch))
+        if shard:
+            self.work_items = shard.select(self.work_items, shard_timings or self.timings)
+            # Classes with nothing on this shard are reported by the shards that run them
+            sharded_classes = {work_item.class_key for work_item in self.work_items}
+            self.class_results = {
+                class_key: class_result
+                for class_key, class_result in self.class_results.items()
+                if class_key in sharded_classes
+            }
+
+    @property
+    def results(self) -> list[StormClassResult]:
+        return list(self.class_results.values())
+
+    def abort(self):
+        logger.warning("Aborting test run, queued tests will not be run")
+        self.aborted = True
+        self.scheduler.abort()
+
+    def _messages(self, work_items: list[StormWorkItem], interrupted: list[StormWorkItem]) -> Iterator[tuple]:
+        """
+        Runs one round of work items, turning the loss of a worker, a test killed for running past its time limit, or
+        one of a class whose set_up timed out, into a failed result for the test.
+
+        :param interrupted: Rows of streamed tests whose worker was lost while running them are added to this list.
+                            The rest of their batch went with the worker
+        """
+        in_flight = {}
+        for message, worker_id, work_item, payload in self.scheduler.run(work_items, self.test_data, self.fixtures):
+            if message == StormWorkerMessage.WORKER_LOST:
+                if worker_id not in in_flight:
+                    continue
+                # Whatever the worker was running when it died is a failure, not a test that never ran
+                work_item = in_flight[worker_id]
+                message = StormWorkerMessage.RESULT
+                # Local pools report the exit code, the distributed pool which remote worker stopped responding
+                reason = f"Worker exited with code {payload}" if isinstance(payload, int) else f"Worker {payload}"
+                payload = StormTestRecord.create(
+                    work_item.name, StormTestResult.FAIL, f"{reason} while running the test"
+                )
+                if work_item.rows is not None:
+                    interrupted.append(work_item)
+            elif message == StormWorkerMessage.TIMEOUT:
+                message = StormWorkerMessage.RESULT
+                payload = StormTestRecord.create(work_item.name, StormTestResult.FAIL, f"Timed out after {payload}s")
+                if work_item.rows is not None:
+                    interrupted.append(work_item)
+            elif message == StormWorkerMessage.CLASS_BROKEN:
+                # Not run, its class's set_up timed out.  A streamed batch fails as a whole
+                message = StormWorkerMessage.RESULT
+                payload = StormTestRecord.create(work_item.name, StormTestResult.FAIL, f"Class {payload}")
+            if message == StormWorkerMessage.STARTED:
+                in_flight[worker_id] = work_item
+            elif message == StormWorkerMessage.RESULT:
+                in_flight.pop(worker_id, None)
+            yield message, worker_id, work_item, payload
+
+    def _should_retry(self, work_item: StormWorkItem, test_object: StormTestRecord, attempt: int) -> bool:
+        return (
+            self.retry is not None
+            and test_object.status == StormTestResult.FAIL
+            and attempt < self.retry.attempts
+            and not self.aborted
+            and not (self.quarantine and self.quarantine.is_quarantined(work_item.test_id))
+        )
+
+    def _finish(self, work_item: StormWorkItem, test_object: StormTestRecord, attempts: list[StormTestRecord]):
+        """
+        Records and reports the final attempt of a test.
+        """
+        class_result = self.class_results[work_item.class_key]
+        test_object.attempts = attempts or None
+        passed = test_object.status == StormTestResult.PASS
+        if self.quarantine:
+            test_object.quarantined = self.quarantine.is_quarantined(work_item.test_id)
+            if self.retry:
+                self.quarantine.record(
+                    work_item.test_id, test_object.status == StormTestResult.FAIL, self.retry.quarantine_after
+                )
+        if work_item.rows is not None and not work_item.rows.keep_passed and passed:
+            class_result.passed_rows += 1
+        else:
+            class_result.test_object.append(test_object)
+        if self.timings and test_object.duration is not None:
+            self.timings.record_test(work_item.timing_id, test_object.duration)
+        if self.selector and work_item.rows is not None:
+            # Change selection works on whole batches, a batch with a failed row runs again
+            if not passed:
+                self.failed_batches.add(work_item.rest_of_batch.test_id)
+        elif self.selector:
+            self.selector.record_result(work_item.test_id, not passed)
+        if self.reporting:
+            self.reporting.after_test(class_result, test_object)
+            for step in test_object.steps or []:
+                self.reporting.after_step(test_object, step)
+        if (
+                self.fail_fast and test_object.status == StormTestResult.FAIL and not test_object.quarantined
+                and not self.aborted
+        ):
+            self.abort()
+        return class_result
+
+    def __iter__(self) -> Iterator[tuple[StormClassResult, StormTestRecord]]:
+        work_items = self.work_items
+        if self.selector:
+            work_items, deselected = self.selector.select(work_items)
+            for work_item in deselected:
+                self.class_results[work_item.class_key].test_object.append(StormTestRecord.create(
+                    work_item.name,
+                    StormTestResult.SKIPPED,
+                    "Not affected by the changed files",
+                ))
+        pending = {work_item.test_id: work_item for work_item in work_items}
+        failed_classes = set()
+        class_overheads = {}
+        # Failed attempts of the tests waiting for a retry round
+        attempts = {}
+        attempt = 1
+        while work_items:
+            retries = []
+            interrupted = []
+            for message, worker_id, work_item, payload in self._messages(work_items, interrupted):
+                if message == StormWorkerMessage.PROFILE:
+                    if self.profile_stats is not None:
+                        self.profile_stats.add(payload)
+                    continue
+                if message == StormWorkerMessage.TRACE:
+                    if self.trace is not None:
+                        self.trace.add(payload)
+                    continue
+                class_result = self.class_results[work_item.class_key]
+                match message:
+                    case StormWorkerMessage.STARTED:
+                        # Rows of a batch resumed in a retry round are still on their first attempt
+                        if self.reporting and (attempt == 1 or work_item.test_id not in attempts):
+                            self.reporting.before_test(class_result, work_item.name)
+                    case StormWorkerMessage.CLASS_ERROR:
+                        logger.error(f"Worker {worker_id}: {class_result.name} {payload}")
+                        failed_classes.add(work_item.class_key)
+                    case StormWorkerMessage.CLASS_TIMING:
+                        class_overheads[work_item.class_key] = max(
+                            payload, class_overheads.get(work_item.class_key, 0.0)
+                        )
+                    case StormWorkerMessage.RESULT:
+                        if self._should_retry(work_item, payload, attempt):
+                            logger.warning(
+                                f"{work_item.test_id} failed attempt {attempt} of {self.retry.attempts}, retrying.  "
+                                f"Reason: {payload.error}"
+                            )
+                            attempts.setdefault(work_item.test_id, []).append(payload)
+                            retries.append(work_item)
+                            # Rows are only pending from here on, their batch stood in for them
+                            pending.setdefault(work_item.test_id, work_item)
+                            continue
+                        pending.pop(work_item.test_id, None)
+                        yield self._finish(work_item, payload, attempts.pop(work_item.test_id, None)), payload
+                    case StormWorkerMessage.ROWS_DONE:
+                        pending.pop(work_item.test_id, None)
+                        if self.selector:
+                            self.selector.record_result(work_item.test_id, work_item.test_id in self.failed_batches)
+
+            if self.aborted:
+                break
+            # What is left of the batches of rows lost with their worker runs in the next round
+            resumed = []
+            for row_item in interrupted:
+                rest = row_item.rest_of_batch
+                if rest.test_id in pending and rest.rows.size:
+                    pending[rest.test_id] = rest
+                    resumed.append(rest)
+            if retries:
+                delay = self.retry.delay(attempt)
+                logger.info(f"Retrying {len(retries)} failed tests in {delay:.1f}s")
+                time.sleep(delay)
+                # The classes run set_up and tear_down again, only this round decides whether they failed
+                failed_classes -= {work_item.class_key for work_item in retries}
+                attempt += 1
+            work_items = retries + resumed
+
+        for work_item in pending.values():
+            if work_item.test_id in attempts:
+                # Aborted before its retry ran, the last failed attempt is the result
+                earlier = attempts.pop(work_item.test_id)
+                test_object = earlier.pop()
+                yield self._finish(work_item, test_object, earlier), test_object
+                continue
+            self.class_results[work_item.class_key].test_object.append(
+                StormTestRecord.create(work_item.name, StormTestResult.NOT_RUN)
+            )
+            if self.selector:
+                # Never ran against the current changes, so it still has to run next time
+                self.selector.record_result(work_item.test_id, True)
+        for class_key, class_result in self.class_results.items():
+            class_result.update_status(class_key in failed_classes)
+            if self.timings and class_key in class_overheads:
+                overhead = class_overheads[class_key]
+                self.timings.record_class(
+                    class_key,
+                    overhead + sum(test_object.duration or 0.0 for test_object in class_result.test_object),
+                    overhead,
+                )
+
+
 def multiprocess_runner(
         tests: list[StormTest],
         test_data: dict = None,
-        max_workers: int = 1,
+        max_workers: int = None,
         initializer=None,
         init_args=None,
+        reporting: StormReporter = None,
+        fail_fast: bool = False,
+        timings: StormTimingCache = None,
+        pool: StormWorkerPool = None,
+        backend: StormExecutionBackend | str = StormExecutionBackend.PROCESS,
+        fixtures: StormFixtureValues = None,
+        selector: StormChangeSelector = None,
+        retry: StormRetryPolicy = None,
+        quarantine: StormQuarantine = None,
+        default_timeout: float = None,
+        shard: StormShard = None,
+        shard_timings: StormTimingCache = None,
+        profile_stats: StormProfileStats = None,
+        memory: StormMemoryPolicy = None,
+        trace: StormTrace = None,
+) -> list[StormClassResult]:
+    """
+    Runs the test classes method by method on a work-stealing pool of workers, processes by default.
 
-):
-    futures_result = []
-
+    :param tests:           StormTest classes to run
+    :param test_data:       Test data passed to every test method
+    :param max_workers:     Worker process count, defaults to the CPU count
+    :param initializer:     Callable run once in every worker
+    :param init_args:       Arguments for the initializer
+    :param reporting:       Reporter notified as each test starts and finishes
+    :param fail_fast:       Stop handing out work after the first failed test
+    :param timings:         Historical durations used to order work longest-first, updated with this run's durations
+    :param pool:            Warm worker pool to reuse, max_workers and initializer only apply without one
+    :param backend:         Execution backend used when no pool is given, process, thread or inline
+    :param fixtures:        Fixture values set up by the caller, shared with every worker
+    :param selector:        Change selector, only the tests affected by changed files or that failed last time run
+    :param retry:           Retry policy for failed test methods, resubmitted to the same pool
+    :param quarantine:      Quarantine of tests that keep failing, defaults to none
+    :param default_timeout: Time limit in seconds of the tests that don't set one through the timeout decorator
+    :param shard:           Only run this shard's slice of the tests
+    :param shard_timings:   Durations the shards are balanced by, defaults to ``timings``
+    :param profile_stats:   Profile every test and merge the profiles into these stats
+    :param memory:          Trace every test's memory use, see StormMemoryPolicy
+    :param trace:           Record timing spans of every class, test and step and add them to this trace
+    :return:                One StormClassResult per test class, in the order the classes were given
+    """
     if not tests or len(tests) == 0:
         print("No tests specified for mutliprocess runner, exiting.")
-        return futures_result
+        return []
 
-    with ProcessPoolExecutor(
-            max_workers=max_workers,
-            initializer=initializer,
-            initargs=init_args
-    ) as executor:
-        for test in tests:
-            test_result_future = executor.submit(test.run, test_data)
-            futures_result.append(test_result_future)
-
-    wait(futures_result)
-
-    return futures_result
+    scheduler = StormWorkStealingScheduler(
+        max_workers=max_workers,
+        initializer=initializer,
+        init_args=init_args,
+        timings=timings,
+        pool=pool,
+        backend=StormExecutionBackend(backend),
+        options=StormBatchOptions(
+            default_timeout=default_timeout,
+            profile=profile_stats is not None,
+            memory=memory,
+            trace=trace is not None,
+        ),
+    )
+    stream = StormTestStream(
+        tests,
+        test_data,
+        scheduler,
+        reporting=reporting,
+        fail_fast=fail_fast,
+        fixtures=fixtures,
+        selector=selector,
+        retry=retry,
+        quarantine=quarantine,
+        shard=shard,
+        shard_timings=shard_timings,
+        profile_stats=profile_stats,
+        trace=trace,
+    )
+    for _ in stream:
+        pass
+    return stream.results
@@ -1,16 +1,31 @@
+import collections
+import contextvars
+import copy
 import dataclasses
+import functools
 import importlib
 import inspect
+import logging
 import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from enum import Enum
-from itertools import product
 from operator import indexOf
 from os import PathLike
 from pathlib import Path
 from typing import Callable, Type
 
+from storm_test.storm_collection import StormCollectionIndex
+from storm_test.storm_covering import StormConstraintIndex, StormCoverageReport, covering_array
+from storm_test.storm_gherkin import StormFeatureCache, StormFeatureScenario, StormStepRegistry
+from storm_test.storm_profiling import StormProfiler, StormProfileStats
+from storm_test.storm_tracing import active_trace, record_step, start_steps
 from storm_test.storm_reporters import StormReporter
+from storm_test.storm_scheduler import StormExecutionBackend
+
+logger = logging.getLogger(__name__)
 
 
 class StormTestResult(Enum):
@@ -35,6 +50,9 @@ class StormTestStepObject:
     status: StormTestResult
     return_data = None
     error: str = None
+    # Epoch seconds the step last started at, and how long it ran
+    start: float = None
+    duration: float = None
 
 
 @dataclass
@@ -58,26 +76,78 @@ class GerkinStep(Enum):
     THEN = "THEN"
 
 
-def skip_if(func, condition: [callable] or callable):
-    func._skip_condition = condition
-    return func
+# Bumped whenever skip_if or tags change a step, so compiled constraint indexes are built again
+_constraints_version = 0
 
-def given(func, name: str = None):
-    func._gerkin = GerkinStep.GIVEN
-    func.name = f"GIVEN {name if name else func.__name__.replace("_", " ")}"
 
+def skip_if(func=None, condition: [callable] or callable = None):
+    """
+    Rules out scenarios running ``func`` together with ``condition``: a step, a list or set of steps, or a predicate
+    called with the tags of every other step, see tags and tagged.  Constraints add up over calls.  Also usable as
+    ``@skip_if(condition=tagged("offline"))``.
+    """
+    global _constraints_version
+    if func is None:
+        return functools.partial(skip_if, condition=condition)
+    conditions = condition if isinstance(condition, (list, tuple, set, frozenset)) else [condition]
+    func._skip_condition = _skip_conditions(func) + list(conditions)
+    _constraints_version += 1
     return func
 
 
-def when(func, name: str = None):
-    func._gerkin = GerkinStep.WHEN
-    func.name = f"WHEN {name if name else func.__name__.replace("_", " ")}"
-    return func
+def tags(*names: str):
+    """
+    Tags a step, for skip_if predicates to pick steps by, e.g. ``@tags("mobile", "slow")`` above ``@when``.
+    """
+    def decorator(func):
+        global _constraints_version
+        func._tags = getattr(func, "_tags", frozenset()) | frozenset(names)
+        _constraints_version += 1
+        return func
+
+    return decorator
+
+
+def tagged(*names: str) -> Callable[[frozenset], bool]:
+    """
+    skip_if predicate true for the steps with any of the tags, e.g. ``skip_if(pay_by_card, tagged("offline"))``.
+    """
+    wanted = frozenset(names)
+    return lambda step_tags: not wanted.isdisjoint(step_tags)
+
+
+def given(func=None, name: str = None):
+    """
+    Marks a GIVEN step, named after the method or ``name``, which is also the text feature file steps match it by,
+    see run_feature.  Also usable as ``@given("a user named {user}")``.
+    """
+    if func is None or isinstance(func, str):
+        return functools.partial(given, name=func or name)
+    return _gerkin_step(func, GerkinStep.GIVEN, name)
+
+
+def when(func=None, name: str = None):
+    """
+    Marks a WHEN step, see given.
+    """
+    if func is None or isinstance(func, str):
+        return functools.partial(when, name=func or name)
+    return _gerkin_step(func, GerkinStep.WHEN, name)
+
+
+def then(func=None, name: str = None):
+    """
+    Marks a THEN step, see given.
+    """
+    if func is None or isinstance(func, str):
+        return functools.partial(then, name=func or name)
+    return _gerkin_step(func, GerkinStep.THEN, name)
 
 
-def then(func, name: str = None):
-    func._gerkin = GerkinStep.THEN
-    func.name = f"THEN {name if name else func.__name__.replace("_", " ")}"
+def _gerkin_step(func, gerkin_step: GerkinStep, name: str = None):
+    func._gerkin = gerkin_step
+    func._step_text = name if name else func.__name__.replace("_", " ")
+    func.name = f"{gerkin_step.value} {func._step_text}"
     return func
 
 
@@ -86,6 +156,42 @@ def can_fail(func: when):
     return func
 
 
+def dimension(name: str):
+    """
+    Puts a GIVEN or WHEN step in a dimension of the decision matrix, e.g. ``@dimension("browser")`` above ``@given``.
+    A scenario takes one step from every dimension, the steps of a phase put in no dimension form one of their own.
+    """
+    def decorator(func):
+        func._dimension = name
+        return func
+
+    return decorator
+
+
+def _step_function(step) -> Callable:
+    # A step object, a bound step method or the function itself
+    method = getattr(step, "method", step)
+    return getattr(method, "__func__", method)
+
+
+def _skip_conditions(function: Callable) -> list[Callable]:
+    """
+    The steps, as functions, and tag predicates skip_if rules out running with ``function``.
+    """
+    condition = getattr(function, "_skip_condition", None)
+    if condition is None:
+        return []
+    conditions = condition if isinstance(condition, (list, tuple, set, frozenset)) else [condition]
+    return [_step_function(condition) if hasattr(condition, "_gerkin") else condition for condition in conditions]
+
+
+def _rules_out(function: Callable, other: Callable) -> bool:
+    for condition in _skip_conditions(function):
+        if condition is other if hasattr(condition, "_gerkin") else condition(getattr(other, "_tags", frozenset())):
+            return True
+    return False
+
+
 def test_step(func, gerkin_step: GerkinStep):
     name_string = func.__name__.replace("_", " ")
     func._gerkin = gerkin_step
@@ -105,6 +211,9 @@ def test_step(func, gerkin_step: GerkinStep):
 class StormBehaviorResult:
     scenario: Scenario
     result: StormTestResult = StormTestResult.IN_PROGRESS
+    # Scenario name and first failure of a feature file scenario, see run_feature
+    name: str = None
+    error: str = None
 
 
 class StormBehaviorDrivenTest:
@@ -121,25 +230,85 @@ class StormBehaviorDrivenTest:
     test_id = None
     test_object: list[StormTestObject] = []
     test_status: StormTestResult = StormTestResult.NOT_RUN
+    # Profile every step with cProfile, merged into profile_stats, see storm_test.storm_profiling
+    profile = False
+    profile_stats: StormProfileStats = None
+    # Run each GIVEN of a decision matrix once, starting its WHENs from snapshots of the test data it left, see
+    # snapshot_data.  Turn off for GIVENs whose effects outside the test data are used up by a WHEN
+    memoize_given = True
+    # Coverage reached by the last decision matrix run with a strength, see run_decision_matrix
+    coverage: StormCoverageReport = None
 
 
     @staticmethod
     def _check_condition(method_a, method_b):
-        condition_a = getattr(method_a, "_skip_condition", False)
-        condition_b = getattr(method_b, "_skip_condition", False)
-        if condition_a == method_b:
-            return True
-        elif condition_b == method_a:
-            return True
-        else:
-            return False
+        """
+        Whether skip_if rules out running two steps, or step methods, in one scenario.
+        """
+        function_a = _step_function(method_a)
+        function_b = _step_function(method_b)
+        return _rules_out(function_a, function_b) or _rules_out(function_b, function_a)
+
+    @classmethod
+    def constraint_index(cls) -> StormConstraintIndex:
+        """
+        The skip_if constraints between the class's steps, compiled into a StormConstraintIndex of step functions.
+        Built on first use, and again after skip_if or tags changed a step.
+        """
+        cached = cls.__dict__.get("_constraint_index")
+        if cached is not None and cached[0] == _constraints_version:
+            return cached[1]
+        steps = [member for _, member in inspect.getmembers(cls, inspect.isfunction) if hasattr(member, "_gerkin")]
+        index = StormConstraintIndex(steps, [getattr(step, "_tags", frozenset()) for step in steps])
+        for step in steps:
+            for condition in _skip_conditions(step):
+                if hasattr(condition, "_gerkin"):
+                    index.exclude(step, condition)
+                else:
+                    index.exclude_where(step, condition)
+        cls._constraint_index = (_constraints_version, index)
+        return index
 
 
 
+    @classmethod
+    def collect_steps(cls) -> list[tuple[str, str]]:
+        """
+        Lists the step methods of the class as (GIVEN/WHEN/THEN, method name) pairs, without instantiating it.
+        """
+        return [
+            (member._gerkin.value, name)
+            for name, member in inspect.getmembers(cls, inspect.isfunction)
+            if hasattr(member, "_gerkin")
+        ]
+
+    @classmethod
+    def step_registry(cls) -> StormStepRegistry:
+        """
+        The class's steps compiled into a StormStepRegistry by keyword and step text, matching to the step's method
+        name.  Steps are in definition order, base classes first, so the first step defined wins a tie.  Built on
+        first use.
+        """
+        if "_step_registry" in cls.__dict__:
+            return cls._step_registry
+        members = {}
+        for klass in reversed(cls.__mro__):
+            members.update(vars(klass))
+        cls._step_registry = StormStepRegistry(
+            (member._gerkin.value, getattr(member, "_step_text", name.replace("_", " ")), name)
+            for name, member in members.items()
+            if inspect.isfunction(member) and hasattr(member, "_gerkin")
+        )
+        return cls._step_registry
+
     @classmethod
     def _get_scenarios(cls):
         test_class = cls()
         test_class.test_status = StormTestResult.IN_PROGRESS
+        # Per instance, the class-level lists are shared by every test class and would grow with every run
+        test_class.test_steps = {gerkin_step: [] for gerkin_step in GerkinStep}
+        test_class.scenarios = []
+        test_class.test_object = []
         for step_name, step_method in inspect.getmembers(test_class, inspect.ismethod):
             if hasattr(step_method, "_gerkin"):
                 gerkin_step = getattr(step_method, "_gerkin")
@@ -154,16 +323,45 @@ class StormBehaviorDrivenTest:
 
     @classmethod
     def _run_step(cls, step: StormTestStepObject):
-        step.status = StormTestResult.IN_PROGRESS
-        try:
-            step_data = step.method(cls._test_data)
-            cls._test_data = step_data if step_data else cls._test_data
-            step.status = StormTestResult.PASS
-        except Exception as e:
-            step.status = StormTestResult.FAIL
-            step.error = str(e)
+        cls._test_data, profile = cls._call_step(step, cls._test_data)
+        cls._add_profile(profile)
         return step
 
+    @classmethod
+    def _call_step(cls, step: StormTestStepObject, test_data) -> tuple[object, dict | None]:
+        """
+        Runs a step on ``test_data``, touching no state of the class.
+
+        :return:    The test data the step leaves, and its raw profile when profiling
+        """
+        step.status = StormTestResult.IN_PROGRESS
+        trace = active_trace()
+        step.start = time.time()
+        start = time.perf_counter_ns()
+        with StormProfiler(cls.profile) as profiler:
+            if trace is not None:
+                start_steps()
+            try:
+                step_data = step.method(test_data)
+                test_data = step_data if step_data else test_data
+                step.status = StormTestResult.PASS
+            except Exception as e:
+                step.status = StormTestResult.FAIL
+                step.error = str(e)
+        end = time.perf_counter_ns()
+        step.duration = (end - start) / 1_000_000_000
+        if trace is not None:
+            trace.add(step.name, "bdd_step", start, end)
+        return test_data, profiler.stats
+
+    @classmethod
+    def _add_profile(cls, profile: dict | None):
+        if profile:
+            if "profile_stats" not in cls.__dict__:
+                # Per class, a subclass doesn't add to the stats of the class it derives from
+                cls.profile_stats = StormProfileStats()
+            cls.profile_stats.add(profile)
+
 
 
     @classmethod
@@ -202,53 +400,202 @@ class StormBehaviorDrivenTest:
 
 
     @classmethod
-    def run_decision_matrix(cls, test_data=None):
-        current_data_state = test_data
-        test_class = cls._get_scenarios()
+    def snapshot_data(cls, test_data):
+        """
+        Copy of the test data, for a branch of the decision matrix to start from without seeing what other branches
+        did to it.  Deep copies by default.  Override for data that can't be deep copied, or has a cheaper way to
+        copy, e.g. cloning a seeded table from a template.
+        """
+        return copy.deepcopy(test_data)
 
-        for scenario_given, scenario_when in product(
-                test_class.test_steps[GerkinStep.GIVEN],
-                test_class.test_steps[GerkinStep.WHEN],
-        ):
-            if cls._check_condition(scenario_given, scenario_when):
-                continue
-            scenario_given = test_class._run_step(scenario_given)
-            scenario_when = test_class._run_step(scenario_when)
-
-            then_senarios = []
-
-            for scenario_then in test_class.test_steps[GerkinStep.THEN]:
-                if (
-                        cls._check_condition(scenario_then, scenario_when)
-                        or
-                        cls._check_condition(scenario_then, scenario_given)
-                ):
-                    continue
-                scenario_then = test_class._run_step(scenario_then)
-                then_senarios.append(scenario_then)
-
-            then_string = then_senarios[0].name
-            then_full_status = StormTestResult.PASS
-            for scenario in then_senarios:
-                if scenario.status == StormTestResult.FAIL:
-                    then_full_status = StormTestResult.FAIL
-                if scenario.name == then_string:
-                    continue
-                current_scenario =  scenario.name.replace("THEN", "\nAND")
-                then_string += current_scenario
-
-
-            test_class.scenarios.append(
-                StormBehaviorResult(
-                    scenario=Scenario(scenario_given.name, scenario_when.name, then_string),
-                    result=StormTestResult.PASS if (
-                            scenario_given.status == StormTestResult.PASS
-                            and scenario_when.status == StormTestResult.PASS
-                            and then_full_status == StormTestResult.PASS
-                    ) else StormTestResult.FAIL,
-                ))
+    @classmethod
+    def _snapshot(cls, test_data, errors: list):
+        """
+        snapshot_data, or the data itself when it can't be snapshot, warning the first time ``errors`` is added to.
+        """
+        try:
+            return cls.snapshot_data(test_data)
+        except Exception as e:
+            if not errors:
+                logger.warning(f"Could not snapshot the test data of {cls.__name__}, scenarios share it.  Reason: {e}")
+            errors.append(e)
+            return test_data
+
+    @classmethod
+    def run_decision_matrix(
+            cls,
+            test_data=None,
+            backend: StormExecutionBackend | str = StormExecutionBackend.INLINE,
+            max_workers: int = None,
+            strength: int = None,
+    ) -> list[StormBehaviorResult]:
+        """
+        Runs scenarios of one step from every GIVEN and WHEN dimension, see dimension, each followed by every THEN,
+        leaving out the steps skip_if rules out.  Without dimensions, that is every GIVEN with every WHEN.
+
+        Every combination runs by default.  With a ``strength``, only enough of them run to cover every combination
+        of steps from any ``strength`` dimensions, every pair for 2, which for many dimensions is a small fraction of
+        them.  The coverage reached is logged and kept in ``coverage``.
+
+        Each set of GIVENs runs once, from its own copy of the initial test data, and each scenario after it starts
+        from a snapshot of the data it left, so expensive GIVENs cost the same however many WHENs there are.  Without
+        memoize_given, every scenario runs its GIVENs itself.
+
+        Scenarios share no state, each runs on a new instance of the class with its own steps and data, so they can
+        run on a pool.  Results are in matrix order whichever scenario finishes first.  On the process backend the
+        class must be importable, the test data picklable, and step spans aren't traced.
+
+        :param test_data:   Test data the GIVENs start from, defaults to the class's
+        :param backend:     Runs the scenarios inline one after the other, or on a pool of threads or processes
+        :param max_workers: Size of the pool, defaults to that of concurrent.futures
+        :param strength:    Run a covering array of this strength rather than every combination, 2 for pairwise
+        """
+        test_class = cls._get_scenarios()
+        initial_data = cls._test_data if test_data is None else test_data
+        # Scenarios name their steps by attribute, the name a new instance has them under
+        names = {member.__func__: name for name, member in inspect.getmembers(test_class, inspect.ismethod)}
+        # Steps are their position in the class's constraint index from here on
+        index = cls.constraint_index()
+        step_names = [names[function] for function in index.items]
+        dimensions, given_dimensions = cls._matrix_dimensions(test_class)
+        dimensions = [[index.positions[step.method.__func__] for step in dimension] for dimension in dimensions]
+        if strength is None:
+            rows = list(index.rows(dimensions))
+            cls.coverage = None
+        else:
+            rows, cls.coverage = covering_array(dimensions, strength, index.compatible)
+            logger.info(f"Decision matrix of {cls.__name__}: {cls.coverage.summary()}")
+        thens = [index.positions[step.method.__func__] for step in test_class.test_steps[GerkinStep.THEN]]
+        # Only the steps some THEN rules out decide which THENs follow a scenario, scenarios alike in those share a list
+        then_exclusions = 0
+        for then in thens:
+            then_exclusions |= index.exclusions[then]
+        then_names = {}
+        # Scenarios by the GIVENs they start with, which run once for all of them: GIVENs -> [(position, WHENs, THENs)]
+        plan = {}
+        for position, row in enumerate(rows):
+            mask = 0
+            for step in row:
+                mask |= 1 << step
+            mask &= then_exclusions
+            if mask not in then_names:
+                then_names[mask] = [step_names[then] for then in thens if index.allows(mask, then)]
+            plan.setdefault(tuple(step_names[step] for step in row[:given_dimensions]), []).append(
+                (position, [step_names[step] for step in row[given_dimensions:]], then_names[mask])
+            )
+
+        snapshot = functools.partial(cls._snapshot, errors=[])
+
+        branch_futures = []
+        with _matrix_executor(backend, max_workers) as submit:
+            if cls.memoize_given:
+                given_futures = [
+                    (branches, submit(_run_matrix_given, cls, list(givens), snapshot(initial_data)))
+                    for givens, branches in plan.items()
+                ]
+                for branches, given_future in given_futures:
+                    given, given_data, profiles = given_future.result()
+                    for profile in profiles:
+                        cls._add_profile(profile)
+                    # The last scenario takes the GIVENs' data itself, no later one needs it
+                    branch_data = [snapshot(given_data) for _ in branches[1:]] + [given_data]
+                    for (position, whens, thens), data in zip(branches, branch_data):
+                        branch_futures.append(
+                            (position, submit(_run_matrix_branch, cls, [], whens, thens, data, given))
+                        )
+            else:
+                for givens, branches in plan.items():
+                    for position, whens, thens in branches:
+                        branch_futures.append((
+                            position,
+                            submit(_run_matrix_branch, cls, list(givens), whens, thens, snapshot(initial_data)),
+                        ))
+            test_class.scenarios = [None] * len(branch_futures)
+            for position, branch_future in branch_futures:
+                result, profiles = branch_future.result()
+                for profile in profiles:
+                    cls._add_profile(profile)
+                test_class.scenarios[position] = result
         return test_class.scenarios
 
+    @classmethod
+    def run_feature(
+            cls,
+            path: PathLike | str,
+            test_data=None,
+            backend: StormExecutionBackend | str = StormExecutionBackend.INLINE,
+            max_workers: int = None,
+            cache: StormFeatureCache = None,
+    ) -> list[StormBehaviorResult]:
+        """
+        Runs the scenarios of a Gherkin feature file with the class's steps.  A feature step runs the step of its
+        keyword whose text it is, see given.  Placeholders in a step's text, e.g. ``{count:d}``, are passed to the
+        step by name, and a feature step's doc string or data table as ``doc_string`` or ``table`` to steps taking
+        them.  Scenario Outlines run once per Examples row, expanded as they run, with at most twice ``max_workers``
+        scenarios in flight.
+
+        A scenario stops at its first failed or undefined step, the steps after it are SKIPPED.  Scenarios run like
+        decision matrix ones, each on a new instance of the class from its own snapshot of the test data, and results
+        are in file order.
+
+        :param path:        The .feature file
+        :param test_data:   Test data every scenario starts from, defaults to the class's
+        :param backend:     Runs the scenarios inline one after the other, or on a pool of threads or processes
+        :param max_workers: Size of the pool, defaults to that of concurrent.futures
+        :param cache:       Parsed feature cache, defaults to .storm_cache/features.json.  An unchanged file is loaded
+                            from it without being parsed
+        """
+        cache = cache or StormFeatureCache()
+        feature = cache.feature(path)
+        cache.save()
+        registry = cls.step_registry()
+        initial_data = cls._test_data if test_data is None else test_data
+        snapshot = functools.partial(cls._snapshot, errors=[])
+        # Scenarios submitted and not yet collected, at most ``window`` of them, so a large Examples table is expanded
+        # as it runs rather than queued up front.  Collected oldest first, which keeps the results in file order
+        window = 2 * (max_workers or os.cpu_count() or 1)
+        in_flight = collections.deque()
+        results = []
+        undefined = set()
+
+        def collect(future: Future):
+            result, profiles = future.result()
+            for profile in profiles:
+                cls._add_profile(profile)
+            results.append(result)
+
+        with _matrix_executor(backend, max_workers) as submit:
+            for scenario in feature.iter_scenarios():
+                steps = scenario.background + scenario.steps
+                matches = [registry.match(step.keyword, step.text) for step in steps]
+                undefined.update(step.name for step, match in zip(steps, matches) if match is None)
+                in_flight.append(submit(_run_feature_scenario, cls, scenario, matches, snapshot(initial_data)))
+                if len(in_flight) >= window:
+                    collect(in_flight.popleft())
+            while in_flight:
+                collect(in_flight.popleft())
+        if undefined:
+            logger.warning(f"{cls.__name__} defines no step for {len(undefined)} steps of {feature.path}: {undefined}")
+        return results
+
+    @classmethod
+    def _matrix_dimensions(cls, test_class) -> tuple[list[list[StormTestStepObject]], int]:
+        """
+        The GIVEN then the WHEN dimensions of the decision matrix, and how many of them are GIVENs.  The steps of a
+        phase put in no dimension form one of their own.
+        """
+        dimensions = []
+        given_dimensions = 0
+        for gerkin_step in (GerkinStep.GIVEN, GerkinStep.WHEN):
+            grouped = {}
+            for step in test_class.test_steps[gerkin_step]:
+                grouped.setdefault(getattr(step.method, "_dimension", None), []).append(step)
+            # A phase without steps leaves the matrix without scenarios
+            dimensions += list(grouped.values()) or [[]]
+            if gerkin_step == GerkinStep.GIVEN:
+                given_dimensions = len(dimensions)
+        return dimensions, given_dimensions
+
     # @classmethod
     # def get_scenario_results(cls, scenario_list:StormBehaviorResult):
     #
@@ -260,35 +607,195 @@ class StormBehaviorDrivenTest:
         If so, adds test and passes.
         If not, adds to failures with fail message.
         """
+        record_step(name, test)
         return test if test else f"{test} FAILED, REASON: {fail_msg}"
 
 
+def _matrix_step(instance: StormBehaviorDrivenTest, method_name: str) -> StormTestStepObject:
+    method = getattr(instance, method_name)
+    return StormTestStepObject(
+        name=getattr(method, "name", method.__name__), method=method, status=StormTestResult.NOT_RUN
+    )
+
+
+def _run_matrix_steps(
+        test_class: Type[StormBehaviorDrivenTest],
+        instance: StormBehaviorDrivenTest,
+        method_names: list[str],
+        gerkin_step: GerkinStep,
+        test_data,
+) -> tuple[tuple[str, StormTestResult], object, list]:
+    """
+    Runs the steps of one phase of a decision matrix scenario in turn.
+
+    :return:    Their name in the scenario and whether they all passed, the test data they leave, and their profiles
+    """
+    steps = []
+    profiles = []
+    for method_name in method_names:
+        step = _matrix_step(instance, method_name)
+        test_data, profile = test_class._call_step(step, test_data)
+        steps.append(step)
+        profiles.append(profile)
+    passed = all(step.status == StormTestResult.PASS for step in steps)
+    result = StormTestResult.PASS if passed else StormTestResult.FAIL
+    return (_phase_name(steps, gerkin_step), result), test_data, profiles
+
+
+def _run_matrix_given(test_class: Type[StormBehaviorDrivenTest], givens: list[str], test_data):
+    """
+    Runs the GIVENs decision matrix scenarios start from, on a new instance of the class.
+
+    :return:    The GIVENs' name and status, the test data they left, and their profiles
+    """
+    return _run_matrix_steps(test_class, test_class(), givens, GerkinStep.GIVEN, test_data)
+
+
+def _run_matrix_branch(
+        test_class: Type[StormBehaviorDrivenTest],
+        givens: list[str],
+        whens: list[str],
+        thens: list[str],
+        test_data,
+        given: tuple[str, StormTestResult] = None,
+) -> tuple[StormBehaviorResult, list]:
+    """
+    Runs a scenario of a decision matrix on a new instance of the class: its GIVENs, unless passed the name and
+    status of the GIVENs that already ran, its WHENs, then its THENs.
+
+    :return:    The scenario's result, and the profiles of the steps it ran
+    """
+    instance = test_class()
+    profiles = []
+    if given is None:
+        given, test_data, profiles = _run_matrix_steps(test_class, instance, givens, GerkinStep.GIVEN, test_data)
+    when, test_data, when_profiles = _run_matrix_steps(test_class, instance, whens, GerkinStep.WHEN, test_data)
+    then, test_data, then_profiles = _run_matrix_steps(test_class, instance, thens, GerkinStep.THEN, test_data)
+    return StormBehaviorResult(
+        scenario=Scenario(given[0], when[0], then[0]),
+        result=StormTestResult.PASS if (
+                given[1] == StormTestResult.PASS
+                and when[1] == StormTestResult.PASS
+                and then[1] == StormTestResult.PASS
+        ) else StormTestResult.FAIL,
+    ), profiles + when_profiles + then_profiles
+
+
+def _phase_name(steps: list[StormTestStepObject], gerkin_step: GerkinStep) -> str:
+    return "".join(
+        step.name if position == 0 else step.name.replace(gerkin_step.value, "\nAND", 1)
+        for position, step in enumerate(steps)
+    )
+
+
+def _run_feature_scenario(
+        test_class: Type[StormBehaviorDrivenTest],
+        scenario: StormFeatureScenario,
+        matches: list[tuple[str, dict] | None],
+        test_data,
+) -> tuple[StormBehaviorResult, list]:
+    """
+    Runs a feature file scenario, its background steps first, on a new instance of the class.
+
+    :param matches: The step method name and arguments every step matched, None for an undefined step
+    :return:        The scenario's result, and the profiles of the steps it ran
+    """
+    instance = test_class()
+    steps = {gerkin_step: [] for gerkin_step in GerkinStep}
+    profiles = []
+    failed = None
+    for feature_step, match in zip(scenario.background + scenario.steps, matches):
+        step = StormTestStepObject(name=feature_step.name, method=None, status=StormTestResult.NOT_RUN)
+        steps[GerkinStep(feature_step.keyword)].append(step)
+        if failed is not None:
+            step.status = StormTestResult.SKIPPED
+            continue
+        if match is None:
+            step.status = StormTestResult.FAIL
+            step.error = f"Undefined step, no {feature_step.keyword} step matches {feature_step.text!r}"
+        else:
+            method_name, arguments = match
+            method = getattr(instance, method_name)
+            if feature_step.doc_string is not None or feature_step.table is not None:
+                parameters = inspect.signature(method).parameters
+                arguments = dict(arguments)
+                if feature_step.doc_string is not None and "doc_string" in parameters:
+                    arguments["doc_string"] = feature_step.doc_string
+                if feature_step.table is not None and "table" in parameters:
+                    arguments["table"] = feature_step.table
+            step.method = functools.partial(method, **arguments) if arguments else method
+            test_data, profile = test_class._call_step(step, test_data)
+            profiles.append(profile)
+        if step.status == StormTestResult.FAIL:
+            failed = step
+    return StormBehaviorResult(
+        scenario=Scenario(*(_phase_name(steps[gerkin_step], gerkin_step) for gerkin_step in GerkinStep)),
+        result=StormTestResult.PASS if failed is None else StormTestResult.FAIL,
+        name=scenario.name,
+        error=None if failed is None else f"{failed.name}: {failed.error}",
+    ), profiles
+
+
+def _run_inline(function: Callable, *args) -> Future:
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+@contextmanager
+def _matrix_executor(backend: StormExecutionBackend | str, max_workers: int = None):
+    """
+    Yields the function decision matrix steps are submitted with, as ``submit(function, *args) -> Future``.
+    """
+    match StormExecutionBackend(backend):
+        case StormExecutionBackend.INLINE:
+            yield _run_inline
+        case StormExecutionBackend.THREAD:
+            with ThreadPoolExecutor(max_workers, thread_name_prefix="storm-matrix") as executor:
+                # In the submitting context, so steps are traced to the run's trace
+                yield lambda function, *args: executor.submit(contextvars.copy_context().run, function, *args)
+        case StormExecutionBackend.PROCESS:
+            with ProcessPoolExecutor(max_workers) as executor:
+                yield executor.submit
+        case _:
+            raise ValueError(f"Decision matrices run inline, on threads or on processes, not {backend}")
+
+
 class StormBehaviorDrivenTestSuite:
+    """
+    :param tests:               StormBehaviorDrivenTest classes to run
+    :param test_dir:            Directory to discover StormBehaviorDrivenTest classes in
+    :param test_data:           Test data passed to the first step of every scenario
+    :param pattern:             File name glob used for discovery
+    :param collection_index:    Discovery index, defaults to .storm_cache/collection.json.  Unchanged files are
+                                listed from the index without being imported; call ``load()`` on a discovered entry
+                                to get its class.
+    """
+
     def __init__(
             self,
             tests: list[StormBehaviorDrivenTest] = None,
             test_dir: PathLike = os.path.join(os.getcwd(), "tests"),
             test_data: dict = None,
+            pattern: str = "*_test.py",
+            collection_index: StormCollectionIndex = None,
     ):
         self.tests = tests or []
         self.test_dir = test_dir
         self.test_data = test_data
 
-        if self.test_dir:
-            if self.tests is None:
-                self.tests = []
-            for file in Path(self.test_dir).glob("*_test.py"):
-                module_name = file.stem
-
-                module = importlib.import_module(module_name)
-
-                for name, cls in inspect.getmembers(module, inspect.isclass):
-                    if getattr(cls, "StormTestCase", False):
-                        self.tests.append(cls)
-
-                for item in module.__all__:
-                    if isinstance(item, StormBehaviorDrivenTest):
-                        self.tests.append(item)
+        if self.test_dir and Path(self.test_dir).is_dir():
+            collection_index = collection_index or StormCollectionIndex()
+            self.tests = self.tests + collection_index.discover(
+                self.test_dir,
+                base_class=StormBehaviorDrivenTest,
+                collector=lambda cls: cls.collect_steps(),
+                pattern=pattern,
+            )
+            collection_index.save()
 
 
 @dataclass
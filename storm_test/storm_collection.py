@@ -0,0 +1,186 @@
+import hashlib
+import importlib
+import inspect
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StormCollectedClass:
+    """
+    A test class found by discovery.  Holds everything needed to list and schedule its tests, and only imports the
+    module when the class itself is needed.  The rows of streamed test cases, named in ``streamed``, are read from
+    their source when scheduled.
+    """
+    module: str
+    class_name: str
+    methods: list = field(default_factory=list)
+    streamed: list = field(default_factory=list)
+
+    @property
+    def class_key(self):
+        return f"{self.module}.{self.class_name}"
+
+    @property
+    def name(self):
+        return self.class_name.rsplit(".", 1)[-1]
+
+    def load(self):
+        test_class = importlib.import_module(self.module)
+        for attribute in self.class_name.split("."):
+            test_class = getattr(test_class, attribute)
+        return test_class
+
+
+def _module_name(file: Path) -> str:
+    """
+    Dotted module name for a test file, relative to the deepest sys.path entry containing it.  Files outside sys.path
+    get their directory added, matching the old ``importlib.import_module(file.stem)`` behaviour.
+    """
+    file = file.resolve()
+    roots = [Path(entry or os.getcwd()).resolve() for entry in sys.path]
+    roots = [root for root in roots if root in file.parents]
+    if not roots:
+        sys.path.append(str(file.parent))
+        return file.stem
+    root = max(roots, key=lambda r: len(r.parts))
+    return ".".join(file.relative_to(root).with_suffix("").parts)
+
+
+class StormCollectionIndex:
+    """
+    On-disk index of discovered test classes and their test methods, keyed by file path.
+
+    A file whose mtime and size are unchanged is trusted without being read.  If only the mtime moved, the content hash
+    decides.  Only files that really changed are imported and introspected again.  The modules defining the base
+    classes and mixins of a file's test classes are fingerprinted the same way, as test methods are inherited from
+    them, and a change to any of them introspects the file again too.
+
+    :param path:    JSON file the index is stored in, defaults to .storm_cache/collection.json
+    """
+
+    version = 3
+
+    def __init__(self, path: Path | str = None):
+        self.path = Path(path) if path else Path.cwd() / ".storm_cache" / "collection.json"
+        self.files = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read collection index {self.path}, rebuilding.  Reason: {e}")
+            return
+        if index.get("version") == self.version:
+            self.files = index.get("files", {})
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"version": self.version, "files": self.files}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+        self._dirty = False
+
+    @staticmethod
+    def _hash(file: Path) -> str:
+        return hashlib.sha1(file.read_bytes()).hexdigest()
+
+    def _fingerprint(self, file: Path) -> dict:
+        stat = file.stat()
+        return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": self._hash(file)}
+
+    def _unchanged(self, file: Path, fingerprint: dict) -> bool:
+        try:
+            stat = file.stat()
+        except OSError:
+            return False
+        if fingerprint["mtime_ns"] == stat.st_mtime_ns and fingerprint["size"] == stat.st_size:
+            return True
+        if fingerprint["size"] == stat.st_size and fingerprint["sha1"] == self._hash(file):
+            fingerprint["mtime_ns"] = stat.st_mtime_ns
+            self._dirty = True
+            return True
+        return False
+
+    def _cached_entry(self, file: Path, index_key: str):
+        entry = self.files.get(index_key)
+        if entry is None or not self._unchanged(file, entry):
+            return None
+        if not all(self._unchanged(Path(path), fingerprint) for path, fingerprint in entry["depends"].items()):
+            return None
+        return entry
+
+    def _introspect(self, file: Path, base_class: type, collector: Callable) -> dict:
+        module_name = _module_name(file)
+        logger.info(f"Collecting tests from {file}")
+        module = importlib.import_module(module_name)
+        classes = []
+        depends = set()
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            if cls is base_class or not issubclass(cls, base_class) or cls.__module__ != module.__name__:
+                continue
+            for parent in cls.__mro__:
+                if parent in base_class.__mro__ or parent.__module__ == module.__name__:
+                    continue
+                source = getattr(sys.modules.get(parent.__module__), "__file__", None)
+                if source:
+                    depends.add(Path(source).resolve())
+            classes.append({
+                "name": cls.__qualname__,
+                "methods": [list(method) if isinstance(method, tuple) else method for method in collector(cls)],
+                "streamed": [name for name, member in inspect.getmembers(cls, inspect.isfunction)
+                             if hasattr(member, "_row_source")],
+            })
+        return {
+            "module": module_name,
+            "classes": classes,
+            "depends": {str(path): self._fingerprint(path) for path in sorted(depends)},
+        }
+
+    def discover(
+            self,
+            test_dir: os.PathLike | str,
+            base_class: type,
+            collector: Callable,
+            pattern: str = "*_test.py",
+    ) -> list[StormCollectedClass]:
+        """
+        Finds the subclasses of ``base_class`` defined in the files of ``test_dir`` matching ``pattern``.
+
+        :param test_dir:    Directory searched recursively for test files
+        :param base_class:  Test base class, e.g. StormTest or StormBehaviorDrivenTest
+        :param collector:   Called with each class found, returns the list of its tests to record
+        :param pattern:     Glob the test file names must match
+        """
+        collected = []
+        for file in sorted(Path(test_dir).rglob(pattern)):
+            index_key = f"{base_class.__module__}.{base_class.__qualname__}:{file.resolve()}"
+            entry = self._cached_entry(file, index_key)
+            if entry is None:
+                entry = self._introspect(file, base_class, collector)
+                entry.update(self._fingerprint(file))
+                self.files[index_key] = entry
+                self._dirty = True
+            for test_class in entry["classes"]:
+                collected.append(StormCollectedClass(
+                    module=entry["module"],
+                    class_name=test_class["name"],
+                    methods=[tuple(method) if isinstance(method, list) else method for method in test_class["methods"]],
+                    streamed=test_class.get("streamed", []),
+                ))
+        return collected
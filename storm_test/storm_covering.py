@@ -0,0 +1,224 @@
+import math
+from dataclasses import dataclass
+from itertools import combinations, product
+from typing import Callable, Iterator, Sequence
+
+
+@dataclass
+class StormCoverageReport:
+    """
+    How much of the interaction space a covering array covers.  A ``strength``-way interaction is one value from each
+    of ``strength`` dimensions.
+
+    :param strength:        Interactions of how many dimensions are covered, 2 for pairwise
+    :param dimensions:      Number of values of every dimension
+    :param scenarios:       Rows of the covering array, the scenarios run
+    :param exhaustive:      Rows of the full product, constraints aside
+    :param interactions:    Interactions the constraints allow
+    :param covered:         Allowed interactions some scenario covers
+    :param excluded:        Interactions the constraints rule out
+    """
+    strength: int
+    dimensions: list[int]
+    scenarios: int
+    exhaustive: int
+    interactions: int
+    covered: int
+    excluded: int
+
+    @property
+    def coverage(self) -> float:
+        """
+        Share of the allowed interactions covered.  Below 1 only when the constraints leave an interaction no
+        complete scenario to be part of.
+        """
+        return self.covered / self.interactions if self.interactions else 1.0
+
+    @property
+    def uncoverable(self) -> int:
+        return self.interactions - self.covered
+
+    def summary(self) -> str:
+        lines = [
+            f"{self.strength}-way coverage {self.coverage:.1%}: {self.covered} of {self.interactions} interactions "
+            f"in {self.scenarios} scenarios, {self.exhaustive} in the full product",
+        ]
+        if self.excluded:
+            lines.append(f"{self.excluded} interactions ruled out by constraints")
+        if self.uncoverable:
+            lines.append(f"{self.uncoverable} allowed interactions are in no scenario the constraints allow")
+        return "\n".join(lines)
+
+
+def covering_array(
+        dimensions: Sequence[Sequence],
+        strength: int = 2,
+        compatible: Callable[[object, object], bool] = None,
+) -> tuple[list[tuple], StormCoverageReport]:
+    """
+    Picks rows, one value per dimension, so that every ``strength``-way interaction of values the constraints allow
+    is in at least one row.  Rows are built greedily, each covering as many uncovered interactions as it can, which
+    typically takes a small multiple of the two largest dimensions for pairwise coverage rather than their full
+    product.  The result only depends on the input, so the same scenarios run from run to run.
+
+    :param dimensions:  Values of every dimension, in order
+    :param strength:    Interactions of how many dimensions to cover, at most the number of dimensions
+    :param compatible:  Whether two values of different dimensions may be in one row.  All may without
+    :return:            The rows, as tuples of values in dimension order, and a report of the coverage they reach
+    """
+    if strength < 1:
+        raise ValueError(f"Invalid strength {strength}, expected at least 1")
+    sizes = [len(values) for values in dimensions]
+    strength = min(strength, len(sizes))
+    # Values are (dimension, index) pairs from here on, with the pairs that can't share a row worked out up front
+    conflicts = {(dimension, index): set() for dimension, size in enumerate(sizes) for index in range(size)}
+    if compatible is not None:
+        for (dimension_a, size_a), (dimension_b, size_b) in combinations(enumerate(sizes), 2):
+            for index_a, index_b in product(range(size_a), range(size_b)):
+                if not compatible(dimensions[dimension_a][index_a], dimensions[dimension_b][index_b]):
+                    conflicts[(dimension_a, index_a)].add((dimension_b, index_b))
+                    conflicts[(dimension_b, index_b)].add((dimension_a, index_a))
+
+    uncovered = set()
+    excluded = 0
+    for dimension_set in combinations(range(len(sizes)), strength):
+        for indices in product(*(range(sizes[dimension]) for dimension in dimension_set)):
+            interaction = tuple(zip(dimension_set, indices))
+            if any(b in conflicts[a] for a, b in combinations(interaction, 2)):
+                excluded += 1
+            else:
+                uncovered.add(interaction)
+    interactions = len(uncovered)
+
+    rows = []
+    uncoverable = 0
+    for seed in sorted(uncovered):
+        if seed not in uncovered:
+            continue
+        row = _complete_row(dict(seed), sizes, strength, conflicts, uncovered)
+        if row is None:
+            # No row the constraints allow holds it
+            uncovered.discard(seed)
+            uncoverable += 1
+            continue
+        for dimension_set in combinations(range(len(sizes)), strength):
+            uncovered.discard(tuple((dimension, row[dimension]) for dimension in dimension_set))
+        rows.append(tuple(dimensions[dimension][row[dimension]] for dimension in range(len(sizes))))
+
+    report = StormCoverageReport(
+        strength=strength,
+        dimensions=sizes,
+        scenarios=len(rows),
+        exhaustive=math.prod(sizes),
+        interactions=interactions,
+        covered=interactions - uncoverable,
+        excluded=excluded,
+    )
+    return rows, report
+
+
+def _complete_row(
+        row: dict[int, int],
+        sizes: list[int],
+        strength: int,
+        conflicts: dict[tuple[int, int], set],
+        uncovered: set,
+) -> dict[int, int] | None:
+    """
+    Fills in the dimensions missing from ``row``, each with the value that covers the most uncovered interactions
+    alongside the values already in the row.  Backtracks when the constraints leave a dimension no value, and returns
+    None when no completion exists.
+    """
+    missing = [dimension for dimension in range(len(sizes)) if dimension not in row]
+    if not missing:
+        return row
+    dimension = missing[0]
+    assigned = sorted(row.items())
+    candidates = []
+    for index in range(sizes[dimension]):
+        value = (dimension, index)
+        if any(other in conflicts[value] for other in assigned):
+            continue
+        gain = sum(
+            tuple(sorted(others + (value,))) in uncovered for others in combinations(assigned, strength - 1)
+        )
+        candidates.append((-gain, index))
+    for _, index in sorted(candidates):
+        row[dimension] = index
+        if _complete_row(row, sizes, strength, conflicts, uncovered) is not None:
+            return row
+        del row[dimension]
+    return None
+
+
+class StormConstraintIndex:
+    """
+    Which items can't be in a row together, compiled into one bitmap per item.  Checking an item against a whole
+    partial row is then a single AND, so rows are enumerated without ever visiting a combination a constraint rules
+    out, and without evaluating the constraints again.
+
+    :param items:   The items, e.g. the steps of a test class, hashable
+    :param tags:    Tags of every item, in the order of ``items``, for exclude_where
+    """
+
+    def __init__(self, items: Sequence, tags: Sequence[frozenset] = None):
+        self.items = list(items)
+        self.tags = list(tags) if tags is not None else [frozenset()] * len(self.items)
+        self.positions = {item: position for position, item in enumerate(self.items)}
+        self.exclusions = [0] * len(self.items)
+
+    def exclude(self, item_a, item_b):
+        """
+        Rules out rows with both items.  Items the index doesn't hold are ignored.
+        """
+        if item_a in self.positions and item_b in self.positions:
+            self._exclude(self.positions[item_a], self.positions[item_b])
+
+    def exclude_where(self, item, predicate: Callable[[frozenset], bool]):
+        """
+        Rules out rows with ``item`` and any other item whose tags ``predicate`` is true for.
+        """
+        position = self.positions.get(item)
+        if position is None:
+            return
+        for other, tags in enumerate(self.tags):
+            if other != position and predicate(tags):
+                self._exclude(position, other)
+
+    def _exclude(self, position_a: int, position_b: int):
+        self.exclusions[position_a] |= 1 << position_b
+        self.exclusions[position_b] |= 1 << position_a
+
+    def compatible(self, position_a: int, position_b: int) -> bool:
+        return not self.exclusions[position_a] >> position_b & 1
+
+    def allows(self, mask: int, position: int) -> bool:
+        """
+        Whether the item at ``position`` may join a row, given as the mask of the positions in it.
+        """
+        return not self.exclusions[position] & mask
+
+    def constrained(self, position: int) -> bool:
+        return bool(self.exclusions[position])
+
+    def rows(self, dimensions: Sequence[Sequence[int]]) -> Iterator[tuple[int, ...]]:
+        """
+        Yields the rows of the product of ``dimensions``, lists of positions, that no constraint rules out.  A
+        partial row that is ruled out is dropped with every row it would have led to.
+        """
+        if not any(self.exclusions[position] for dimension in dimensions for position in dimension):
+            yield from product(*dimensions)
+            return
+        row = []
+
+        def extend(depth: int, mask: int) -> Iterator[tuple[int, ...]]:
+            if depth == len(dimensions):
+                yield tuple(row)
+                return
+            for position in dimensions[depth]:
+                if not self.exclusions[position] & mask:
+                    row.append(position)
+                    yield from extend(depth + 1, mask | 1 << position)
+                    row.pop()
+
+        yield from extend(0, 0)
@@ -0,0 +1,436 @@
+import logging
+import os
+import pickle
+import socket
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+
+from storm_test.storm_fixtures import StormFixtureValues
+from storm_test.storm_scheduler import (
+    StormBatchOptions,
+    StormExecutionBackend,
+    StormWorkerMessage,
+    StormWorkItem,
+    create_pool,
+)
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TOPIC = "storm_test.request"
+RESULT_TOPIC = "storm_test.result"
+CONTROL_TOPIC = "storm_test.control"
+
+
+class StormBroker(ABC):
+    """
+    The little a distributed run needs from a message broker: topics, and consumer groups whose consumers share a
+    topic's messages while every group sees all of them.  Values are opaque bytes.
+    """
+
+    @abstractmethod
+    def publish(self, topic: str, value: bytes):
+        pass
+
+    @abstractmethod
+    def poll(self, topic: str, group: str, timeout: float = 1.0) -> bytes | None:
+        """
+        Returns the next message of ``topic`` for ``group``, or None if nothing arrives within ``timeout`` seconds.
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class StormLocalBroker(StormBroker):
+    """
+    In-process stand-in for Kafka, so a coordinator and any number of remote workers can run on one machine, e.g. as
+    threads.  Each topic is an append-only log, and each consumer group keeps its own offset into it, starting from
+    the beginning like a Kafka group reading from the earliest offset.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._logs = {}
+        self._offsets = {}
+
+    def publish(self, topic: str, value: bytes):
+        with self._condition:
+            self._logs.setdefault(topic, []).append(value)
+            self._condition.notify_all()
+
+    def poll(self, topic: str, group: str, timeout: float = 1.0) -> bytes | None:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                log = self._logs.get(topic, [])
+                offset = self._offsets.get((topic, group), 0)
+                if offset < len(log):
+                    self._offsets[(topic, group)] = offset + 1
+                    return log[offset]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+
+class StormKafkaBroker(StormBroker):
+    """
+    Broker on Kafka, through confluent_kafka.  Only needed, and only imported, when running against a real cluster.
+
+    :param config:  confluent_kafka configuration, e.g. {"bootstrap.servers": "localhost:29092"}.  The group id and
+                    offset reset are set per consumer.
+    """
+
+    def __init__(self, config: dict):
+        from confluent_kafka import Producer
+
+        self.config = config
+        self._producer = Producer(config)
+        self._consumers = {}
+
+    def publish(self, topic: str, value: bytes):
+        self._producer.produce(topic, value)
+        self._producer.flush()
+
+    def poll(self, topic: str, group: str, timeout: float = 1.0) -> bytes | None:
+        from confluent_kafka import Consumer
+
+        consumer = self._consumers.get((topic, group))
+        if consumer is None:
+            consumer = Consumer({**self.config, "group.id": group, "auto.offset.reset": "earliest"})
+            consumer.subscribe([topic])
+            self._consumers[(topic, group)] = consumer
+        message = consumer.poll(timeout)
+        if message is None:
+            return None
+        if message.error():
+            logger.warning(f"Kafka error on {topic}: {message.error()}")
+            return None
+        return message.value()
+
+    def close(self):
+        for consumer in self._consumers.values():
+            consumer.close()
+        self._consumers = {}
+        self._producer.flush()
+
+
+class StormRemoteMessageKind:
+    # A remote worker took a request
+    ACK = "ACK"
+    # A remote worker is alive, sent on a timer independent of the tests it runs
+    HEARTBEAT = "HEARTBEAT"
+    # One of the StormWorkerMessage messages of a request
+    MESSAGE = "MESSAGE"
+    # A remote worker finished a request
+    DONE = "DONE"
+
+
+@dataclass
+class StormWorkRequest:
+    """
+    Consecutive methods of one test class, run by one remote worker so the class is set up once.  Published again,
+    with only the methods still outstanding and the next ``delivery``, when the worker that took it is lost.
+    """
+    run_id: str
+    batch_id: int
+    request_id: int
+    delivery: int
+    work_items: list[StormWorkItem]
+    test_data: dict = None
+    fixtures: StormFixtureValues = None
+    options: StormBatchOptions = None
+
+
+@dataclass
+class StormRemoteMessage:
+    kind: str
+    worker: str
+    run_id: str = None
+    batch_id: int = None
+    request_id: int = None
+    # (message, worker_id, work_item, payload), as the remote worker's own pool reported it
+    message: tuple = None
+
+
+@dataclass
+class StormBatchClosed:
+    """
+    Sent on the control topic once a batch is finished or aborted.  Workers drop its leftover requests, and stop
+    taking work on any of them they are running.
+    """
+    run_id: str
+    batch_id: int
+
+
+class StormRemoteWorker:
+    """
+    Takes work requests off the broker and runs them on a local pool, streaming every message back to the
+    coordinator.  Start as many as needed, on as many machines as needed: they compete for requests, so faster
+    machines simply take more of them.  The test modules have to be importable on every machine.
+
+    Messages are pickled, so only connect workers and coordinators to a broker you trust.
+
+    :param broker:              Broker shared with the coordinator
+    :param name:                Worker name in results and logs, defaults to host, pid and a random suffix
+    :param backend:             Local execution backend, processes by default so timeouts and crashes are contained
+    :param max_workers:         Size of the local pool
+    :param preload:             Modules the local worker processes import once
+    :param heartbeat_interval:  Seconds between heartbeats
+    :param group:               Consumer group the remote workers share the request topic through
+    """
+
+    def __init__(
+            self,
+            broker: StormBroker,
+            name: str = None,
+            backend: StormExecutionBackend | str = StormExecutionBackend.PROCESS,
+            max_workers: int = None,
+            preload: list[str] = None,
+            heartbeat_interval: float = 1.0,
+            group: str = "storm-workers",
+    ):
+        self.broker = broker
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.pool = create_pool(StormExecutionBackend(backend), max_workers=max_workers, preload=preload)
+        self.heartbeat_interval = heartbeat_interval
+        self.group = group
+        self.closed = set()
+        self._current = None
+        self._stop = threading.Event()
+
+    def _send(self, kind: str, request: StormWorkRequest = None, message: tuple = None):
+        self.broker.publish(RESULT_TOPIC, pickle.dumps(StormRemoteMessage(
+            kind=kind,
+            worker=self.name,
+            run_id=request.run_id if request else None,
+            batch_id=request.batch_id if request else None,
+            request_id=request.request_id if request else None,
+            message=message,
+        )))
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            self._send(StormRemoteMessageKind.HEARTBEAT)
+
+    def _poll_control(self):
+        while (value := self.broker.poll(CONTROL_TOPIC, f"{self.group}-control-{self.name}", timeout=0)) is not None:
+            closed = pickle.loads(value)
+            self.closed.add((closed.run_id, closed.batch_id))
+            if self._current == (closed.run_id, closed.batch_id):
+                self.pool.abort()
+
+    def handle(self, request: StormWorkRequest):
+        self._poll_control()
+        if (request.run_id, request.batch_id) in self.closed:
+            return
+        self._current = (request.run_id, request.batch_id)
+        self._send(StormRemoteMessageKind.ACK, request)
+        logger.info(f"{self.name} took {len(request.work_items)} tests of batch {request.batch_id}")
+        try:
+            for message, worker_id, work_item, payload in self.pool.run_batch(
+                    [request.work_items], request.test_data, request.fixtures, request.options
+            ):
+                self._send(
+                    StormRemoteMessageKind.MESSAGE, request, (message, f"{self.name}/{worker_id}", work_item, payload)
+                )
+                self._poll_control()
+        finally:
+            self._current = None
+        self._send(StormRemoteMessageKind.DONE, request)
+
+    def run(self):
+        """
+        Serves requests until stop() is called.
+        """
+        heartbeat = threading.Thread(target=self._heartbeat, name=f"{self.name}-heartbeat", daemon=True)
+        heartbeat.start()
+        logger.info(f"Storm worker {self.name} waiting for work")
+        try:
+            while not self._stop.is_set():
+                value = self.broker.poll(REQUEST_TOPIC, self.group, timeout=1.0)
+                if value is not None:
+                    self.handle(pickle.loads(value))
+        finally:
+            self._stop.set()
+            heartbeat.join()
+            self.pool.shutdown()
+
+    def stop(self):
+        self._stop.set()
+
+
+@dataclass
+class _RequestState:
+    request: StormWorkRequest
+    outstanding: dict = field(default_factory=dict)
+    worker: str = None
+    # Worker id and work item of the last test the worker started
+    started: tuple = None
+    finished: bool = False
+
+
+class StormDistributedPool:
+    """
+    Coordinator side of a distributed run, with the same interface as StormWorkerPool.  Each batch is published as
+    work requests, one per run of consecutive methods of a class in the scheduler's assignments, and the remote
+    workers' messages are yielded as if a local pool had produced them.
+
+    A remote worker acknowledges a request when it takes it.  If a worker that holds a request stops sending
+    heartbeats, the request's outstanding methods are published again, up to ``max_redeliveries`` times.  After that
+    the test it was running is reported lost, and the rest are left not run.  Messages from a worker after its
+    request was handed on are dropped, so each result counts once.
+
+    :param broker:              Broker shared with the remote workers
+    :param max_workers:         How many shares the scheduler splits each batch into.  Roughly the number of remote
+                                workers, more shares give idle workers more to pick from
+    :param heartbeat_timeout:   Seconds without a message from a worker before its requests are redelivered
+    :param max_redeliveries:    Times a request is redelivered before its running test is reported lost
+    """
+
+    def __init__(
+            self,
+            broker: StormBroker,
+            max_workers: int = None,
+            heartbeat_timeout: float = 10.0,
+            max_redeliveries: int = 3,
+            **kwargs,
+    ):
+        self.broker = broker
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_redeliveries = max_redeliveries
+        self.run_id = uuid.uuid4().hex
+        self._batch_id = 0
+        self._aborted = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def _close_batch(self):
+        self.broker.publish(CONTROL_TOPIC, pickle.dumps(StormBatchClosed(self.run_id, self._batch_id)))
+
+    def abort(self):
+        if not self._aborted:
+            self._aborted = True
+            self._close_batch()
+
+    def _publish(self, state: _RequestState):
+        state.request.work_items = list(state.outstanding.values())
+        state.worker = None
+        state.started = None
+        self.broker.publish(REQUEST_TOPIC, pickle.dumps(state.request))
+
+    @staticmethod
+    def _class_runs(items: list[StormWorkItem]) -> list[list[StormWorkItem]]:
+        runs = []
+        for item in items:
+            if runs and runs[-1][-1].class_key == item.class_key:
+                runs[-1].append(item)
+            else:
+                runs.append([item])
+        return runs
+
+    def run_batch(
+            self,
+            assignments: list[list[StormWorkItem]],
+            test_data=None,
+            fixtures: StormFixtureValues = None,
+            options: StormBatchOptions = None,
+    ):
+        self._batch_id += 1
+        self._aborted = False
+        batch_id = self._batch_id
+        shares = [self._class_runs(items) for items in assignments]
+        states = {}
+        # Longest work first from every share in turn, so the first requests taken are the long ones
+        for position in range(max((len(runs) for runs in shares), default=0)):
+            for runs in shares:
+                if position < len(runs):
+                    request_id = len(states)
+                    states[request_id] = _RequestState(
+                        request=StormWorkRequest(
+                            self.run_id, batch_id, request_id, 1, runs[position], test_data, fixtures, options
+                        ),
+                        outstanding={item.test_id: item for item in runs[position]},
+                    )
+                    self._publish(states[request_id])
+
+        group = f"storm-coordinator-{self.run_id}"
+        last_seen = {}
+        waiting_since = time.monotonic()
+        try:
+            while any(
+                    not state.finished and (state.worker or not self._aborted) for state in states.values()
+            ):
+                value = self.broker.poll(RESULT_TOPIC, group, timeout=min(1.0, self.heartbeat_timeout / 2))
+                now = time.monotonic()
+                if value is not None:
+                    remote = pickle.loads(value)
+                    last_seen[remote.worker] = now
+                    state = states.get(remote.request_id)
+                    if remote.run_id == self.run_id and remote.batch_id == batch_id and not state.finished:
+                        yield from self._receive(state, remote)
+
+                for state in states.values():
+                    if state.finished or state.worker is None:
+                        continue
+                    if now - last_seen.get(state.worker, now) > self.heartbeat_timeout:
+                        yield from self._lost(state)
+
+                if not last_seen and now - waiting_since > self.heartbeat_timeout:
+                    logger.warning(f"No storm worker has picked up batch {batch_id} in {self.heartbeat_timeout}s")
+                    waiting_since = now
+        finally:
+            self._close_batch()
+
+    def _receive(self, state: _RequestState, remote: StormRemoteMessage):
+        match remote.kind:
+            case StormRemoteMessageKind.ACK:
+                state.worker = remote.worker
+                return
+            case StormRemoteMessageKind.DONE:
+                if remote.worker == state.worker:
+                    state.finished = True
+                return
+        if remote.worker != state.worker:
+            # From a worker that was given up on, its request has been handed to another one
+            return
+        message, worker_id, work_item, payload = remote.message
+        if message == StormWorkerMessage.STARTED:
+            state.started = (worker_id, work_item)
+        elif message == StormWorkerMessage.RESULT and work_item.rows is not None:
+            # A row of a streamed batch.  The batch stays outstanding until ROWS_DONE, resuming after this row if the
+            # request is redelivered
+            rest = work_item.rest_of_batch
+            if rest.test_id not in state.outstanding:
+                return
+            state.outstanding[rest.test_id] = rest
+        elif message in (StormWorkerMessage.RESULT, StormWorkerMessage.ROWS_DONE, StormWorkerMessage.CLASS_BROKEN):
+            if state.outstanding.pop(work_item.test_id, None) is None:
+                return
+        yield remote.message
+
+    def _lost(self, state: _RequestState):
+        logger.error(f"Storm worker {state.worker} stopped responding, it held request {state.request.request_id}")
+        if state.request.delivery <= self.max_redeliveries and not self._aborted:
+            state.request.delivery += 1
+            self._publish(state)
+            return
+        state.finished = True
+        if state.started:
+            worker_id, work_item = state.started
+            yield StormWorkerMessage.WORKER_LOST, worker_id, work_item, f"{state.worker} stopped responding"
@@ -0,0 +1,128 @@
+import inspect
+import logging
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class StormFixtureScope(Enum):
+    SESSION = "SESSION"
+    SUITE = "SUITE"
+
+
+class StormFixtureError(Exception):
+    pass
+
+
+def session_fixture(func):
+    """
+    Marks a fixture that is set up once per run, in the parent process, and torn down at the end of the run.
+
+    A fixture is a plain function returning its value, or a generator that yields its value and tears down after the
+    yield.  Parameters are filled with fixtures set up before it, by name.  The value is pickled to every worker, so
+    return handles (topic names, table ids, blob paths) rather than live clients.
+    """
+    func._fixture_scope = StormFixtureScope.SESSION
+    return func
+
+
+def suite_fixture(func):
+    """
+    Marks a fixture that is set up once per suite, in the parent process, and torn down when the suite finishes.
+    See session_fixture for how fixtures are written.
+    """
+    func._fixture_scope = StormFixtureScope.SUITE
+    return func
+
+
+@dataclass
+class StormFixtureValues:
+    """
+    Fixture values as shipped to the workers, along with the reason for any fixture that failed to set up.
+    """
+    values: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+
+    def merged(self, other: "StormFixtureValues"):
+        return StormFixtureValues(
+            values={**self.values, **other.values},
+            errors={**self.errors, **other.errors},
+        )
+
+
+# Fixture values for the batch the current worker is running
+_active_fixtures = StormFixtureValues()
+
+
+def activate_fixtures(fixtures: StormFixtureValues | None):
+    global _active_fixtures
+    _active_fixtures = fixtures or StormFixtureValues()
+
+
+def get_fixture(name: str):
+    """
+    Returns the value of a session or suite fixture inside a running test.
+    """
+    if name in _active_fixtures.values:
+        return _active_fixtures.values[name]
+    if name in _active_fixtures.errors:
+        raise StormFixtureError(f"Fixture {name} failed to set up: {_active_fixtures.errors[name]}")
+    raise StormFixtureError(f"Fixture {name} is not set up for this run")
+
+
+class StormFixtureSet:
+    """
+    The fixtures of one scope.  Sets them up in order, then tears them down in reverse order.
+
+    :param fixtures:    Fixture functions, decorated with session_fixture or suite_fixture
+    :param inherited:   Values of the enclosing scope, available to these fixtures and passed on to the workers
+    """
+
+    def __init__(self, fixtures: list[Callable] = None, inherited: StormFixtureValues = None):
+        self.fixtures = fixtures or []
+        self.inherited = inherited or StormFixtureValues()
+        self.own = StormFixtureValues()
+        self._generators = []
+
+    @property
+    def values(self) -> StormFixtureValues:
+        return self.inherited.merged(self.own)
+
+    def set_up(self) -> StormFixtureValues:
+        for fixture in self.fixtures:
+            name = fixture.__name__
+            available = self.values.values
+            kwargs = {
+                parameter: available[parameter]
+                for parameter in inspect.signature(fixture).parameters
+                if parameter in available
+            }
+            logger.info(f"Setting up fixture {name}")
+            try:
+                if inspect.isgeneratorfunction(fixture):
+                    generator = fixture(**kwargs)
+                    self.own.values[name] = next(generator)
+                    self._generators.append((name, generator))
+                else:
+                    self.own.values[name] = fixture(**kwargs)
+            except Exception as e:
+                logger.error(f"Fixture {name} failed to set up.  Reason: {e}")
+                self.own.errors[name] = str(e)
+        return self.values
+
+    def tear_down(self):
+        while self._generators:
+            name, generator = self._generators.pop()
+            logger.info(f"Tearing down fixture {name}")
+            try:
+                next(generator)
+            except StopIteration:
+                pass
+            except Exception as e:
+                logger.error(f"Fixture {name} failed to tear down.  Reason: {e}")
+            else:
+                logger.warning(f"Fixture {name} yielded more than once, only the first value is used")
+                generator.close()
+        self.own = StormFixtureValues()
@@ -0,0 +1,492 @@
+import functools
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Hashable, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class StormFeatureError(Exception):
+    pass
+
+
+# Step keywords, And, But and * take the keyword of the step before them
+_STEP_KEYWORDS = {"Given": "GIVEN", "When": "WHEN", "Then": "THEN", "And": None, "But": None, "*": None}
+_SCENARIO_KEYWORDS = {"Scenario", "Example"}
+_OUTLINE_KEYWORDS = {"Scenario Outline", "Scenario Template"}
+_EXAMPLES_KEYWORDS = {"Examples", "Scenarios"}
+_SECTION_KEYWORDS = {"Rule", "Background"} | _SCENARIO_KEYWORDS | _OUTLINE_KEYWORDS | _EXAMPLES_KEYWORDS
+_DOC_STRING_DELIMITERS = ('"""', "```")
+_OUTLINE_PARAMETER = re.compile(r"<([^<>]+)>")
+_TABLE_SEPARATOR = re.compile(r"(?<!\\)\|")
+
+
+def _substitute(text: str | None, values: dict[str, str]) -> str | None:
+    if text is None or "<" not in text:
+        return text
+    return _OUTLINE_PARAMETER.sub(lambda match: values.get(match[1], match[0]), text)
+
+
+@dataclass
+class StormFeatureStep:
+    """
+    :param keyword:     GIVEN, WHEN or THEN.  And, But and * steps have the keyword of the step before them
+    :param text:        Text of the step after its keyword
+    :param line:        Line of the step in its file
+    :param doc_string:  Doc string argument of the step
+    :param table:       Data table argument of the step, as rows of cells
+    """
+    keyword: str
+    text: str
+    line: int
+    doc_string: str = None
+    table: list[list[str]] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.keyword} {self.text}"
+
+    def substitute(self, values: dict[str, str]) -> "StormFeatureStep":
+        """
+        The step with the ``<parameters>`` of a Scenario Outline replaced by ``values``.
+        """
+        return StormFeatureStep(
+            keyword=self.keyword,
+            text=_substitute(self.text, values),
+            line=self.line,
+            doc_string=_substitute(self.doc_string, values),
+            table=[[_substitute(cell, values) for cell in row] for row in self.table] if self.table else self.table,
+        )
+
+
+@dataclass
+class StormFeatureExamples:
+    name: str
+    line: int
+    header: list[str] = field(default_factory=list)
+    rows: list[list[str]] = field(default_factory=list)
+    tags: list[str] = field(default_factory=list)
+
+
+@dataclass
+class StormFeatureScenario:
+    """
+    A Scenario, or a Scenario Outline when it has ``examples``.
+
+    :param background:  Background steps run before the scenario's own, those of its feature and rule
+    """
+    name: str
+    line: int
+    steps: list[StormFeatureStep] = field(default_factory=list)
+    tags: list[str] = field(default_factory=list)
+    examples: list[StormFeatureExamples] = None
+    background: list[StormFeatureStep] = field(default_factory=list)
+
+    @property
+    def is_outline(self) -> bool:
+        return self.examples is not None
+
+    def expand(self) -> Iterator["StormFeatureScenario"]:
+        """
+        The scenarios to run: the scenario itself, or one per Examples row of an outline, made only as they are
+        iterated so a large Examples table is never expanded all at once.
+        """
+        if not self.is_outline:
+            yield self
+            return
+        index = 0
+        for examples in self.examples:
+            for row in examples.rows:
+                values = dict(zip(examples.header, row))
+                yield StormFeatureScenario(
+                    name=f"{_substitute(self.name, values)} - {index}",
+                    line=self.line,
+                    steps=[step.substitute(values) for step in self.steps],
+                    tags=self.tags + examples.tags,
+                    background=self.background,
+                )
+                index += 1
+
+
+@dataclass
+class StormFeature:
+    name: str
+    path: str
+    line: int
+    description: str = ""
+    tags: list[str] = field(default_factory=list)
+    scenarios: list[StormFeatureScenario] = field(default_factory=list)
+
+    def iter_scenarios(self) -> Iterator[StormFeatureScenario]:
+        """
+        Every scenario to run, in file order, with Scenario Outlines expanded lazily, see StormFeatureScenario.expand.
+        """
+        for scenario in self.scenarios:
+            yield from scenario.expand()
+
+    def to_dict(self) -> dict:
+        """
+        The feature as plain JSON data, compact: steps are rows of their fields, and backgrounds are stored once
+        rather than with every scenario.
+        """
+        backgrounds = {}
+        scenarios = []
+        for scenario in self.scenarios:
+            background = backgrounds.setdefault(id(scenario.background), (len(backgrounds), scenario.background))[0]
+            examples = None
+            if scenario.examples is not None:
+                examples = [
+                    [table.name, table.line, table.header, table.rows, table.tags] for table in scenario.examples
+                ]
+            scenarios.append(
+                [scenario.name, scenario.line, scenario.tags, background, _step_rows(scenario.steps), examples]
+            )
+        return {
+            "name": self.name,
+            "path": self.path,
+            "line": self.line,
+            "description": self.description,
+            "tags": self.tags,
+            "backgrounds": [_step_rows(steps) for _, steps in backgrounds.values()],
+            "scenarios": scenarios,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StormFeature":
+        backgrounds = [[StormFeatureStep(*row) for row in steps] for steps in data["backgrounds"]]
+        return cls(
+            name=data["name"],
+            path=data["path"],
+            line=data["line"],
+            description=data["description"],
+            tags=data["tags"],
+            scenarios=[
+                StormFeatureScenario(
+                    name=name,
+                    line=line,
+                    steps=[StormFeatureStep(*row) for row in steps],
+                    tags=tags,
+                    examples=[StormFeatureExamples(*table) for table in examples] if examples is not None else None,
+                    background=backgrounds[background],
+                )
+                for name, line, tags, background, steps, examples in data["scenarios"]
+            ],
+        )
+
+
+def _step_rows(steps: list[StormFeatureStep]) -> list[list]:
+    rows = []
+    for step in steps:
+        row = [step.keyword, step.text, step.line]
+        if step.doc_string is not None or step.table is not None:
+            row += [step.doc_string, step.table]
+        rows.append(row)
+    return rows
+
+
+def _table_cells(line: str) -> list[str]:
+    cells = _TABLE_SEPARATOR.split(line.strip())[1:-1]
+    return [cell.strip().replace("\\|", "|").replace("\\n", "\n").replace("\\\\", "\\") for cell in cells]
+
+
+def parse_feature(text: str, path: str = "<string>") -> StormFeature:
+    """
+    Parses the text of a Gherkin feature file: Feature, Rule, Background, Scenario and Scenario Outline with their
+    Examples, tags, doc strings, data tables and comments, in English.
+
+    :raises StormFeatureError:  When the text isn't a feature, with the file and line it went wrong on
+    """
+    feature = None
+    # Background of the feature, and of the rule the parser is in, apply to the scenarios that follow
+    feature_background = []
+    rule_background = []
+    rule_tags = []
+    in_rule = False
+    # Background of the scenarios that follow, one list they all share
+    scenario_background = None
+    steps = None
+    scenario = None
+    examples = None
+    last_step = None
+    last_keyword = None
+    tags = []
+    describing = False
+    lines = text.splitlines()
+    number = 0
+
+    def error(message: str) -> StormFeatureError:
+        return StormFeatureError(f"{path}:{number}: {message}")
+
+    while number < len(lines):
+        raw = lines[number]
+        number += 1
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith(_DOC_STRING_DELIMITERS):
+            if last_step is None:
+                raise error("Doc string without a step")
+            delimiter = line[:3]
+            indent = len(raw) - len(raw.lstrip())
+            content = []
+            while True:
+                if number >= len(lines):
+                    raise error("Doc string isn't closed")
+                raw = lines[number]
+                number += 1
+                if raw.strip() == delimiter:
+                    break
+                content.append(raw[indent:] if raw[:indent].isspace() else raw.lstrip())
+            last_step.doc_string = "\n".join(content)
+            continue
+        if line.startswith("|"):
+            cells = _table_cells(line)
+            if examples is not None:
+                if not examples.header:
+                    examples.header = cells
+                else:
+                    examples.rows.append(cells)
+            elif last_step is not None:
+                if last_step.table is None:
+                    last_step.table = []
+                last_step.table.append(cells)
+            else:
+                raise error("Table without a step or Examples")
+            continue
+        if line.startswith("@"):
+            tags += [tag for tag in line.split() if tag.startswith("@")]
+            continue
+
+        keyword, colon, title = line.partition(":")
+        keyword = keyword.strip()
+        if colon and keyword == "Feature":
+            if feature is not None:
+                raise error("A file holds one Feature")
+            feature = StormFeature(name=title.strip(), path=path, line=number, tags=tags)
+            tags = []
+            describing = True
+            continue
+        if colon and keyword in _SECTION_KEYWORDS:
+            if feature is None:
+                raise error(f"{keyword} before Feature")
+            describing = False
+            last_step = None
+            last_keyword = None
+            if keyword == "Rule":
+                in_rule = True
+                rule_background = []
+                rule_tags = tags
+                scenario_background = None
+                scenario = examples = None
+                steps = None
+            elif keyword == "Background":
+                steps = rule_background if in_rule else feature_background
+                scenario = examples = None
+                scenario_background = None
+            elif keyword in _EXAMPLES_KEYWORDS:
+                if scenario is None or not scenario.is_outline:
+                    raise error("Examples outside a Scenario Outline")
+                examples = StormFeatureExamples(name=title.strip(), line=number, tags=tags)
+                scenario.examples.append(examples)
+                steps = None
+            else:
+                if scenario_background is None:
+                    scenario_background = feature_background + rule_background if in_rule else feature_background
+                scenario = StormFeatureScenario(
+                    name=title.strip(),
+                    line=number,
+                    tags=feature.tags + rule_tags + tags,
+                    examples=[] if keyword in _OUTLINE_KEYWORDS else None,
+                    background=scenario_background,
+                )
+                feature.scenarios.append(scenario)
+                steps = scenario.steps
+                examples = None
+            tags = []
+            continue
+
+        first_word = line.split(maxsplit=1)[0]
+        if first_word in _STEP_KEYWORDS:
+            if steps is None:
+                raise error("Step outside a Scenario or Background")
+            step_keyword = _STEP_KEYWORDS[first_word] or last_keyword or "GIVEN"
+            last_step = StormFeatureStep(keyword=step_keyword, text=line[len(first_word):].strip(), line=number)
+            last_keyword = step_keyword
+            steps.append(last_step)
+            continue
+        if describing:
+            feature.description = f"{feature.description}\n{line}" if feature.description else line
+            continue
+        if last_step is None and examples is None:
+            # Free text under a Scenario, Background or Rule describes it
+            continue
+        raise error(f"Unexpected line {line!r}")
+
+    if feature is None:
+        raise StormFeatureError(f"{path}: no Feature")
+    return feature
+
+
+class StormFeatureCache:
+    """
+    On-disk cache of parsed feature files, keyed by path.  A file whose mtime and size are unchanged is loaded from
+    the cache without being read or parsed.  Scenario Outlines are cached unexpanded.
+
+    :param path:    JSON file the cache is stored in, defaults to .storm_cache/features.json
+    """
+
+    version = 1
+
+    def __init__(self, path: Path | str = None):
+        self.path = Path(path) if path else Path.cwd() / ".storm_cache" / "features.json"
+        self.files = {}
+        self._features = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r") as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read feature cache {self.path}, rebuilding.  Reason: {e}")
+            return
+        if cache.get("version") == self.version:
+            self.files = cache.get("files", {})
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"version": self.version, "files": self.files}, f)
+        os.replace(temp_path, self.path)
+        self._dirty = False
+
+    def feature(self, path: os.PathLike | str) -> StormFeature:
+        """
+        The parsed feature of a file, from the cache when the file hasn't changed since it was parsed.
+        """
+        file = Path(path).resolve()
+        key = str(file)
+        stat = file.stat()
+        entry = self.files.get(key)
+        if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            if key not in self._features:
+                self._features[key] = StormFeature.from_dict(entry["feature"])
+            return self._features[key]
+        logger.info(f"Parsing {file}")
+        feature = parse_feature(file.read_text(encoding="utf-8"), key)
+        self.files[key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "feature": feature.to_dict()}
+        self._features[key] = feature
+        self._dirty = True
+        return feature
+
+
+# {name} matches any text, {name:d} an integer, {name:f} a number and {name:w} a word
+_STEP_PLACEHOLDER = re.compile(r"\{(\w+)(?::([dfw]))?\}")
+_STEP_PARAMETER_TYPES = {
+    None: (r".+?", str),
+    "d": (r"-?\d+", int),
+    "f": (r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?", float),
+    "w": (r"\w+", str),
+}
+
+
+class StormStepRegistry:
+    """
+    Step definitions compiled for matching the steps of feature files.  A literal step text is found with one dict
+    lookup.  Texts with placeholders, e.g. ``I add {count:d} items``, are grouped by keyword and by the literal text
+    before their first placeholder, and each group is compiled into one regex holding all of its texts.  A step is
+    then only matched against the groups whose prefix it starts with, found by dict lookups, so matching stays
+    cheap however many definitions there are.  The most recently matched ``match_cache_size`` step texts are
+    remembered, a text seen again costs one lookup.  Texts that embed a value of every example row rarely repeat, the
+    cache is bounded so they don't pile up over a long run.
+
+    Placeholders are ``{name}`` for any text, ``{name:d}`` for an integer, ``{name:f}`` for a number and ``{name:w}``
+    for a word.  Their values are returned by name, converted.  When several definitions match, the first wins.
+
+    :param definitions: (keyword, step text, target) of every step, the target being what a match returns
+    """
+
+    match_cache_size = 4096
+
+    def __init__(self, definitions: Iterable[tuple[str, str, Hashable]]):
+        self.literals = {}
+        # (keyword, prefix) -> [(definition number, target, [(group name, parameter name, converter)])]
+        groups = {}
+        # (keyword, prefix) -> regex alternatives, in the order of the group's definitions
+        alternatives = {}
+        for number, (keyword, text, target) in enumerate(definitions):
+            placeholders = list(_STEP_PLACEHOLDER.finditer(text))
+            if not placeholders:
+                if (keyword, text) in self.literals:
+                    logger.warning(f"Step {keyword} {text!r} is defined more than once, the first definition is used")
+                    continue
+                self.literals[(keyword, text)] = target
+                continue
+            key = (keyword, text[:placeholders[0].start()])
+            steps = groups.setdefault(key, [])
+            alternative = f"s{len(steps)}"
+            pattern = []
+            parameters = []
+            position = 0
+            for placeholder in placeholders:
+                expression, converter = _STEP_PARAMETER_TYPES[placeholder[2]]
+                group = f"{alternative}_{len(parameters)}"
+                pattern.append(re.escape(text[position:placeholder.start()]))
+                pattern.append(f"(?P<{group}>{expression})")
+                parameters.append((group, placeholder[1], converter))
+                position = placeholder.end()
+            pattern.append(re.escape(text[position:]))
+            steps.append((number, target, parameters))
+            alternatives.setdefault(key, []).append(f"(?P<{alternative}>{''.join(pattern)})")
+        self._groups = {key: (re.compile("|".join(alternatives[key])), steps) for key, steps in groups.items()}
+        # Keyword -> lengths of its prefixes, the slices of a step's text to look groups up by
+        self._prefix_lengths = {}
+        for keyword, prefix in self._groups:
+            self._prefix_lengths.setdefault(keyword, set()).add(len(prefix))
+        self._prefix_lengths = {keyword: sorted(lengths) for keyword, lengths in self._prefix_lengths.items()}
+        self._definitions = len(self.literals) + sum(len(steps) for steps in groups.values())
+        self._cached_match = functools.lru_cache(maxsize=self.match_cache_size)(self._match)
+
+    def __len__(self):
+        return self._definitions
+
+    def match(self, keyword: str, text: str) -> tuple[Hashable, dict] | None:
+        """
+        :return:    The target of the step definition ``text`` matches and the values of its placeholders, or None
+        """
+        return self._cached_match(keyword, text)
+
+    def _match(self, keyword: str, text: str) -> tuple[Hashable, dict] | None:
+        match = None
+        target = self.literals.get((keyword, text))
+        if target is not None:
+            match = (target, {})
+        else:
+            first = None
+            for length in self._prefix_lengths.get(keyword, ()):
+                if length > len(text):
+                    break
+                group = self._groups.get((keyword, text[:length]))
+                if group is None:
+                    continue
+                regex, steps = group
+                regex_match = regex.fullmatch(text)
+                if regex_match is not None:
+                    # The alternative's own group closes last, after the groups of its placeholders
+                    step = steps[int(regex_match.lastgroup[1:])]
+                    if first is None or step[0] < first[0][0]:
+                        first = (step, regex_match)
+            if first is not None:
+                (_, target, parameters), regex_match = first
+                match = (target, {name: converter(regex_match[group]) for group, name, converter in parameters})
+        return match
@@ -0,0 +1,261 @@
+import atexit
+import itertools
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging.handlers import QueueHandler
+from os import PathLike
+from pathlib import Path
+
+# Settings of this process, as configured by StormLogListener.start or install_worker_logging
+_capture = False
+
+
+@dataclass
+class StormLogConfig:
+    """
+    How a run logs.  Every process hands its records to a queue, a single listener in the runner's process writes
+    them to ``path`` in batches, so no test waits on disk I/O and worker processes never share a file.
+
+    Log levels are set per subsystem by logger name.  The framework logs under ``storm_test``, one logger per module,
+    e.g. ``{"storm_test.storm_scheduler": "DEBUG", "storm_test.storm": "WARNING"}``.  Records below a level are
+    dropped where they are logged and cost next to nothing.
+
+    :param path:            Log file, defaults to logs/storm_test_<timestamp>.log in the working directory
+    :param level:           Level of the root logger, the default of every subsystem
+    :param levels:          Levels by logger name
+    :param capture:         Attach the records logged during a test to its result
+    :param format:          Format of a line.  ``correlation_id`` identifies the test a record was logged in, "-"
+                            outside tests
+    :param batch_size:      Most records written at once
+    :param flush_interval:  Seconds buffered lines may wait before being flushed to disk
+    :param buffer_size:     Bytes buffered before a write reaches the file
+    """
+    path: PathLike | str = None
+    level: int | str = logging.INFO
+    levels: dict[str, int | str] = field(default_factory=dict)
+    capture: bool = False
+    format: str = "%(asctime)s %(levelname)s %(processName)s [%(correlation_id)s] %(name)s: %(message)s"
+    batch_size: int = 1000
+    flush_interval: float = 1.0
+    buffer_size: int = 1 << 16
+
+
+# (correlation id, captured lines or None) of the test running in the current context.  Async tests sharing a thread
+# each see their own
+_current_test_log: ContextVar[tuple[str, list | None] | None] = ContextVar("_current_test_log", default=None)
+# Correlation ids are the process id and a counter, unique across the workers of a run without a uuid per test
+_correlation_prefix = f"{os.getpid():x}-"
+_test_counter = itertools.count(1)
+
+
+def begin_test_log():
+    """
+    Gives the test starting in the current context a correlation id, and starts capturing its records when
+    configured to.  Returns the token to pass to end_test_log.
+    """
+    return _current_test_log.set((_correlation_prefix + str(next(_test_counter)), [] if _capture else None))
+
+
+def end_test_log(token) -> tuple[str, list[str] | None]:
+    """
+    :return:    The test's correlation id, and the lines captured while it ran or None when not capturing
+    """
+    test_log = _current_test_log.get()
+    _current_test_log.reset(token)
+    return test_log
+
+
+class _StormLogContext(logging.Filter):
+    """
+    Stamps records with the correlation id of the test they were logged in, and captures them for it.  Runs in the
+    thread that logs, where the test's context is, before the record is queued.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        test_log = _current_test_log.get()
+        if test_log is None:
+            record.correlation_id = "-"
+            return True
+        record.correlation_id, lines = test_log
+        if lines is not None:
+            lines.append(f"{record.levelname} {record.name}: {record.getMessage()}")
+        return True
+
+
+class _LocalQueueHandler(QueueHandler):
+    """
+    Queues records for a listener in the same process.  Nothing is pickled, but the record is still prepared as
+    QueueHandler does, its message merged with its arguments and its traceback rendered: by the time the listener
+    writes it the arguments may have changed, and the traceback would keep the test's frames alive.  A forked child
+    drops these handlers, see _after_fork.
+    """
+
+
+def _configure(config: StormLogConfig, handler: logging.Handler):
+    global _capture
+    _capture = config.capture
+    handler.addFilter(_StormLogContext())
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(config.level)
+    for name, level in config.levels.items():
+        logging.getLogger(name).setLevel(level)
+
+
+def _after_fork():
+    global _correlation_prefix
+    _correlation_prefix = f"{os.getpid():x}-"
+    # A forked child inherits the handlers of the listener it doesn't have, records would pile up in its queue
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _LocalQueueHandler):
+            root.removeHandler(handler)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def install_worker_logging(log_queue, config: StormLogConfig):
+    """
+    Sends the records of a worker process to the listener's queue.  Handlers inherited from the parent, when the
+    worker was forked, are removed, they would write to the parent's file or queue.
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _configure(config, QueueHandler(log_queue))
+
+
+_STOP = object()
+
+
+class StormLogListener:
+    """
+    The one place a run's records are written.  Records logged in the runner's process, and by thread and inline
+    workers, go through an in-process queue.  Worker processes get a multiprocessing queue, see worker_queue, whose
+    records are forwarded to the same listener, so the log holds every process in the order records arrived.
+
+    The listener drains up to ``batch_size`` records at a time, formats them and writes them in one call to a
+    buffered file, which is flushed every ``flush_interval`` seconds and when the listener stops.
+
+    :param config:  Log settings, see StormLogConfig
+    """
+
+    def __init__(self, config: StormLogConfig = None):
+        self.config = config or StormLogConfig()
+        self.path = Path(self.config.path or Path.cwd() / "logs" / f"storm_test_{time.strftime('%Y%m%d%H%M%S')}.log")
+        self._records = queue.SimpleQueue()
+        self._handler = None
+        self._file = None
+        self._listener = None
+        self._written = False
+        self._lock = threading.Lock()
+        # Start method -> (queue, forwarding thread), a queue only works with processes of the context it was made in
+        self._worker_queues = {}
+
+    @property
+    def started(self):
+        return self._listener is not None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        if self.started:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # A listener started again, for another run, adds to its log
+        self._file = open(self.path, "a" if self._written else "w", buffering=self.config.buffer_size)
+        self._written = True
+        self._listener = threading.Thread(target=self._listen, name="storm-log-listener", daemon=True)
+        self._listener.start()
+        self._handler = _LocalQueueHandler(self._records)
+        _configure(self.config, self._handler)
+        atexit.register(self.stop)
+
+    def worker_queue(self, context) -> "queue.Queue":
+        """
+        The queue worker processes of a multiprocessing context send their records to, see install_worker_logging.
+        """
+        with self._lock:
+            start_method = context.get_start_method()
+            if start_method not in self._worker_queues:
+                worker_queue = context.Queue()
+                forwarder = threading.Thread(
+                    target=self._forward, args=(worker_queue,), name="storm-log-forwarder", daemon=True
+                )
+                forwarder.start()
+                self._worker_queues[start_method] = (worker_queue, forwarder)
+            return self._worker_queues[start_method][0]
+
+    def stop(self):
+        """
+        Writes out everything queued so far and closes the log.  Records logged afterwards go nowhere.
+        """
+        if not self.started:
+            return
+        atexit.unregister(self.stop)
+        logging.getLogger().removeHandler(self._handler)
+        for worker_queue, forwarder in self._worker_queues.values():
+            # Forwarded records are queued ahead of the listener's stop, a forwarder stuck on a queue a killed worker
+            # left broken is given up on
+            worker_queue.put(None)
+            forwarder.join(timeout=5)
+        self._worker_queues = {}
+        self._records.put(_STOP)
+        self._listener.join()
+        self._listener = None
+        self._file.close()
+        self._file = None
+
+    def _forward(self, worker_queue):
+        while True:
+            try:
+                record = worker_queue.get()
+            except (EOFError, OSError):
+                break
+            if record is None:
+                break
+            self._records.put(record)
+
+    def _listen(self):
+        formatter = logging.Formatter(self.config.format, defaults={"correlation_id": "-"})
+        last_flush = time.monotonic()
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self._records.get(timeout=self.config.flush_interval)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < self.config.batch_size:
+                try:
+                    batch.append(self._records.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for record in batch:
+                if record is _STOP:
+                    stopping = True
+                    continue
+                try:
+                    lines.append(formatter.format(record) + "\n")
+                except Exception:
+                    # Logging must not take the run down, nor log about itself
+                    traceback.print_exc(file=sys.stderr)
+            if lines:
+                self._file.write("".join(lines))
+            if stopping or time.monotonic() - last_flush >= self.config.flush_interval:
+                self._file.flush()
+                last_flush = time.monotonic()
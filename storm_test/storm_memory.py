@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+import tracemalloc
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss() -> int | None:
+    """
+    Resident set size of this process in bytes, or None where it can't be read.  Read from /proc on Linux, through
+    psutil elsewhere when it is installed.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+@dataclass
+class StormMemoryPolicy:
+    """
+    Opt-in memory instrumentation.  Every test is traced with tracemalloc and its RSS measured before and after, and
+    the result records what it left allocated and where.  Tracing slows tests down, so leave it off for normal runs.
+
+    tracemalloc and RSS are per process: on the thread backend a test's numbers include what the other workers
+    allocated meanwhile.  Async tests are run one at a time while tracing, so their allocations can be told apart.
+
+    :param budget:              Bytes a test may leave allocated when it finishes.  Tests above it are flagged
+    :param fail_over_budget:    Fail tests over budget rather than only flagging them
+    :param top_allocations:     Allocation sites reported per test, largest first
+    :param traceback_frames:    Frames tracemalloc keeps per allocation, more group sites by caller but cost more
+    :param recycle_after:       RSS growth in bytes after which a worker process is replaced by a fresh one, between
+                                tests.  Only applies to the process backend
+    """
+    budget: int = None
+    fail_over_budget: bool = True
+    top_allocations: int = 5
+    traceback_frames: int = 1
+    recycle_after: int = None
+
+
+@dataclass(frozen=True, slots=True)
+class StormMemoryUsage:
+    """
+    Memory use of one test.
+
+    :param allocated:       Bytes allocated during the test and still held when it finished
+    :param peak:            Highest traced allocation during the test, in bytes
+    :param rss_delta:       Change of the process RSS over the test in bytes, None where RSS can't be read
+    :param top_allocations: (file:line, bytes, allocations) of the sites holding the most memory
+    :param over_budget:     ``allocated`` exceeded the policy's budget
+    """
+    allocated: int
+    peak: int
+    rss_delta: int | None
+    top_allocations: tuple = ()
+    over_budget: bool = False
+
+    def describe(self) -> str:
+        sites = ", ".join(f"{site} {size / 1024:.1f} KiB" for site, size, count in self.top_allocations)
+        return f"{self.allocated / 1024:.1f} KiB still allocated, peak {self.peak / 1024:.1f} KiB" + (
+            f", top sites: {sites}" if sites else ""
+        )
+
+
+# Trackers running in this process.  Tracing a tracker started is stopped when the last running one finishes
+_lock = threading.Lock()
+_active_trackers = 0
+_started_tracing = False
+
+_IGNORED_TRACES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+)
+
+
+class StormMemoryTracker:
+    """
+    Measures the memory use of the block it wraps, when given a policy.  ``usage`` holds a StormMemoryUsage
+    afterwards, or None without a policy.
+
+    Tracing is started for the block if it isn't on already and stopped afterwards, so only the block's allocations
+    are traced and the snapshots stay small.  When something else is already tracing, the block's allocations are
+    the difference of two snapshots instead.
+
+    :param policy:      Memory policy, see StormMemoryPolicy
+    """
+
+    def __init__(self, policy: StormMemoryPolicy = None):
+        self.policy = policy
+        self.usage = None
+        self._before = None
+        self._start_traced = 0
+        self._start_rss = None
+
+    def __enter__(self):
+        global _active_trackers, _started_tracing
+        if self.policy is None:
+            return self
+        with _lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.policy.traceback_frames)
+                _started_tracing = True
+            else:
+                self._before = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+            _active_trackers += 1
+        tracemalloc.reset_peak()
+        self._start_traced = tracemalloc.get_traced_memory()[0]
+        self._start_rss = current_rss()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _active_trackers, _started_tracing
+        if self.policy is None:
+            return
+        end_rss = current_rss()
+        peak = tracemalloc.get_traced_memory()[1] - self._start_traced
+        after = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+        with _lock:
+            _active_trackers -= 1
+            if _started_tracing and not _active_trackers:
+                tracemalloc.stop()
+                _started_tracing = False
+
+        if self._before is None:
+            sites = [(stat.traceback, stat.size, stat.count) for stat in after.statistics("lineno")]
+        else:
+            sites = [
+                (stat.traceback, stat.size_diff, stat.count_diff) for stat in after.compare_to(self._before, "lineno")
+            ]
+        allocated = sum(size for _, size, _ in sites)
+        top = sorted((site for site in sites if site[1] > 0), key=lambda site: site[1], reverse=True)
+        self.usage = StormMemoryUsage(
+            allocated=allocated,
+            peak=max(peak, allocated),
+            rss_delta=end_rss - self._start_rss if end_rss is not None and self._start_rss is not None else None,
+            top_allocations=tuple(
+                (str(traceback[0]), size, count) for traceback, size, count in top[:self.policy.top_allocations]
+            ),
+            over_budget=self.policy.budget is not None and allocated > self.policy.budget,
+        )
+        if self.usage.over_budget:
+            logger.warning(f"Test over its memory budget of {self.policy.budget} bytes: {self.usage.describe()}")
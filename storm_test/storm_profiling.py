@@ -0,0 +1,146 @@
+import cProfile
+import logging
+import marshal
+import os
+import pstats
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class StormProfiler:
+    """
+    Profiles the block it wraps with cProfile, when enabled.  ``stats`` holds the raw profile afterwards, the
+    ``{(file, line, function): (cc, nc, tt, ct, callers)}`` dictionary pstats works on, or None when disabled.
+
+    Only one profiler can be active at a time, so a block that is already being profiled, by an outer
+    StormProfiler or by cProfile run on the whole test process, is left alone.  From Python 3.12 that holds across
+    threads too: on the thread backend a test's profile includes whatever the other workers ran meanwhile, and tests
+    that start while another one is profiled go unprofiled.  Use the process backend for exact per-test profiles.
+
+    :param enabled:     Whether to profile
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stats = None
+        self._profiler = None
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        self._profiler = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except ValueError as e:
+            logger.debug(f"Not profiling, another profiler is active.  Reason: {e}")
+            self._profiler = None
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._profiler is None:
+            return
+        self._profiler.disable()
+        self._profiler.create_stats()
+        self.stats = self._profiler.stats
+        self._profiler = None
+
+
+def _frame_name(func: tuple) -> str:
+    file_name, line, function_name = func
+    if file_name == "~":
+        # Built-in functions, pstats reports them without a file
+        return function_name.replace(";", ":")
+    return f"{function_name} ({os.path.basename(file_name)}:{line})".replace(";", ":")
+
+
+class StormProfileStats:
+    """
+    cProfile stats of many tests merged into one profile.  Workers merge the profiles of the tests they run and send
+    the result once per batch, the runner merges those into the profile of the whole run.
+    """
+
+    # Stacks deeper than this, or worth less than a microsecond, are left out of the collapsed stacks
+    max_stack_depth = 100
+
+    def __init__(self):
+        self.stats = {}
+
+    def __bool__(self):
+        return bool(self.stats)
+
+    def add(self, stats: dict | None):
+        """
+        Merges a raw profile, see StormProfiler.stats, or another StormProfileStats' ``stats``.
+        """
+        for func, func_stats in (stats or {}).items():
+            self.stats[func] = pstats.add_func_stats(self.stats[func], func_stats) if func in self.stats else func_stats
+
+    def top(self, count: int = 20) -> list[tuple[str, int, float, float]]:
+        """
+        The ``count`` functions that spent the most time in their own code, as (function, calls, own time, cumulative
+        time) tuples.
+        """
+        ranked = sorted(self.stats.items(), key=lambda item: item[1][2], reverse=True)[:count]
+        return [(pstats.func_std_string(func), nc, tt, ct) for func, (cc, nc, tt, ct, callers) in ranked]
+
+    def summary(self, count: int = 20) -> str:
+        lines = [f"{'calls':>10} {'own s':>10} {'cumul s':>10}  function"]
+        for function, calls, own_time, cumulative_time in self.top(count):
+            lines.append(f"{calls:>10} {own_time:>10.4f} {cumulative_time:>10.4f}  {function}")
+        return "\n".join(lines)
+
+    def collapsed_stacks(self) -> dict[str, int]:
+        """
+        The profile as ``{"outer;inner;innermost": microseconds}`` stacks, the collapsed format flame graph tools
+        read.  cProfile only records who called whom, so a function's own time is split over the stacks it was
+        reached through in proportion to the time spent through each caller.  Recursion is cut at the first repeat.
+        Stacks start at the outermost profiled functions, the ones whose callers were not profiled.
+        """
+        callees = {}
+        for func, (cc, nc, tt, ct, callers) in self.stats.items():
+            for caller, caller_stats in callers.items():
+                # cProfile records (nc, cc, tt, ct) per caller
+                edge_time = caller_stats[3] if isinstance(caller_stats, tuple) else 0.0
+                callees.setdefault(caller, []).append((func, edge_time))
+
+        stacks = {}
+
+        def walk(func, names: list[str], on_stack: set, share: float):
+            cc, nc, tt, ct, callers = self.stats[func]
+            names = names + [_frame_name(func)]
+            own = int(tt * share * 1_000_000)
+            if own > 0:
+                stack = ";".join(names)
+                stacks[stack] = stacks.get(stack, 0) + own
+            if len(names) >= self.max_stack_depth:
+                return
+            for callee, edge_time in callees.get(func, []):
+                if callee in on_stack or callee not in self.stats:
+                    continue
+                callee_time = self.stats[callee][3]
+                if not callee_time or edge_time * share < 1e-6:
+                    continue
+                walk(callee, names, on_stack | {callee}, min(1.0, edge_time * share / callee_time))
+
+        for func, (cc, nc, tt, ct, callers) in self.stats.items():
+            if not any(caller in self.stats for caller in callers):
+                walk(func, [], {func}, 1.0)
+        return stacks
+
+    def write(self, path: os.PathLike | str) -> tuple[Path, Path]:
+        """
+        Writes the profile to ``path``, readable with pstats and snakeviz, and the collapsed stacks next to it with
+        a .collapsed suffix, for flamegraph.pl and speedscope.
+
+        :return:    The paths of both files
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            marshal.dump(self.stats, f)
+        collapsed_path = path.with_suffix(".collapsed")
+        with open(collapsed_path, "w") as f:
+            for stack, microseconds in sorted(self.collapsed_stacks().items()):
+                f.write(f"{stack} {microseconds}\n")
+        return path, collapsed_path
@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 
 
 class StormReporter(ABC):
+    # Whether the reporter prints every result as it arrives, the runner then only prints a summary at the end
+    prints_results = False
 
     @property
     def results(self):
@@ -37,5 +39,44 @@ class StormReporter(ABC):
     def after_step(self, *args, **kwargs):
         pass
 
+
 class StormConsoleReporter(StormReporter):
-    pass
+    """
+    Prints each test result as soon as a worker reports it.
+    """
+
+    prints_results = True
+
+    def before_run(self, *args, **kwargs):
+        pass
+
+    def after_run(self, *args, **kwargs):
+        pass
+
+    def before_test(self, class_result, test_name, *args, **kwargs):
+        pass
+
+    def after_test(self, class_result, test_object, *args, **kwargs):
+        error = f" ({test_object.error})" if test_object.error else ""
+        attempts = getattr(test_object, "attempts", None)
+        retried = f" after {len(attempts) + 1} attempts" if attempts else ""
+        quarantined = " [quarantined]" if getattr(test_object, "quarantined", False) else ""
+        memory = getattr(test_object, "memory", None)
+        over_budget = " [over memory budget]" if memory and memory.over_budget else ""
+        print(
+            f"{class_result.name} - {test_object.name}: {test_object.status.value}{retried}{quarantined}{over_budget}"
+            f"{error}",
+            flush=True,
+        )
+        if test_object.status.value == "FAIL":
+            # Captured when the run's log config asks for it, see StormLogConfig.capture
+            for line in getattr(test_object, "logs", None) or []:
+                print(f"    | {line}", flush=True)
+
+    def before_step(self, *args, **kwargs):
+        pass
+
+    def after_step(self, test_object, step, *args, **kwargs):
+        for step_name, step_status in step.items():
+            status = step_status if not isinstance(step_status, dict) else next(iter(step_status))
+            print(f"    {step_name}: {status.value}", flush=True)
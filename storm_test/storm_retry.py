@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StormRetryPolicy:
+    """
+    How failed test methods are retried.  Only the failed methods are resubmitted, to the same warm pool, after an
+    exponential backoff.
+
+    :param attempts:            Total attempts per test method, the first run included
+    :param backoff:             Seconds to wait before the first retry round
+    :param backoff_factor:      Multiplier applied to the wait before every further round
+    :param max_backoff:         Upper bound of the wait in seconds
+    :param quarantine_after:    Consecutive runs a test may fail every attempt before it is quarantined
+    """
+    attempts: int = 3
+    backoff: float = 1.0
+    backoff_factor: float = 2.0
+    max_backoff: float = 60.0
+    quarantine_after: int = 3
+
+    def delay(self, retry_round: int) -> float:
+        """
+        Seconds to wait before retry round ``retry_round``, counting from 1.
+        """
+        return min(self.max_backoff, self.backoff * self.backoff_factor ** (retry_round - 1))
+
+
+class StormQuarantine:
+    """
+    Tests that kept failing across runs.  A quarantined test still runs, once and without retries, but its failure no
+    longer fails its class.  It leaves quarantine the first time it passes.
+
+    :param path:    JSON file the quarantine is stored in, defaults to .storm_cache/quarantine.json
+    """
+
+    def __init__(self, path: Path | str = None):
+        self.path = Path(path) if path else Path.cwd() / ".storm_cache" / "quarantine.json"
+        # Consecutive runs in which each test failed every attempt
+        self.failures = {}
+        self.quarantined = set()
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r") as f:
+                quarantine = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read quarantine {self.path}, starting empty.  Reason: {e}")
+            return
+        self.failures = quarantine.get("failures", {})
+        self.quarantined = set(quarantine.get("quarantined", []))
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"failures": self.failures, "quarantined": sorted(self.quarantined)}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def is_quarantined(self, test_id: str) -> bool:
+        return test_id in self.quarantined
+
+    def record(self, test_id: str, failed: bool, quarantine_after: int):
+        """
+        Records the final outcome of a test in this run, after all of its attempts.
+        """
+        if not failed:
+            self.failures.pop(test_id, None)
+            if test_id in self.quarantined:
+                logger.info(f"{test_id} passed, releasing it from quarantine")
+                self.quarantined.discard(test_id)
+            return
+        self.failures[test_id] = self.failures.get(test_id, 0) + 1
+        if self.failures[test_id] >= quarantine_after and test_id not in self.quarantined:
+            logger.warning(f"{test_id} failed every attempt in {self.failures[test_id]} runs, quarantining it")
+            self.quarantined.add(test_id)
@@ -0,0 +1,254 @@
+import csv
+import dataclasses
+import inspect
+import itertools
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class StormRowBatch:
+    """
+    Where a batch of rows is in its source, small enough to send with a work item.  The worker that takes it reads
+    the rows itself, so rows never pass through the runner.
+
+    :param number:      Batch number, the same from run to run while the batch size is
+    :param first:       Row number of the batch's first row
+    :param count:       Rows in the batch
+    :param offset:      Position of the first row in the source, a file offset for files
+    :param start:       Row number to start at, when only part of the batch is left to run.  Defaults to ``first``
+    :param stop:        Row number to stop before.  Defaults to the end of the batch
+    :param keep_passed: Keep the results of passed rows, see StormRowSource
+    """
+    number: int
+    first: int
+    count: int
+    offset: int = 0
+    start: int = None
+    stop: int = None
+    keep_passed: bool = True
+
+    @property
+    def begin(self) -> int:
+        return self.first if self.start is None else self.start
+
+    @property
+    def end(self) -> int:
+        return self.first + self.count if self.stop is None else self.stop
+
+    @property
+    def size(self) -> int:
+        return max(0, self.end - self.begin)
+
+    def row(self, number: int) -> "StormRowBatch":
+        """
+        The single row ``number`` of the batch.
+        """
+        return dataclasses.replace(self, start=number, stop=number + 1)
+
+    def after(self, number: int) -> "StormRowBatch":
+        """
+        What is left of the whole batch after row ``number``.
+        """
+        return dataclasses.replace(self, start=number + 1, stop=None)
+
+
+class StormRowSource:
+    """
+    Rows a streamed test case runs once for, see storm_test.storm.stream_test_case.  The runner only scans the source
+    for batch boundaries, the workers read their batches' rows as they run them, so memory use doesn't grow with the
+    number of rows.
+
+    Every row is its own test, identified by the value of its ``id_field`` or else by its row number.  Both stay the
+    same from run to run as long as the data does, so timings, retries and quarantine follow the row.
+
+    :param batch_size:  Rows per work item.  Larger batches cost less to schedule, smaller ones balance better
+    :param id_field:    Field whose value identifies a row, row numbers are used without one
+    :param keep_passed: Keep the result of every passed row.  Without, passed rows are reported and counted but not
+                        kept, so the results of a run stay small however many rows pass
+    """
+
+    def __init__(self, batch_size: int = 1000, id_field: str = None, keep_passed: bool = True):
+        if batch_size < 1:
+            raise ValueError(f"Invalid batch size {batch_size}, expected at least 1")
+        self.batch_size = batch_size
+        self.id_field = id_field
+        self.keep_passed = keep_passed
+
+    def row_id(self, number: int, row) -> int | str:
+        if self.id_field is None:
+            return number
+        try:
+            return str(row[self.id_field])
+        except (KeyError, IndexError, TypeError):
+            logger.warning(f"Row {number} has no {self.id_field}, identifying it by its row number")
+            return number
+
+    def _boundaries(self) -> Iterator[tuple[int, int]]:
+        """
+        Yields the position and row count of every batch, in order, reading no more of the source than it must.
+        """
+        raise NotImplementedError
+
+    def _read(self, offset: int, first: int) -> Iterator:
+        """
+        Yields the rows from position ``offset`` on, ``offset`` being the position of row ``first``.
+        """
+        raise NotImplementedError
+
+    def batches(self) -> Iterator[StormRowBatch]:
+        """
+        Scans the source once, lazily, for the boundaries of its batches.
+        """
+        first = 0
+        for number, (offset, count) in enumerate(self._boundaries()):
+            yield StormRowBatch(number, first, count, offset, keep_passed=self.keep_passed)
+            first += count
+
+    def read(self, batch: StormRowBatch) -> Iterator[tuple[int, object]]:
+        """
+        Yields the ``(row number, row)`` pairs of a batch, one row at a time.
+        """
+        rows = self._read(batch.offset, batch.first)
+        skip = batch.begin - batch.first
+        try:
+            yield from zip(range(batch.begin, batch.end), itertools.islice(rows, skip, skip + batch.size))
+        finally:
+            # Closes the file of a batch that ends before it does
+            if hasattr(rows, "close"):
+                rows.close()
+
+    def rows(self) -> Iterator[tuple[int, object]]:
+        """
+        Yields every ``(row number, row)`` pair of the source.
+        """
+        for batch in self.batches():
+            yield from self.read(batch)
+
+
+class StormCsvRows(StormRowSource):
+    """
+    Rows of a CSV file with a header, as dicts.  Quoted fields may span lines.  Batches start at file offsets found
+    by the scan, so a worker seeks straight to its batch.
+
+    :param path:        CSV file
+    :param encoding:    Encoding of the file
+    :param fmtparams:   Dialect and formatting parameters passed to csv.reader
+    """
+
+    def __init__(
+            self,
+            path: os.PathLike | str,
+            batch_size: int = 1000,
+            id_field: str = None,
+            keep_passed: bool = True,
+            encoding: str = "utf-8",
+            **fmtparams,
+    ):
+        super().__init__(batch_size, id_field, keep_passed)
+        self.path = Path(path)
+        self.encoding = encoding
+        self.fmtparams = fmtparams
+
+    def _boundaries(self) -> Iterator[tuple[int, int]]:
+        with open(self.path, "r", newline="", encoding=self.encoding) as f:
+            # readline rather than iteration, which would disable tell().  The reader only reads as far as the rows
+            # it returned, so the position between batches is where the next one starts
+            reader = csv.reader(iter(f.readline, ""), **self.fmtparams)
+            next(reader, None)
+            while True:
+                position = f.tell()
+                count = sum(1 for _ in itertools.islice(reader, self.batch_size))
+                if not count:
+                    return
+                yield position, count
+
+    def _read(self, offset: int, first: int) -> Iterator[dict]:
+        with open(self.path, "r", newline="", encoding=self.encoding) as f:
+            header = next(csv.reader(iter(f.readline, ""), **self.fmtparams), [])
+            f.seek(offset)
+            yield from csv.DictReader(iter(f.readline, ""), fieldnames=header, **self.fmtparams)
+
+
+class StormJsonlRows(StormRowSource):
+    """
+    Rows of a JSON Lines file, one JSON value per line.  Blank lines are skipped.
+
+    :param path:        JSONL file
+    """
+
+    def __init__(self, path: os.PathLike | str, batch_size: int = 1000, id_field: str = None, keep_passed: bool = True):
+        super().__init__(batch_size, id_field, keep_passed)
+        self.path = Path(path)
+
+    def _boundaries(self) -> Iterator[tuple[int, int]]:
+        with open(self.path, "rb") as f:
+            position = 0
+            offset = 0
+            count = 0
+            for line in f:
+                if line.strip():
+                    if not count:
+                        offset = position
+                    count += 1
+                    if count == self.batch_size:
+                        yield offset, count
+                        count = 0
+                position += len(line)
+            if count:
+                yield offset, count
+
+    def _read(self, offset: int, first: int) -> Iterator:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class StormIterRows(StormRowSource):
+    """
+    Rows produced by a function, e.g. a generator paging through a database table.  The function is called in the
+    runner to count the rows and again in every worker for its batches, so it must return the same rows each time.
+
+    A function taking an argument is passed the number of the first row wanted and returns the rows from there on,
+    letting it seek.  Otherwise every batch is read by skipping the rows before it, which gets slow for batches far
+    into a large source.
+
+    :param rows:    Function returning an iterable of rows
+    """
+
+    def __init__(
+            self,
+            rows: Callable[..., Iterable],
+            batch_size: int = 1000,
+            id_field: str = None,
+            keep_passed: bool = True,
+    ):
+        super().__init__(batch_size, id_field, keep_passed)
+        self.rows_function = rows
+        try:
+            self._seekable = bool(inspect.signature(rows).parameters)
+        except (TypeError, ValueError):
+            self._seekable = False
+
+    def _boundaries(self) -> Iterator[tuple[int, int]]:
+        rows = iter(self.rows_function(0) if self._seekable else self.rows_function())
+        position = 0
+        while True:
+            count = sum(1 for _ in itertools.islice(rows, self.batch_size))
+            if not count:
+                return
+            yield position, count
+            position += count
+
+    def _read(self, offset: int, first: int) -> Iterator:
+        if self._seekable:
+            return iter(self.rows_function(first))
+        return itertools.islice(self.rows_function(), first, None)
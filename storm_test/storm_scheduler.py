@@ -0,0 +1,1131 @@
+import asyncio
+import importlib
+import logging
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, replace
+from enum import Enum
+from typing import Callable, Iterator
+
+from storm_test.storm_fixtures import StormFixtureValues, activate_fixtures
+from storm_test.storm_logging import StormLogConfig, StormLogListener, install_worker_logging
+from storm_test.storm_memory import StormMemoryPolicy, current_rss
+from storm_test.storm_profiling import StormProfiler, StormProfileStats
+from storm_test.storm_rows import StormRowBatch
+from storm_test.storm_timings import StormTimingCache
+from storm_test.storm_tracing import StormTraceBuffer, activate_trace, deactivate_trace
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StormWorkItem:
+    """
+    A single schedulable test method.  Classes are referenced by module and qualified name so work items stay small
+    and can be sent to any worker process.
+
+    A streamed test case is scheduled as one item per batch of rows, see storm_test.storm_rows.  The worker that takes
+    a batch runs and reports every row as an item of its own, with the row's id as its index.
+    """
+    module: str
+    class_name: str
+    method_name: str
+    index: int | str | None = None
+    rows: StormRowBatch = None
+
+    @classmethod
+    def for_method(cls, test_class, method_name: str, index: int = None):
+        return cls(
+            module=test_class.__module__,
+            class_name=test_class.__qualname__,
+            method_name=method_name,
+            index=index,
+        )
+
+    @property
+    def class_key(self):
+        return f"{self.module}.{self.class_name}"
+
+    @property
+    def is_row_batch(self):
+        return self.rows is not None and self.index is None
+
+    @property
+    def name(self):
+        name_string = self.method_name.replace("_", " ")
+        if self.is_row_batch:
+            return f"{name_string} rows {self.rows.begin}-{self.rows.end - 1}"
+        return f"{name_string} {self.index}" if self.index is not None else name_string
+
+    @property
+    def test_id(self):
+        if self.is_row_batch:
+            # The same for what is left of a batch, so a resumed batch is still the batch
+            return f"{self.class_key}::{self.method_name}[batch {self.rows.number}]"
+        suffix = f"[{self.index}]" if self.index is not None else ""
+        return f"{self.class_key}::{self.method_name}{suffix}"
+
+    @property
+    def timing_id(self):
+        """
+        What the item's duration is recorded under.  The rows of a streamed test share one per-row duration, rather
+        than the timing cache holding every row.
+        """
+        if self.rows is not None:
+            return f"{self.class_key}::{self.method_name}[row]"
+        return self.test_id
+
+    @property
+    def rest_of_batch(self) -> "StormWorkItem":
+        """
+        The rows of the batch a row item came from that follow it.
+        """
+        return StormWorkItem(self.module, self.class_name, self.method_name, rows=self.rows.after(self.rows.begin))
+
+    def load_class(self):
+        test_class = importlib.import_module(self.module)
+        for attribute in self.class_name.split("."):
+            test_class = getattr(test_class, attribute)
+        return test_class
+
+
+@dataclass(frozen=True)
+class StormBatchOptions:
+    """
+    Run settings sent to the workers with every batch, so one warm pool can serve runs with different settings.
+
+    :param default_timeout: Time limit in seconds for tests without one of their own, see storm_test.storm.timeout
+    :param profile:         Profile every test with cProfile, see storm_test.storm_profiling
+    :param memory:          Trace every test's memory use and recycle workers that grow, see storm_test.storm_memory
+    :param trace:           Record timing spans of every class, test and step, see storm_test.storm_tracing
+    :param broken_classes:  Class key to the error of a class whose set_up timed out earlier in the batch.  Its
+                            methods are reported with a CLASS_BROKEN message instead of being run
+    """
+    default_timeout: float = None
+    profile: bool = False
+    memory: StormMemoryPolicy = None
+    trace: bool = False
+    broken_classes: dict[str, str] = None
+
+
+class StormWorkerMessage:
+    STARTED = "STARTED"
+    RESULT = "RESULT"
+    CLASS_ERROR = "CLASS_ERROR"
+    CLASS_TIMING = "CLASS_TIMING"
+    CLASS_DEADLINE = "CLASS_DEADLINE"
+    CLASS_BROKEN = "CLASS_BROKEN"
+    WORKER_LOST = "WORKER_LOST"
+    TIMEOUT = "TIMEOUT"
+    PROFILE = "PROFILE"
+    RECYCLE = "RECYCLE"
+    TRACE = "TRACE"
+    ROWS_DONE = "ROWS_DONE"
+    DONE = "DONE"
+
+
+def _steal_order(worker_id: int, worker_count: int):
+    """
+    Own queue first, then the other workers' queues starting from the next neighbour, so thieves spread out instead of
+    all raiding worker 0.
+    """
+    return [(worker_id + offset) % worker_count for offset in range(worker_count)]
+
+
+class _WorkerBatch:
+    """
+    One worker's share of a batch.  Drains the worker's own queue first and then steals queued methods from the
+    other workers.  Each test class is instantiated and set up once per worker, the first time one of its methods is
+    picked up, and torn down once when no work is left anywhere.
+
+    Consecutive async test methods of the same class are taken together, up to the class's ``async_concurrency``,
+    and run concurrently on the worker's event loop.
+
+    Queue entries are ``(batch_id, work_item)`` pairs, and a ``None`` work item marks the end of a queue.  Whoever
+    reads the end marker puts it back, so every worker can observe that the queue is drained.  Entries left over from
+    an earlier, aborted batch are dropped.  Once ``abort_event`` is set the worker stops taking work.
+
+    Every backend drives the same object: worker processes and threads call ``run()``, the inline backend calls
+    ``step()`` itself so it can hand results back between tests.
+
+    The STARTED message of a sync test carries its time limit, for the pool to enforce.  Async tests are held to
+    theirs on the event loop.  A class's set_up and tear_down are held to the class's time limit, or the run's
+    default, the same way: a CLASS_DEADLINE message carrying the phase and limit is sent before and one carrying None
+    after.  A class in the options' ``broken_classes`` isn't set up at all, each of its methods is reported with a
+    CLASS_BROKEN message.
+
+    When profiling, the worker merges the profiles of its tests and sends them in one PROFILE message at the end of
+    the batch, so results stay small.  Async tests that run together are profiled as one group.  Timing spans are
+    collected and sent the same way, in one TRACE message.
+
+    A worker process given its ``rss_baseline`` checks its growth after every test.  Once it has grown past the
+    memory policy's ``recycle_after`` it tears its classes down, puts back the work it took but didn't run, sends a
+    RECYCLE message and stops, for the pool to replace it with a fresh process that carries on with the batch.
+
+    A batch of rows of a streamed test is read one row at a time as the rows are run, each row run and reported as
+    an item of its own.  A ROWS_DONE message follows the last one.
+    """
+
+    def __init__(
+            self,
+            worker_id: int,
+            batch_id: int,
+            work_queues: list,
+            report: Callable,
+            abort_event,
+            test_data=None,
+            loop: asyncio.AbstractEventLoop = None,
+            fixtures: StormFixtureValues = None,
+            options: StormBatchOptions = None,
+            rss_baseline: int = None,
+    ):
+        self.worker_id = worker_id
+        self.batch_id = batch_id
+        self.work_queues = work_queues
+        self.report = report
+        self.abort_event = abort_event
+        self.test_data = test_data
+        self.loop = loop
+        self.options = options or StormBatchOptions()
+        self.profile = StormProfileStats()
+        self.rss_baseline = rss_baseline
+        self.trace = StormTraceBuffer(worker_id) if self.options.trace else None
+        self.instances = {}
+        self.drained = set()
+        self.deferred = []
+        # The streamed batch being run: the batch item, its remaining row items and the last one taken
+        self.row_batch = None
+        self.row_items = None
+        self.last_row = None
+        # Row of every row item taken and not yet run
+        self.row_data = {}
+        self.order = _steal_order(worker_id, len(work_queues))
+        activate_fixtures(fixtures)
+
+    def take(self, timeout: float = 0.05) -> StormWorkItem | None:
+        for queue_id in self.order:
+            if queue_id in self.drained:
+                continue
+            try:
+                item_batch, item = self.work_queues[queue_id].get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if item_batch != self.batch_id:
+                continue
+            if item is None:
+                self.work_queues[queue_id].put((self.batch_id, None))
+                self.drained.add(queue_id)
+                continue
+            if queue_id != self.worker_id:
+                logger.debug(f"Worker {self.worker_id} stole {item.test_id} from worker {queue_id}")
+            return item
+        return None
+
+    def _read_rows(self, item: StormWorkItem, test_class) -> Iterator[StormWorkItem]:
+        source = getattr(type(test_class), item.method_name)._row_source
+        for number, row in source.read(item.rows):
+            row_item = StormWorkItem(
+                item.module, item.class_name, item.method_name, source.row_id(number, row), item.rows.row(number)
+            )
+            self.row_data[row_item] = row
+            yield row_item
+
+    def next_item(self, timeout: float = 0.05) -> StormWorkItem | None:
+        """
+        The next test to run: a deferred one, else the next row of the streamed batch being run, else one taken from
+        the queues.  Streamed batches taken from the queues are started here.
+        """
+        if self.deferred:
+            return self.deferred.pop()
+        while True:
+            if self.row_items is not None:
+                try:
+                    row_item = next(self.row_items, None)
+                except Exception as e:
+                    # Left unreported, so the runner reports the rows that weren't run as NOT_RUN
+                    logger.error(f"Could not read the rows of {self.row_batch.name}.  Reason: {e}")
+                    self.report((
+                        StormWorkerMessage.CLASS_ERROR, self.worker_id, self.row_batch, f"could not read rows: {e}"
+                    ))
+                    row_item = None
+                else:
+                    if row_item is not None:
+                        self.last_row = row_item
+                        return row_item
+                    if self.row_batch.is_row_batch:
+                        self.report((StormWorkerMessage.ROWS_DONE, self.worker_id, self.row_batch, None))
+                self.row_batch = self.row_items = self.last_row = None
+            item = self.take(timeout)
+            if item is None or item.rows is None:
+                return item
+            test_class = self.instance_for(item)
+            if test_class is not None:
+                self.row_batch = item
+                self.row_items = self._read_rows(item, test_class)
+
+    def requeue(self):
+        """
+        Puts the work this worker took but didn't run back on its queue, for the worker that replaces it.  It goes
+        ahead of the queue's end marker, which the replacement would otherwise read first and take the queue for
+        drained.  A streamed batch cut short after its last row is reported done, there is nothing left to resume.
+        """
+        returned = list(reversed(self.deferred))
+        self.deferred = []
+        if self.row_items is not None:
+            self.row_items.close()
+            rest = self.last_row.rest_of_batch if self.last_row is not None else self.row_batch
+            if rest.rows.size:
+                returned.append(rest)
+            elif self.row_batch.is_row_batch:
+                self.report((StormWorkerMessage.ROWS_DONE, self.worker_id, self.row_batch, None))
+            self.row_batch = self.row_items = self.last_row = None
+        self.row_data = {}
+        if not returned:
+            return
+        own_queue = self.work_queues[self.worker_id]
+        queued = []
+        while True:
+            try:
+                queued.append(own_queue.get(timeout=0.05))
+            except queue.Empty:
+                break
+        for item in returned + [item for batch_id, item in queued if batch_id == self.batch_id and item is not None]:
+            own_queue.put((self.batch_id, item))
+        own_queue.put((self.batch_id, None))
+
+    def data_for(self, item: StormWorkItem):
+        """
+        The data a test is run with: its row when streamed, the run's test data otherwise.
+        """
+        return self.row_data.pop(item) if item.rows is not None else self.test_data
+
+    def instance_for(self, item: StormWorkItem):
+        if item.class_key in self.instances:
+            return self.instances[item.class_key][0]
+        if item.class_key in (self.options.broken_classes or {}):
+            self.report((
+                StormWorkerMessage.CLASS_BROKEN, self.worker_id, item, self.options.broken_classes[item.class_key]
+            ))
+            return None
+        try:
+            test_class = item.load_class()()
+        except Exception as e:
+            logger.error(f"Could not load {item.class_key}.  Reason: {e}")
+            self.report((StormWorkerMessage.CLASS_ERROR, self.worker_id, item, f"could not be loaded: {e}"))
+            return None
+        test_class.name = type(test_class).__name__
+        limit = self.class_timeout(test_class)
+        if limit:
+            self.report((StormWorkerMessage.CLASS_DEADLINE, self.worker_id, item, ("set_up", limit)))
+        set_up_start = time.perf_counter_ns()
+        try:
+            test_class.set_up()
+        except Exception as e:
+            logger.error("Test setup failed.  Reason: %s", e)
+            self.report((StormWorkerMessage.CLASS_ERROR, self.worker_id, item, f"set_up failed: {e}"))
+        set_up_end = time.perf_counter_ns()
+        if limit:
+            self.report((StormWorkerMessage.CLASS_DEADLINE, self.worker_id, item, None))
+        if self.trace is not None:
+            self.trace.add("set_up", "class", set_up_start, set_up_end, {"class": item.class_key})
+        self.instances[item.class_key] = (test_class, item, set_up_start, set_up_end)
+        return test_class
+
+    def class_timeout(self, test_class) -> float | None:
+        """
+        Time limit of a class's set_up and tear_down: the class's timeout, else the run's default.
+        """
+        return getattr(test_class, "timeout", None) or self.options.default_timeout
+
+    def report_started(self, item: StormWorkItem, timeout: float = None):
+        self.report((StormWorkerMessage.STARTED, self.worker_id, item, timeout))
+
+    def report_result(self, item: StormWorkItem, test_object):
+        # Only the compact record crosses the process boundary, never the bound method and the test instance behind
+        # it.  Every backend sends the record, so results are identical whichever one ran the test
+        self.profile.add(test_object.profile)
+        self.report((StormWorkerMessage.RESULT, self.worker_id, item, test_object.to_record()))
+
+    def step(self) -> bool:
+        """
+        Runs the next test, or the next group of async tests.  Returns False once there is no work left.
+        """
+        token = activate_trace(self.trace)
+        try:
+            return self._step()
+        finally:
+            deactivate_trace(token)
+
+    def _step(self) -> bool:
+        if self.abort_event.is_set():
+            return False
+        item = self.next_item()
+        if item is None:
+            return len(self.drained) < len(self.work_queues)
+        test_class = self.instance_for(item)
+        if test_class is None:
+            return True
+
+        if not test_class._is_async_test(item.method_name, item.index):
+            self.report_started(
+                item, test_class.timeout_for(item.method_name, item.index, self.options.default_timeout)
+            )
+            self.report_result(
+                item,
+                test_class._run_test_method(
+                    item.method_name, item.index, self.data_for(item), self.options.profile, self.options.memory
+                ),
+            )
+            return True
+
+        group = {(item.method_name, item.index): item}
+        while len(group) < test_class.async_concurrency:
+            next_item = self.next_item(timeout=0)
+            if next_item is None:
+                break
+            if (
+                    next_item.class_key != item.class_key
+                    or not test_class._is_async_test(next_item.method_name, next_item.index)
+                    # Rows sharing an id can't run in one group
+                    or (next_item.method_name, next_item.index) in group
+            ):
+                self.deferred.append(next_item)
+                break
+            group[(next_item.method_name, next_item.index)] = next_item
+
+        self.loop = self.loop or asyncio.new_event_loop()
+        with StormProfiler(self.options.profile) as profiler:
+            self.loop.run_until_complete(test_class._run_async_test_methods(
+                list(group),
+                self.test_data,
+                row_data={
+                    key: self.data_for(group_item) for key, group_item in group.items() if group_item.rows is not None
+                },
+                on_start=lambda method_name, index: self.report_started(group[(method_name, index)]),
+                on_result=lambda method_name, index, test_object: self.report_result(
+                    group[(method_name, index)], test_object
+                ),
+                default_timeout=self.options.default_timeout,
+                memory=self.options.memory,
+            ))
+        self.profile.add(profiler.stats)
+        return True
+
+    def finish(self):
+        """
+        Tears down every class this worker set up.
+        """
+        for test_class, first_item, set_up_start, set_up_end in self.instances.values():
+            limit = self.class_timeout(test_class)
+            if limit:
+                self.report((StormWorkerMessage.CLASS_DEADLINE, self.worker_id, first_item, ("tear_down", limit)))
+            tear_down_start = time.perf_counter_ns()
+            try:
+                test_class.tear_down()
+            except Exception as e:
+                logger.error("Test teardown failed.  Reason: %s", e)
+                self.report((StormWorkerMessage.CLASS_ERROR, self.worker_id, first_item, f"tear_down failed: {e}"))
+            tear_down_end = time.perf_counter_ns()
+            if limit:
+                self.report((StormWorkerMessage.CLASS_DEADLINE, self.worker_id, first_item, None))
+            overhead = (set_up_end - set_up_start + tear_down_end - tear_down_start) / 1e9
+            self.report((StormWorkerMessage.CLASS_TIMING, self.worker_id, first_item, overhead))
+            if self.trace is not None:
+                self.trace.add("tear_down", "class", tear_down_start, tear_down_end, {"class": first_item.class_key})
+                # From set_up to tear_down on this worker, the tests of other classes it ran meanwhile included
+                self.trace.add(test_class.name, "class", set_up_start, tear_down_end, {"class": first_item.class_key})
+        self.instances = {}
+        if self.profile:
+            self.report((StormWorkerMessage.PROFILE, self.worker_id, None, self.profile.stats))
+            self.profile = StormProfileStats()
+        if self.trace:
+            self.report((StormWorkerMessage.TRACE, self.worker_id, None, self.trace.take()))
+
+    def recycle_due(self) -> bool:
+        memory = self.options.memory
+        if self.rss_baseline is None or memory is None or memory.recycle_after is None:
+            return False
+        rss = current_rss()
+        if rss is None or rss - self.rss_baseline <= memory.recycle_after:
+            return False
+        logger.warning(
+            f"Worker {self.worker_id} grew by {(rss - self.rss_baseline) / 2 ** 20:.1f} MiB, "
+            f"past the {memory.recycle_after / 2 ** 20:.1f} MiB limit.  Recycling it"
+        )
+        return True
+
+    def run(self) -> bool:
+        """
+        Runs the worker's share of the batch.  Returns False when the worker stopped early to be recycled.
+        """
+        while self.step():
+            if self.recycle_due():
+                self.requeue()
+                self.finish()
+                self.report((StormWorkerMessage.RECYCLE, self.worker_id, None, self.batch_id))
+                return False
+        self.finish()
+        return True
+
+
+def _pool_worker(
+        worker_id: int,
+        work_queues: list,
+        control_queue,
+        result_connection,
+        abort_event,
+        preload: list[str] = None,
+        initializer: Callable = None,
+        init_args: tuple = None,
+        log_queue=None,
+        log_config: StormLogConfig = None,
+):
+    """
+    Long-lived worker process.  Imports the preload modules once, then runs a batch for every ``(batch_id,
+    test_data, fixtures, options)`` command it receives until it is sent ``None``.  Async tests share one
+    event loop per worker.
+
+    Results go back over a pipe rather than a queue.  Pipe writes are synchronous, so a STARTED message is already
+    with the parent if the test then takes the whole process down.
+
+    A worker that is recycled for growing too much exits without reporting the batch DONE, see _WorkerBatch.
+    """
+    if log_queue is not None:
+        install_worker_logging(log_queue, log_config)
+    for module in preload or []:
+        importlib.import_module(module)
+    if initializer:
+        initializer(*(init_args or ()))
+    loop = asyncio.new_event_loop()
+    rss_baseline = current_rss()
+
+    while True:
+        command = control_queue.get()
+        if command is None:
+            break
+        batch_id, test_data, fixtures, options = command
+        completed = _WorkerBatch(
+            worker_id,
+            batch_id,
+            work_queues,
+            result_connection.send,
+            abort_event,
+            test_data,
+            loop,
+            fixtures,
+            options,
+            rss_baseline,
+        ).run()
+        if not completed:
+            break
+        result_connection.send((StormWorkerMessage.DONE, worker_id, None, batch_id))
+
+
+class StormWorkerPool:
+    """
+    A long-lived pool of worker processes that is reused for every batch of work, so process start up and the import
+    of heavy client libraries is paid once per run instead of once per suite.
+
+    Modules in ``preload`` are imported once in every worker.  When a preload list is given and the platform supports
+    it, the pool uses the forkserver start method and preloads the modules in the fork server too, so each worker
+    starts with them already imported.  Workers that die are replaced.
+
+    A sync test that runs past its time limit has its worker killed and replaced, and is reported with a TIMEOUT
+    message.  The rest of the batch carries on.  So does it when a worker is recycled for growing past the memory
+    policy's limit.  A class whose set_up runs past its time limit is broken for the rest of the batch: it isn't set
+    up again, and its methods, the one its worker was killed over included, are reported with a CLASS_BROKEN message.
+
+    :param max_workers:     Number of worker processes, defaults to the CPU count
+    :param preload:         Module names imported once per worker, e.g. ["google.cloud.bigquery", "confluent_kafka"]
+    :param initializer:     Callable run once in every worker before it takes work
+    :param init_args:       Arguments for ``initializer``
+    :param mp_context:      multiprocessing start method, see above for the default
+    :param log_listener:    Listener the workers send their log records to, see storm_test.storm_logging.  Without
+                            one, workers only log what their initializer sets up
+    """
+
+    max_replacements = 3
+
+    def __init__(
+            self,
+            max_workers: int = None,
+            preload: list[str] = None,
+            initializer: Callable = None,
+            init_args: tuple = None,
+            mp_context: str = None,
+            log_listener: StormLogListener = None,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.preload = preload or []
+        self.initializer = initializer
+        self.init_args = init_args
+        self.log_listener = log_listener
+        if mp_context is None and self.preload and "forkserver" in multiprocessing.get_all_start_methods():
+            mp_context = "forkserver"
+        self.context = multiprocessing.get_context(mp_context)
+        if mp_context == "forkserver" and self.preload:
+            self.context.set_forkserver_preload(self.preload)
+
+        self._workers = []
+        self._work_queues = []
+        self._control_queues = []
+        self._result_readers = []
+        self._abort_event = None
+        self._batch_id = 0
+
+    @property
+    def started(self):
+        return bool(self._workers)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def _spawn(self, worker_id: int):
+        self._control_queues[worker_id] = self.context.Queue()
+        result_reader, result_writer = self.context.Pipe(duplex=False)
+        self._result_readers[worker_id] = result_reader
+        worker = self.context.Process(
+            target=_pool_worker,
+            args=(
+                worker_id,
+                self._work_queues,
+                self._control_queues[worker_id],
+                result_writer,
+                self._abort_event,
+                self.preload,
+                self.initializer,
+                self.init_args,
+                self.log_listener.worker_queue(self.context) if self.log_listener else None,
+                self.log_listener.config if self.log_listener else None,
+            ),
+            name=f"storm-worker-{worker_id}",
+        )
+        worker.start()
+        result_writer.close()
+        self._workers[worker_id] = worker
+
+    def start(self):
+        if self.started:
+            return
+        logger.info(f"Starting {self.max_workers} storm workers")
+        self._work_queues = [self.context.Queue() for _ in range(self.max_workers)]
+        self._control_queues = [None] * self.max_workers
+        self._workers = [None] * self.max_workers
+        self._result_readers = [None] * self.max_workers
+        self._abort_event = self.context.Event()
+        for worker_id in range(self.max_workers):
+            self._spawn(worker_id)
+
+    def shutdown(self):
+        if not self.started:
+            return
+        logger.info("Shutting down storm workers")
+        for control_queue in self._control_queues:
+            control_queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        for work_queue in self._work_queues:
+            # Anything still queued belongs to an aborted batch, don't block interpreter exit flushing it
+            work_queue.cancel_join_thread()
+        for result_reader in self._result_readers:
+            result_reader.close()
+        self._workers = []
+
+    def abort(self):
+        """
+        Stops workers from taking further work in the current batch.  Tests already running finish and are reported.
+        """
+        if self._abort_event is not None:
+            self._abort_event.set()
+
+    def _receive(self, worker_id: int, batch_id: int, finished: set, killed: set) -> list[tuple]:
+        """
+        Reads everything waiting on a worker's result pipe.
+        """
+        messages = []
+        reader = self._result_readers[worker_id]
+        try:
+            while reader.poll():
+                message = reader.recv()
+                if message[0] == StormWorkerMessage.DONE:
+                    if message[3] == batch_id:
+                        finished.add(worker_id)
+                    continue
+                if message[0] == StormWorkerMessage.RECYCLE:
+                    # The worker is on its way out, its exit is expected
+                    killed.add(worker_id)
+                    continue
+                messages.append(message)
+        except (EOFError, OSError):
+            pass
+        return messages
+
+    def _collect(
+            self,
+            command: tuple,
+            finished: set,
+            replacements: dict,
+            deadlines: dict,
+            killed: set,
+            broken: dict,
+    ) -> list[tuple]:
+        """
+        Waits up to a second, or until the next test deadline, for the next messages of the batch.  Workers that died
+        along the way are replaced and reported with a WORKER_LOST message carrying their exit code.  Workers whose
+        test ran past its deadline are killed and replaced, and the test is reported with a TIMEOUT message.  So are
+        workers stuck in a class's set_up or tear_down, the class is reported with a CLASS_ERROR message.  A class
+        whose set_up timed out goes in ``broken``, and replacement workers are told to skip it.  A worker that starts
+        setting it up anyway, having taken the class's methods before it broke, is killed straight away.
+
+        :param deadlines:   Worker id to (deadline, work item, time limit, phase) of the sync test, or the set_up or
+                            tear_down phase of a class, it is running.  The phase is None for a test
+        :param killed:      Workers killed for a timeout or recycled, whose replacement doesn't count against
+                            max_replacements
+        :param broken:      Class key to the error of every class whose set_up timed out in this batch
+        """
+        batch_id = command[0]
+        readers = {reader: worker_id for worker_id, reader in enumerate(self._result_readers)}
+        sentinels = {
+            worker.sentinel: worker_id
+            for worker_id, worker in enumerate(self._workers)
+            if worker_id not in finished
+        }
+        timeout = 1.0
+        if deadlines:
+            timeout = min(timeout, max(0.0, min(deadline for deadline, *_ in deadlines.values()) - time.monotonic()))
+        messages = []
+        for ready in multiprocessing.connection.wait(list(readers) + list(sentinels), timeout=timeout):
+            if ready in readers:
+                messages += self._receive(readers[ready], batch_id, finished, killed)
+                continue
+
+            worker_id = sentinels[ready]
+            worker = self._workers[worker_id]
+            # Whatever it managed to send before it died still counts
+            messages += self._receive(worker_id, batch_id, finished, killed)
+            if worker_id in finished:
+                continue
+            worker.join()
+            deadlines.pop(worker_id, None)
+            if worker_id in killed:
+                killed.discard(worker_id)
+            else:
+                logger.error(f"Worker {worker_id} exited with code {worker.exitcode} before finishing")
+                messages.append((StormWorkerMessage.WORKER_LOST, worker_id, None, worker.exitcode))
+                replacements[worker_id] = replacements.get(worker_id, 0) + 1
+            if replacements.get(worker_id, 0) > self.max_replacements:
+                logger.error(f"Worker {worker_id} keeps dying, leaving its slot empty for this batch")
+                finished.add(worker_id)
+                continue
+            self._spawn(worker_id)
+            # A worker that dies right after putting back an end marker may take it down with it, unflushed.  Spare
+            # markers are harmless, a lost one leaves the batch waiting forever.
+            for work_queue in self._work_queues:
+                work_queue.put((batch_id, None))
+            batch_id, test_data, fixtures, options = command
+            self._control_queues[worker_id].put(
+                (batch_id, test_data, fixtures, replace(options or StormBatchOptions(), broken_classes=dict(broken)))
+            )
+
+        for message, worker_id, work_item, payload in messages:
+            if message == StormWorkerMessage.STARTED and payload:
+                deadlines[worker_id] = (time.monotonic() + payload, work_item, payload, None)
+            elif message == StormWorkerMessage.CLASS_DEADLINE and payload:
+                phase, limit = payload
+                # Broken classes have had their time already
+                deadline = time.monotonic() + (0.0 if phase == "set_up" and work_item.class_key in broken else limit)
+                deadlines[worker_id] = (deadline, work_item, limit, phase)
+            elif message in (StormWorkerMessage.RESULT, StormWorkerMessage.CLASS_DEADLINE):
+                deadlines.pop(worker_id, None)
+        messages = [message for message in messages if message[0] != StormWorkerMessage.CLASS_DEADLINE]
+        now = time.monotonic()
+        for worker_id, (deadline, work_item, limit, phase) in list(deadlines.items()):
+            if deadline > now:
+                continue
+            del deadlines[worker_id]
+            killed.add(worker_id)
+            self._workers[worker_id].kill()
+            if phase is None:
+                logger.error(f"{work_item.test_id} ran past its {limit}s time limit, killing worker {worker_id}")
+                messages.append((StormWorkerMessage.TIMEOUT, worker_id, work_item, limit))
+            elif phase == "set_up" and work_item.class_key in broken:
+                logger.error(f"Worker {worker_id} is setting up {work_item.class_key} again after it broke, killing it")
+                messages.append((StormWorkerMessage.CLASS_BROKEN, worker_id, work_item, broken[work_item.class_key]))
+            else:
+                logger.error(
+                    f"{work_item.class_key} {phase} ran past its {limit}s time limit, killing worker {worker_id}"
+                )
+                error = f"{phase} timed out after {limit}s"
+                messages.append((StormWorkerMessage.CLASS_ERROR, worker_id, work_item, error))
+                if phase == "set_up":
+                    broken[work_item.class_key] = error
+                    # Its worker had taken it off the queue
+                    messages.append((StormWorkerMessage.CLASS_BROKEN, worker_id, work_item, error))
+                    # Other workers stuck setting it up are killed on the next round, without waiting out their limit
+                    for other_id, (_, other_item, other_limit, other_phase) in deadlines.items():
+                        if other_phase == "set_up" and other_item.class_key == work_item.class_key:
+                            deadlines[other_id] = (now, other_item, other_limit, other_phase)
+        return messages
+
+    def run_batch(
+            self,
+            assignments: list[list[StormWorkItem]],
+            test_data=None,
+            fixtures: StormFixtureValues = None,
+            options: StormBatchOptions = None,
+    ) -> Iterator[tuple]:
+        """
+        Queues one list of work items per worker and yields ``(message, worker_id, work_item, payload)`` tuples as
+        workers report back, until every worker has finished the batch.  Test data and fixture values are pickled
+        once per worker per batch.
+
+        :param options:     Run settings applied by every worker, see StormBatchOptions
+        """
+        self.start()
+        self._batch_id += 1
+        batch_id = self._batch_id
+        self._abort_event.clear()
+        for worker_id in range(self.max_workers):
+            items = assignments[worker_id] if worker_id < len(assignments) else []
+            for item in items:
+                self._work_queues[worker_id].put((batch_id, item))
+            self._work_queues[worker_id].put((batch_id, None))
+        command = (batch_id, test_data, fixtures, options)
+        for control_queue in self._control_queues:
+            control_queue.put(command)
+
+        finished = set()
+        replacements = {}
+        deadlines = {}
+        killed = set()
+        broken = {}
+        try:
+            while len(finished) < self.max_workers:
+                yield from self._collect(command, finished, replacements, deadlines, killed, broken)
+        finally:
+            if len(finished) < self.max_workers:
+                # The consumer stopped listening.  Stop handing out work and let the workers wind the batch down, so
+                # the pool is idle and reusable again.
+                self.abort()
+                while len(finished) < self.max_workers:
+                    self._collect(command, finished, replacements, deadlines, killed, broken)
+
+
+class StormThreadPool:
+    """
+    Runs batches on worker threads in the calling process.  Nothing is pickled, which suits I/O-bound suites such as
+    cloud integration tests.  Exposes the same interface as StormWorkerPool.
+
+    A thread can't be killed, so only async tests are held to their time limit.  Use the process backend for sync
+    tests that may hang.
+
+    :param max_workers:     Number of worker threads, defaults to the CPU count
+    """
+
+    def __init__(self, max_workers: int = None, **kwargs):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._abort_event = threading.Event()
+        self._batch_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def abort(self):
+        self._abort_event.set()
+
+    def _thread_worker(
+            self,
+            worker_id: int,
+            batch_id: int,
+            work_queues: list,
+            results: queue.Queue,
+            test_data,
+            fixtures: StormFixtureValues,
+            options: StormBatchOptions,
+    ):
+        loop = asyncio.new_event_loop()
+        try:
+            _WorkerBatch(
+                worker_id,
+                batch_id,
+                work_queues,
+                results.put,
+                self._abort_event,
+                test_data,
+                loop,
+                fixtures,
+                options,
+            ).run()
+        except Exception as e:
+            logger.exception(f"Worker thread {worker_id} failed: {e}")
+        finally:
+            loop.close()
+            results.put((StormWorkerMessage.DONE, worker_id, None, batch_id))
+
+    def run_batch(
+            self,
+            assignments: list[list[StormWorkItem]],
+            test_data=None,
+            fixtures: StormFixtureValues = None,
+            options: StormBatchOptions = None,
+    ) -> Iterator[tuple]:
+        self._batch_id += 1
+        self._abort_event.clear()
+        work_queues = [queue.Queue() for _ in range(self.max_workers)]
+        for worker_id, work_queue in enumerate(work_queues):
+            for item in assignments[worker_id] if worker_id < len(assignments) else []:
+                work_queue.put((self._batch_id, item))
+            work_queue.put((self._batch_id, None))
+        results = queue.Queue()
+        threads = [
+            threading.Thread(
+                target=self._thread_worker,
+                args=(worker_id, self._batch_id, work_queues, results, test_data, fixtures, options),
+                name=f"storm-worker-{worker_id}",
+                daemon=True,
+            )
+            for worker_id in range(self.max_workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        finished = 0
+        try:
+            while finished < self.max_workers:
+                message = results.get()
+                if message[0] == StormWorkerMessage.DONE:
+                    finished += 1
+                    continue
+                yield message
+        finally:
+            if finished < self.max_workers:
+                self.abort()
+            for thread in threads:
+                thread.join()
+
+
+class StormInlinePool:
+    """
+    Runs batches sequentially in the calling thread, one test at a time.  Useful for debugging and for suites where
+    any concurrency costs more than it saves.  Exposes the same interface as StormWorkerPool.  As with threads, only
+    async tests are held to their time limit.
+    """
+
+    max_workers = 1
+
+    def __init__(self, *args, **kwargs):
+        self._abort_event = threading.Event()
+        self._batch_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def abort(self):
+        self._abort_event.set()
+
+    def run_batch(
+            self,
+            assignments: list[list[StormWorkItem]],
+            test_data=None,
+            fixtures: StormFixtureValues = None,
+            options: StormBatchOptions = None,
+    ) -> Iterator[tuple]:
+        self._batch_id += 1
+        self._abort_event.clear()
+        work_queue = queue.Queue()
+        for items in assignments:
+            for item in items:
+                work_queue.put((self._batch_id, item))
+        work_queue.put((self._batch_id, None))
+
+        messages = []
+        loop = asyncio.new_event_loop()
+        batch = _WorkerBatch(
+            0,
+            self._batch_id,
+            [work_queue],
+            messages.append,
+            self._abort_event,
+            test_data,
+            loop,
+            fixtures,
+            options,
+        )
+        try:
+            while batch.step():
+                yield from messages
+                messages.clear()
+        finally:
+            batch.finish()
+            loop.close()
+        yield from messages
+
+
+class StormExecutionBackend(Enum):
+    PROCESS = "process"
+    THREAD = "thread"
+    INLINE = "inline"
+    DISTRIBUTED = "distributed"
+
+
+def create_pool(backend: StormExecutionBackend = StormExecutionBackend.PROCESS, **kwargs):
+    """
+    Creates the worker pool for an execution backend.  Keyword arguments are passed on to the pool, the thread and
+    inline pools ignore the ones that only make sense for processes.  The distributed pool needs a ``broker``.
+    """
+    match StormExecutionBackend(backend):
+        case StormExecutionBackend.DISTRIBUTED:
+            from storm_test.storm_distributed import StormDistributedPool
+
+            return StormDistributedPool(**kwargs)
+        case StormExecutionBackend.THREAD:
+            return StormThreadPool(**kwargs)
+        case StormExecutionBackend.INLINE:
+            return StormInlinePool(**kwargs)
+        case _:
+            return StormWorkerPool(**kwargs)
+
+
+class StormWorkStealingScheduler:
+    """
+    Schedules individual test methods across a pool of worker processes.
+
+    Methods of the same class are queued on the same worker so ``set_up``/``tear_down`` run as few times as possible.
+    Workers that run out of work steal queued methods from busy workers, paying one extra ``set_up``/``tear_down`` for
+    every class they steal from.
+
+    :param max_workers:     Number of worker processes, defaults to the CPU count.  Ignored when a pool is given
+    :param initializer:     Callable run once in every worker before it takes work.  Ignored when a pool is given
+    :param init_args:       Arguments for ``initializer``
+    :param mp_context:      multiprocessing start method, defaults to the platform default
+    :param timings:         Historical durations used to pack work longest-processing-time first
+    :param pool:            Long-lived worker pool to run on.  Without one, a pool is started and shut down per run
+    :param backend:         Execution backend of the per-run pool, process, thread or inline
+    :param options:         Run settings applied by every worker, e.g. the default time limit of a test
+    """
+
+    def __init__(
+            self,
+            max_workers: int = None,
+            initializer: Callable = None,
+            init_args: tuple = None,
+            mp_context: str = None,
+            timings: StormTimingCache = None,
+            pool: StormWorkerPool | StormThreadPool | StormInlinePool = None,
+            backend: StormExecutionBackend = StormExecutionBackend.PROCESS,
+            options: StormBatchOptions = None,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.initializer = initializer
+        self.init_args = init_args
+        self.mp_context = mp_context
+        self.timings = timings
+        self.pool = pool
+        self.backend = backend
+        self.options = options or StormBatchOptions()
+        self._active_pool = None
+
+    def estimate(self, item: StormWorkItem) -> float:
+        rows = item.rows.size if item.rows is not None else 1
+        return (self.timings.estimate_test(item.timing_id) if self.timings else 1.0) * rows
+
+    def distribute(self, work_items: list[StormWorkItem], worker_count: int) -> list[list[StormWorkItem]]:
+        """
+        Packs work onto workers longest-processing-time first, using the estimated duration of every method.
+
+        Classes stay together unless they are longer than a worker's fair share of the run, in which case they are
+        split into chunks that each pay the class set_up/tear_down overhead again.  Chunks are then handed, longest
+        first, to the least loaded worker, and every queue runs its longest methods first.  Work stealing evens out
+        whatever the estimates got wrong.
+        """
+        classes = {}
+        for item in work_items:
+            classes.setdefault(item.class_key, []).append(item)
+
+        fair_share = sum(self.estimate(item) for item in work_items) / worker_count
+        chunks = []
+        for class_key, items in classes.items():
+            items = sorted(items, key=self.estimate, reverse=True)
+            overhead = self.timings.class_overhead(class_key) if self.timings else 0.0
+            class_cost = sum(self.estimate(item) for item in items)
+            chunk_count = min(len(items), worker_count, max(1, math.ceil(class_cost / fair_share) if fair_share else 1))
+            class_chunks = [[0.0, []] for _ in range(chunk_count)]
+            for item in items:
+                chunk = min(class_chunks, key=lambda c: c[0])
+                chunk[0] += self.estimate(item)
+                chunk[1].append(item)
+            chunks += [(cost + overhead, chunk_items) for cost, chunk_items in class_chunks]
+
+        loads = [0.0] * worker_count
+        assignments = [[] for _ in range(worker_count)]
+        for cost, chunk_items in sorted(chunks, key=lambda c: c[0], reverse=True):
+            worker_id = loads.index(min(loads))
+            loads[worker_id] += cost
+            assignments[worker_id].extend(chunk_items)
+        return assignments
+
+    def abort(self):
+        """
+        Stops workers from taking further work.  Tests already running finish and are still reported.
+        """
+        if self._active_pool is not None:
+            self._active_pool.abort()
+
+    def run(
+            self,
+            work_items: list[StormWorkItem],
+            test_data=None,
+            fixtures: StormFixtureValues = None,
+    ) -> Iterator[tuple]:
+        """
+        Runs the work items and yields ``(message, worker_id, work_item, payload)`` tuples as workers report back.
+        """
+        if not work_items:
+            return
+
+        pool = self.pool or create_pool(
+            self.backend,
+            max_workers=min(self.max_workers, len(work_items)),
+            initializer=self.initializer,
+            init_args=self.init_args,
+            mp_context=self.mp_context,
+        )
+        self._active_pool = pool
+        try:
+            yield from pool.run_batch(
+                self.distribute(work_items, pool.max_workers), test_data, fixtures, self.options
+            )
+        finally:
+            self._active_pool = None
+            if pool is not self.pool:
+                pool.shutdown()
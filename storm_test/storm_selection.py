@@ -0,0 +1,189 @@
+import ast
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+from storm_test.storm_scheduler import StormWorkItem
+
+logger = logging.getLogger(__name__)
+
+_EXCLUDED_DIRS = {"__pycache__", "venv", "site-packages", "node_modules", "logs"}
+
+
+def _module_name(path: Path, project_root: Path) -> str:
+    parts = path.relative_to(project_root).with_suffix("").parts
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+def _imported_names(source: str, module_name: str, is_package: bool) -> set[str]:
+    """
+    Every module name an import statement in ``source`` could refer to.  ``from a import b`` yields both ``a`` and
+    ``a.b``, since ``b`` may be a submodule.  Relative imports are resolved against ``module_name``.
+    """
+    names = set()
+    package = module_name if is_package else module_name.rpartition(".")[0]
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                anchor = package.split(".") if package else []
+                anchor = anchor[:len(anchor) - (node.level - 1)] if node.level > 1 else anchor
+                base = ".".join(part for part in [*anchor, base] if part)
+            if base:
+                names.add(base)
+            names.update(f"{base}.{alias.name}" if base else alias.name for alias in node.names)
+    return names
+
+
+class StormChangeSelector:
+    """
+    Selects only the tests affected by the files changed since the previous run, plus the tests that failed last
+    time.
+
+    Every Python file under ``project_root`` is parsed for its imports to build a module dependency graph.  A test is
+    affected when its module, or anything it imports directly or transitively, changed since the content-hash snapshot
+    of the previous run.  Importing ``a.b.c`` also counts ``a`` and ``a.b``, since their ``__init__`` runs too.
+    Imports done dynamically, through importlib or strings, are not seen.  Without a snapshot every test is selected.
+
+    :param project_root:    Root of the project, defaults to the current working directory
+    :param snapshot_path:   JSON file the hashes and failures are stored in, defaults to .storm_cache/selection.json
+    """
+
+    def __init__(self, project_root: Path | str = None, snapshot_path: Path | str = None):
+        self.project_root = Path(project_root or Path.cwd()).resolve()
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else Path.cwd() / ".storm_cache" / "selection.json"
+        self.previous_hashes = {}
+        self.failed = set()
+        self._load()
+        self.files = self._project_files()
+        self.hashes = {module: self._hash(path) for module, path in self.files.items()}
+        self.changed = {
+            module for module, file_hash in self.hashes.items() if self.previous_hashes.get(module) != file_hash
+        }
+        self.first_run = not self.previous_hashes
+        self.graph = self._import_graph()
+        self._affected = {}
+
+    def _load(self):
+        if not self.snapshot_path.exists():
+            return
+        try:
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read selection snapshot {self.snapshot_path}, running everything.  Reason: {e}")
+            return
+        self.previous_hashes = snapshot.get("hashes", {})
+        self.failed = set(snapshot.get("failed", []))
+
+    def save(self):
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.snapshot_path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"hashes": self.hashes, "failed": sorted(self.failed)}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.snapshot_path)
+
+    def _project_files(self) -> dict[str, Path]:
+        files = {}
+        for root, dirs, filenames in os.walk(self.project_root):
+            dirs[:] = [d for d in dirs if not d.startswith(".") and d not in _EXCLUDED_DIRS]
+            for filename in filenames:
+                if filename.endswith(".py"):
+                    path = Path(root) / filename
+                    files[_module_name(path, self.project_root)] = path
+        return files
+
+    @staticmethod
+    def _hash(path: Path) -> str:
+        return hashlib.sha1(path.read_bytes()).hexdigest()
+
+    def _import_graph(self) -> dict[str, set[str]]:
+        graph = {}
+        for module, path in self.files.items():
+            try:
+                names = _imported_names(path.read_text(), module, path.name == "__init__.py")
+            except (SyntaxError, UnicodeDecodeError) as e:
+                logger.warning(f"Could not parse {path} for imports, treating it as always affected.  Reason: {e}")
+                self.changed.add(module)
+                names = set()
+            dependencies = set()
+            for name in names:
+                parts = name.split(".")
+                # Importing a.b.c runs a/__init__ and a/b/__init__ as well
+                for end in range(1, len(parts) + 1):
+                    candidate = ".".join(parts[:end])
+                    if candidate in self.files and candidate != module:
+                        dependencies.add(candidate)
+            graph[module] = dependencies
+        return graph
+
+    def is_affected(self, module: str) -> bool:
+        """
+        True if the module, or anything it imports transitively, changed since the last run.
+        """
+        if module in self._affected:
+            return self._affected[module]
+        seen = set()
+        stack = [module]
+        affected = False
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            if current in self.changed:
+                affected = True
+                break
+            stack.extend(self.graph.get(current, ()))
+        self._affected[module] = affected
+        return affected
+
+    def _project_module(self, module: str) -> str | None:
+        """
+        Maps a test's module name to the project module it lives in.  ``__main__`` is resolved through its file.
+        """
+        if module in self.files:
+            return module
+        loaded = sys.modules.get(module)
+        origin = getattr(loaded, "__file__", None)
+        if origin is None:
+            try:
+                spec = importlib.util.find_spec(module)
+            except (ImportError, ValueError):
+                spec = None
+            origin = spec.origin if spec else None
+        if origin:
+            path = Path(origin).resolve()
+            if self.project_root in path.parents:
+                return _module_name(path, self.project_root)
+        return None
+
+    def select(self, work_items: list[StormWorkItem]) -> tuple[list[StormWorkItem], list[StormWorkItem]]:
+        """
+        Splits work items into the ones to run and the ones the change set does not reach.
+        """
+        if self.first_run:
+            return list(work_items), []
+        selected, deselected = [], []
+        for item in work_items:
+            project_module = self._project_module(item.module)
+            if item.test_id in self.failed or project_module is None or self.is_affected(project_module):
+                selected.append(item)
+            else:
+                deselected.append(item)
+        logger.info(f"Change selection: running {len(selected)} tests, skipping {len(deselected)}")
+        return selected, deselected
+
+    def record_result(self, test_id: str, failed: bool):
+        if failed:
+            self.failed.add(test_id)
+        else:
+            self.failed.discard(test_id)
@@ -0,0 +1,213 @@
+import argparse
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+from storm_test.storm_scheduler import StormWorkItem
+from storm_test.storm_timings import StormTimingCache
+
+logger = logging.getLogger(__name__)
+
+
+def _stable_hash(test_id: str) -> int:
+    # hash() is salted per process, every node has to agree on where a test goes
+    return int.from_bytes(hashlib.sha1(test_id.encode()).digest()[:8], "big")
+
+
+@dataclass(frozen=True)
+class StormShard:
+    """
+    One of ``count`` deterministic slices of the collected test methods, numbered from 1 as in ``--shard 3/12``.
+
+    Methods with recorded durations are packed longest first onto the least loaded shard, so shards finish at about
+    the same time rather than holding the same number of tests.  Methods without history are placed by a stable hash
+    of their test id, and counted at the median duration.  Every node has to see the same timings for the slices to
+    line up, so point the runs at a timing cache shared between them, e.g. one restored from the last merged run.
+    """
+    index: int
+    count: int
+
+    def __post_init__(self):
+        if self.count < 1 or not 1 <= self.index <= self.count:
+            raise ValueError(f"Invalid shard {self.index}/{self.count}, expected 1 <= i <= N")
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    @classmethod
+    def parse(cls, value: str) -> "StormShard":
+        """
+        Parses ``"i/N"``.
+        """
+        try:
+            index, count = (int(part) for part in value.split("/"))
+        except ValueError:
+            raise ValueError(f"Invalid shard {value!r}, expected i/N, e.g. 3/12") from None
+        return cls(index, count)
+
+    @classmethod
+    def from_argv(cls, argv: list[str] = None) -> "StormShard | None":
+        """
+        The shard given as ``--shard i/N`` on the command line, or None.  Other arguments are left alone.
+        """
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument("--shard", type=cls.parse)
+        arguments, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+        return arguments.shard
+
+    def partition(self, work_items: list[StormWorkItem], timings: StormTimingCache = None) -> list[list[StormWorkItem]]:
+        """
+        Splits the work items into ``count`` shards, each in the order the items were given.
+        """
+        loads = [0.0] * self.count
+        assigned = {}
+        known = []
+        for item in work_items:
+            if timings and item.test_id in timings.tests:
+                known.append(item)
+                continue
+            shard = _stable_hash(item.test_id) % self.count
+            assigned[item.test_id] = shard
+            loads[shard] += timings.estimate_test(item.test_id) if timings else 1.0
+
+        for item in sorted(known, key=lambda i: (-timings.tests[i.test_id], i.test_id)):
+            shard = min(range(self.count), key=lambda s: (loads[s], s))
+            assigned[item.test_id] = shard
+            loads[shard] += timings.tests[item.test_id]
+
+        shards = [[] for _ in range(self.count)]
+        for item in work_items:
+            shards[assigned[item.test_id]].append(item)
+        return shards
+
+    def select(self, work_items: list[StormWorkItem], timings: StormTimingCache = None) -> list[StormWorkItem]:
+        """
+        The work items that belong to this shard.
+        """
+        selected = self.partition(work_items, timings)[self.index - 1]
+        logger.info(f"Shard {self}: running {len(selected)} of {len(work_items)} tests")
+        return selected
+
+
+def write_results(path: os.PathLike | str, test_suites: list, shard: StormShard = None):
+    """
+    Writes the results of a run, or of one shard of it, to a JSON file that merge_results can combine.
+
+    :param path:        Result file to write
+    :param test_suites: StormTestSuite objects whose results to write
+    :param shard:       Shard the run covered, recorded in the file
+    """
+    results = {
+        "shard": str(shard) if shard else None,
+        "suites": [
+            {
+                "name": test_suite.name,
+                "classes": [
+                    {
+                        "name": class_result.name,
+                        "key": class_result.key,
+                        "status": class_result.test_status.value,
+                        "passed_rows": class_result.passed_rows,
+                        "tests": [
+                            {
+                                "name": test_object.name,
+                                "status": test_object.status.value,
+                                "start": test_object.start,
+                                "duration": test_object.duration,
+                                "error": test_object.error,
+                                "attempts": len(test_object.attempts or []) + 1,
+                                "quarantined": test_object.quarantined,
+                                "memory": dataclasses.asdict(test_object.memory) if test_object.memory else None,
+                                "correlation_id": test_object.correlation_id,
+                                "logs": list(test_object.logs) if test_object.logs else None,
+                            }
+                            for test_object in class_result.test_object
+                        ],
+                    }
+                    for class_result in test_suite.test_results
+                ],
+            }
+            for test_suite in test_suites
+        ],
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def _merged_status(statuses: list[str]) -> str:
+    if "FAIL" in statuses:
+        return "FAIL"
+    if set(statuses) == {"SKIPPED"}:
+        return "SKIPPED"
+    if set(statuses) <= {"PASS", "SKIPPED"}:
+        return "PASS"
+    return "NOT_RUN"
+
+
+def merge_results(paths: list[os.PathLike | str], output: os.PathLike | str = None) -> dict:
+    """
+    Merges per-shard result files into one run report.  A class split across shards is merged into one entry, by its
+    module and qualified name, which fails if it failed on any shard and counts the passed rows of every shard.
+
+    :param paths:   Result files written by write_results
+    :param output:  File to write the merged report to
+    :return:        The merged report
+    """
+    suites = {}
+    shards = []
+    for path in paths:
+        with open(path, "r") as f:
+            results = json.load(f)
+        shards.append(results.get("shard"))
+        for suite in results["suites"]:
+            classes = suites.setdefault(suite["name"], {})
+            for class_result in suite["classes"]:
+                # Files written before classes had a key are merged by name
+                key = class_result.get("key") or class_result["name"]
+                merged = classes.setdefault(
+                    key, {"name": class_result["name"], "key": key, "statuses": [], "passed_rows": 0, "tests": []}
+                )
+                merged["statuses"].append(class_result["status"])
+                merged["passed_rows"] += class_result.get("passed_rows", 0)
+                merged["tests"] += class_result["tests"]
+
+    report = {"shards": shards, "suites": []}
+    for suite_name, classes in suites.items():
+        report["suites"].append({
+            "name": suite_name,
+            "classes": [
+                {
+                    "name": merged["name"],
+                    "key": merged["key"],
+                    "status": _merged_status(merged["statuses"]),
+                    "passed_rows": merged["passed_rows"],
+                    "tests": merged["tests"],
+                }
+                for merged in classes.values()
+            ],
+        })
+    if output:
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge per-shard storm result files into one run report")
+    parser.add_argument("results", nargs="+", help="Result files written by each shard")
+    parser.add_argument("-o", "--output", required=True, help="Merged report to write")
+    args = parser.parse_args()
+    merged_report = merge_results(args.results, args.output)
+    for merged_suite in merged_report["suites"]:
+        print(f"Test result {merged_suite['name']}:")
+        for merged_class in merged_suite["classes"]:
+            print(f"{merged_class['name']}: {merged_class['status']}")
@@ -0,0 +1,96 @@
+import copy
+import json
+import logging
+import os
+import statistics
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class StormTimingCache:
+    """
+    Local cache of historical wall-clock durations, used to schedule the slowest work first.
+
+    Durations are smoothed with an exponential moving average so one slow run doesn't reorder the whole suite.
+    Tests with no history are estimated at the median of the known tests, or ``default_duration`` when nothing is
+    known yet.
+
+    :param path:                JSON file the timings are stored in, defaults to .storm_cache/timings.json
+    :param default_duration:    Estimate in seconds for tests when the cache is empty
+    :param smoothing:           Weight of the newest duration in the moving average, 1.0 keeps only the last run
+    """
+
+    def __init__(
+            self,
+            path: Path | str = None,
+            default_duration: float = 1.0,
+            smoothing: float = 0.5,
+    ):
+        self.path = Path(path) if path else Path.cwd() / ".storm_cache" / "timings.json"
+        self.default_duration = default_duration
+        self.smoothing = smoothing
+        self.tests = {}
+        self.classes = {}
+        self._default_estimate = None
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r") as f:
+                timings = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read timing cache {self.path}, starting empty.  Reason: {e}")
+            return
+        self.tests = timings.get("tests", {})
+        self.classes = timings.get("classes", {})
+        self._default_estimate = None
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"tests": self.tests, "classes": self.classes}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def snapshot(self) -> "StormTimingCache":
+        """
+        A copy of the timings as they are now, which the durations recorded afterwards don't change.
+        """
+        snapshot = copy.copy(self)
+        snapshot.tests = dict(self.tests)
+        snapshot.classes = dict(self.classes)
+        return snapshot
+
+    def _smooth(self, previous: float | None, duration: float) -> float:
+        if previous is None:
+            return duration
+        return self.smoothing * duration + (1 - self.smoothing) * previous
+
+    def record_test(self, test_id: str, duration: float):
+        previous = self.tests.get(test_id)
+        self.tests[test_id] = self._smooth(previous, duration)
+        self._default_estimate = None
+
+    def record_class(self, class_key: str, duration: float, overhead: float = 0.0):
+        """
+        :param duration:    Wall-clock time of the whole class, set up to tear down
+        :param overhead:    Time spent in set_up and tear_down, paid again by every worker that runs the class
+        """
+        previous = self.classes.get(class_key, {})
+        self.classes[class_key] = {
+            "duration": self._smooth(previous.get("duration"), duration),
+            "overhead": self._smooth(previous.get("overhead"), overhead),
+        }
+
+    def estimate_test(self, test_id: str) -> float:
+        if test_id in self.tests:
+            return self.tests[test_id]
+        if self._default_estimate is None:
+            self._default_estimate = statistics.median(self.tests.values()) if self.tests else self.default_duration
+        return self._default_estimate
+
+    def class_overhead(self, class_key: str) -> float:
+        return self.classes.get(class_key, {}).get("overhead", 0.0)
@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import socket
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Buffer the spans of the code running in this context go to, None when not tracing
+_active_trace: ContextVar["StormTraceBuffer | None"] = ContextVar("_active_trace", default=None)
+# When the current test's last validate step ended, the next step's span starts there
+_step_start: ContextVar[int | None] = ContextVar("_step_start", default=None)
+
+
+class StormTraceBuffer:
+    """
+    Spans recorded by one worker, or by the runner itself, as Chrome trace events.  Times are taken with
+    perf_counter_ns and shifted to the epoch once per buffer, so spans are high resolution within a process and still
+    line up across processes and hosts, as far as their clocks agree.
+
+    :param worker_id:   Worker the spans belong to, shown as the thread of the trace.  None for the runner
+    """
+
+    # Spans past this many are counted rather than kept, so a test that validates in a tight loop can't flood the run
+    max_events = 200_000
+
+    def __init__(self, worker_id: int = None):
+        self.pid = os.getpid()
+        # Thread 0 is the runner, workers follow, so an inline worker sharing the runner's process gets its own track
+        self.tid = 0 if worker_id is None else worker_id + 1
+        self.label = "runner" if worker_id is None else f"worker {worker_id}"
+        self.process_label = f"{socket.gethostname()} pid {self.pid}"
+        self.events = []
+        self.dropped = 0
+        self._epoch_offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    def __bool__(self):
+        return bool(self.events)
+
+    def add(self, name: str, category: str, start_ns: int, end_ns: int, args: dict = None):
+        """
+        Adds a span, timed with perf_counter_ns.
+        """
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start_ns + self._epoch_offset_ns) / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self.pid,
+            "tid": self.tid,
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def take(self) -> dict:
+        """
+        Hands the recorded spans over, as the payload of a TRACE message, and starts an empty buffer.
+        """
+        payload = {
+            "pid": self.pid,
+            "tid": self.tid,
+            "label": self.label,
+            "process_label": self.process_label,
+            "events": self.events,
+            "dropped": self.dropped,
+        }
+        self.events = []
+        self.dropped = 0
+        return payload
+
+
+def activate_trace(buffer: StormTraceBuffer | None):
+    """
+    Sends the spans of the current context to ``buffer``.  Returns the token to pass to deactivate_trace.
+    """
+    return _active_trace.set(buffer)
+
+
+def deactivate_trace(token):
+    _active_trace.reset(token)
+
+
+def active_trace() -> StormTraceBuffer | None:
+    return _active_trace.get()
+
+
+class _Span:
+    __slots__ = ("buffer", "name", "category", "args", "start")
+
+    def __init__(self, buffer: StormTraceBuffer, name: str, category: str, args: dict):
+        self.buffer = buffer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.buffer.add(self.name, self.category, self.start, time.perf_counter_ns(), self.args)
+
+
+_NO_SPAN = nullcontext()
+
+
+def traced(name: str, category: str, **args):
+    """
+    Context manager recording the block it wraps as a span, when tracing.  For tests to trace parts of themselves,
+    the framework's own spans are recorded from the timestamps it takes anyway.
+    """
+    buffer = _active_trace.get()
+    if buffer is None:
+        return _NO_SPAN
+    return _Span(buffer, name, category, args)
+
+
+def start_steps() -> int:
+    """
+    Marks the start of the current test's first step, see record_step.  Only called when tracing.
+
+    :return:    The perf_counter_ns timestamp marked
+    """
+    now = time.perf_counter_ns()
+    _step_start.set(now)
+    return now
+
+
+def record_step(name: str, passed=None):
+    """
+    Records a validate step as a span from the end of the previous step, or from start_steps, to now: the time the
+    test spent getting to the value it validated.  Does nothing when not tracing.
+
+    :param passed:  The validated value, recorded as whether it passed
+    """
+    buffer = _active_trace.get()
+    if buffer is None:
+        return
+    end = time.perf_counter_ns()
+    start = _step_start.get()
+    buffer.add(name, "validate", end if start is None else start, end, {"passed": bool(passed)})
+    _step_start.set(end)
+
+
+class StormTrace:
+    """
+    The spans of a whole run: the runner's own run and suite spans, and the spans every worker sends back.  Written as
+    Chrome trace-event JSON, which chrome://tracing, Perfetto and speedscope open, with one track per worker.
+    """
+
+    def __init__(self):
+        self.runner = StormTraceBuffer()
+        self.payloads = []
+
+    def __bool__(self):
+        return bool(self.runner) or bool(self.payloads)
+
+    def add(self, payload: dict):
+        """
+        Adds the spans a worker sent in a TRACE message.
+        """
+        self.payloads.append(payload)
+
+    def events(self) -> list[dict]:
+        events = []
+        named = set()
+        dropped = 0
+        for payload in [self.runner.take()] + self.payloads:
+            dropped += payload["dropped"]
+            if payload["pid"] not in {pid for pid, _ in named}:
+                events.append({
+                    "name": "process_name", "ph": "M", "pid": payload["pid"], "args": {"name": payload["process_label"]}
+                })
+            if (payload["pid"], payload["tid"]) not in named:
+                named.add((payload["pid"], payload["tid"]))
+                events.append({
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": payload["pid"],
+                    "tid": payload["tid"],
+                    "args": {"name": payload["label"]},
+                })
+            events += payload["events"]
+        if dropped:
+            logger.warning(f"{dropped} trace spans were dropped, see StormTraceBuffer.max_events")
+        self.payloads = []
+        return events
+
+    def write(self, path: os.PathLike | str) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f)
+        return path
@@ -0,0 +1,7 @@
+"""
+Regression tests of the framework itself, on the standard library's unittest, run from the repository root with
+
+    python -m unittest discover unit_tests
+
+Kept apart from tests/, which holds example suites the framework discovers and runs.
+"""
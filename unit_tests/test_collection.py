@@ -0,0 +1,71 @@
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+
+from storm_test.storm import StormTest
+from storm_test.storm_collection import StormCollectionIndex
+
+BASE_SUITE = """
+from storm_test.storm import StormTest, test_case
+
+
+class BaseSuite(StormTest):
+    @test_case
+    def inherited(self):
+        pass
+"""
+
+DERIVED_TEST = """
+from base_suite import BaseSuite
+from storm_test.storm import test_case
+
+
+class DerivedTest(BaseSuite):
+    @test_case
+    def own(self):
+        pass
+"""
+
+
+class TestCollectionIndex(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        (self.directory / "base_suite.py").write_text(BASE_SUITE)
+        (self.directory / "derived_test.py").write_text(DERIVED_TEST)
+        sys.path.insert(0, str(self.directory))
+        self.addCleanup(sys.path.remove, str(self.directory))
+        self.addCleanup(self.forget_modules)
+
+    @staticmethod
+    def forget_modules():
+        # As a new run would
+        sys.modules.pop("base_suite", None)
+        sys.modules.pop("derived_test", None)
+
+    def discover(self):
+        self.forget_modules()
+        index = StormCollectionIndex(self.directory / "collection.json")
+        [collected] = index.discover(self.directory, StormTest, lambda cls: cls.collect_test_methods())
+        index.save()
+        return collected
+
+    def test_unchanged_files_not_imported(self):
+        self.discover()
+        self.discover()
+        self.assertNotIn("derived_test", sys.modules)
+
+    def test_base_class_module_change_collects_again(self):
+        self.assertEqual(len(self.discover().methods), 2)
+        with open(self.directory / "base_suite.py", "a") as f:
+            f.write(textwrap.indent("\n@test_case\ndef added(self):\n    pass\n", "    "))
+        collected = self.discover()
+        self.assertEqual(len(collected.methods), 3)
+        self.assertIn("derived_test", sys.modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
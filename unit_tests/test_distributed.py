@@ -0,0 +1,40 @@
+import threading
+import unittest
+
+from storm_test.storm import StormTest, StormTestResult, multiprocess_runner, stream_test_case
+from storm_test.storm_distributed import StormDistributedPool, StormLocalBroker, StormRemoteWorker
+from storm_test.storm_rows import StormIterRows
+
+
+class StreamedRowsTest(StormTest):
+    @stream_test_case(StormIterRows(lambda: iter(range(5)), batch_size=5))
+    def rows(self, row):
+        assert row != 3, f"row {row} failed"
+
+
+class TestDistributedStreamedRows(unittest.TestCase):
+    def setUp(self):
+        self.broker = StormLocalBroker()
+        self.worker = StormRemoteWorker(self.broker, backend="thread", max_workers=1, heartbeat_interval=0.1)
+        self.worker_thread = threading.Thread(target=self.worker.run, daemon=True)
+        self.worker_thread.start()
+
+    def tearDown(self):
+        self.worker.stop()
+        self.worker_thread.join(timeout=10)
+
+    def test_failed_row_is_reported(self):
+        pool = StormDistributedPool(self.broker, max_workers=1, heartbeat_timeout=5)
+        [class_result] = multiprocess_runner([StreamedRowsTest], pool=pool)
+        statuses = {test_object.name: test_object.status for test_object in class_result.test_object}
+        self.assertEqual(len(statuses), 5)
+        self.assertEqual(statuses["rows 3"], StormTestResult.FAIL)
+        self.assertEqual(
+            [name for name, status in statuses.items() if status == StormTestResult.PASS],
+            ["rows 0", "rows 1", "rows 2", "rows 4"],
+        )
+        self.assertEqual(class_result.test_status, StormTestResult.FAIL)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+from storm_test.storm_gherkin import StormStepRegistry
+
+
+class TestStepRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = StormStepRegistry([
+            ("GIVEN", "an empty cart", "empty"),
+            ("WHEN", "I add {count:d} {item:w}", "add"),
+            ("WHEN", "I add {count:d} apples", "apples"),
+        ])
+
+    def test_match(self):
+        self.assertEqual(self.registry.match("GIVEN", "an empty cart"), ("empty", {}))
+        self.assertEqual(self.registry.match("WHEN", "I add 3 apples"), ("add", {"count": 3, "item": "apples"}))
+        self.assertIsNone(self.registry.match("GIVEN", "I add 3 apples"))
+
+    def test_remembered_matches_bounded(self):
+        registry = StormStepRegistry([("WHEN", "I add {count:d} {item:w}", "add")])
+        for count in range(2 * StormStepRegistry.match_cache_size):
+            self.assertEqual(registry.match("WHEN", f"I add {count} pears"), ("add", {"count": count, "item": "pears"}))
+        self.assertEqual(registry._cached_match.cache_info().currsize, StormStepRegistry.match_cache_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
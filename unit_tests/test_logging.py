@@ -0,0 +1,63 @@
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from storm_test.storm import StormTest, StormTestRunner, StormTestSuite, test_case
+from storm_test.storm_logging import StormLogConfig, StormLogListener
+
+
+class LoggedTest(StormTest):
+    @test_case
+    def logs(self):
+        pass
+
+
+class TestRunnerLogListener(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log_path = Path(directory.name) / "storm_test.log"
+        self.runner = StormTestRunner(
+            test_suites=[StormTestSuite(name="logged", tests=[LoggedTest])],
+            backend="inline",
+            log_config=StormLogConfig(path=self.log_path),
+        )
+        self.addCleanup(self.runner.log_listener.stop)
+
+    def test_started_by_run_tests(self):
+        self.assertFalse(self.runner.log_listener.started)
+        self.runner.run_tests()
+        self.assertFalse(self.runner.log_listener.started)
+        self.assertIn("Finished test run", self.log_path.read_text())
+
+    def test_stopped_when_the_run_fails(self):
+        with mock.patch.object(self.runner, "run_suite", side_effect=RuntimeError("broken suite")):
+            with self.assertRaises(RuntimeError):
+                self.runner.run_tests()
+        self.assertFalse(self.runner.log_listener.started)
+        self.assertIn("Starting test run", self.log_path.read_text())
+
+
+class TestLogListener(unittest.TestCase):
+    def test_records_prepared_when_logged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = Path(directory) / "storm_test.log"
+            with StormLogListener(StormLogConfig(path=log_path)):
+                logger = logging.getLogger("unit_tests.test_logging")
+                rows = ["first"]
+                logger.info("Rows %s", rows)
+                rows.append("second")
+                try:
+                    raise ValueError("broken row")
+                except ValueError:
+                    logger.exception("Row failed")
+            log = log_path.read_text()
+        self.assertIn("Rows ['first']\n", log)
+        self.assertIn("Row failed\nTraceback (most recent call last):", log)
+        self.assertIn("ValueError: broken row", log)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from storm_test.storm import StormTest, StormTestResult, multiprocess_runner, stream_test_case, test_case
+from storm_test.storm_memory import StormMemoryPolicy
+from storm_test.storm_rows import StormIterRows
+from storm_test.storm_timings import StormTimingCache
+
+# Kept alive by the worker process, so it grows past the recycle limit
+_GROWTH = []
+_RECYCLE_AFTER = 40_000_000
+
+
+def _grow():
+    _GROWTH.append(b"x" * (_RECYCLE_AFTER + 10_000_000))
+
+
+class RecycledMethodsTest(StormTest):
+    # Async, so b_sync is taken and deferred before the worker recycles
+    @test_case
+    async def a_grow(self):
+        _grow()
+
+    @test_case
+    def b_sync(self):
+        pass
+
+    @test_case
+    def c_sync(self):
+        pass
+
+    @test_case
+    def d_sync(self):
+        pass
+
+
+class RecycledRowsTest(StormTest):
+    @stream_test_case(StormIterRows(lambda: iter(range(4)), batch_size=4))
+    def rows(self, row):
+        if row == 0:
+            _grow()
+
+
+class RecycledLastRowTest(StormTest):
+    @stream_test_case(StormIterRows(lambda: iter(range(4)), batch_size=4))
+    def rows(self, row):
+        if row == 3:
+            _grow()
+
+    @test_case
+    def after(self):
+        pass
+
+
+class TestRecycle(unittest.TestCase):
+    def run_recycled(self, test_class):
+        with tempfile.TemporaryDirectory() as directory:
+            [class_result] = multiprocess_runner(
+                [test_class],
+                max_workers=1,
+                timings=StormTimingCache(Path(directory) / "timings.json"),
+                memory=StormMemoryPolicy(recycle_after=_RECYCLE_AFTER),
+            )
+        return class_result
+
+    def test_queued_methods_run_after_recycle(self):
+        class_result = self.run_recycled(RecycledMethodsTest)
+        self.assertEqual(
+            sorted((test_object.name, test_object.status) for test_object in class_result.test_object),
+            [(name, StormTestResult.PASS) for name in ("a grow", "b sync", "c sync", "d sync")],
+        )
+
+    def test_rows_run_after_recycle(self):
+        class_result = self.run_recycled(RecycledRowsTest)
+        self.assertEqual(
+            sorted((test_object.name, test_object.status) for test_object in class_result.test_object),
+            [(f"rows {row}", StormTestResult.PASS) for row in range(4)],
+        )
+        self.assertEqual(class_result.test_status, StormTestResult.PASS)
+
+    def test_batch_done_when_last_row_recycles(self):
+        class_result = self.run_recycled(RecycledLastRowTest)
+        self.assertEqual(
+            sorted((test_object.name, test_object.status) for test_object in class_result.test_object),
+            [("after", StormTestResult.PASS)] + [(f"rows {row}", StormTestResult.PASS) for row in range(4)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from storm_test.storm import StormTest, StormTestResult, multiprocess_runner, stream_test_case, test_case
+from storm_test.storm_rows import StormIterRows
+from storm_test.storm_timings import StormTimingCache
+
+
+class HangingSetUpTest(StormTest):
+    timeout = 1
+
+    def set_up(self):
+        time.sleep(60)
+
+    @test_case
+    def first(self):
+        pass
+
+    @test_case
+    def second(self):
+        pass
+
+    @test_case
+    def third(self):
+        pass
+
+    @stream_test_case(StormIterRows(lambda: iter(range(3)), batch_size=3))
+    def rows(self, row):
+        pass
+
+
+class TestSetUpTimeout(unittest.TestCase):
+    def run_hanging(self, max_workers: int):
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.monotonic()
+            [class_result] = multiprocess_runner(
+                [HangingSetUpTest],
+                max_workers=max_workers,
+                timings=StormTimingCache(Path(directory) / "timings.json"),
+            )
+            elapsed = time.monotonic() - start
+        return class_result, elapsed
+
+    def assert_broken(self, class_result):
+        self.assertEqual(
+            sorted((test_object.name, test_object.status) for test_object in class_result.test_object),
+            [(name, StormTestResult.FAIL) for name in ("first", "rows rows 0-2", "second", "third")],
+        )
+        self.assertEqual(
+            {test_object.error for test_object in class_result.test_object},
+            {"Class set_up timed out after 1s"},
+        )
+        self.assertEqual(class_result.test_status, StormTestResult.FAIL)
+
+    def test_class_set_up_once(self):
+        class_result, elapsed = self.run_hanging(max_workers=1)
+        self.assert_broken(class_result)
+        self.assertLess(elapsed, 10)
+
+    def test_class_broken_for_every_worker(self):
+        class_result, elapsed = self.run_hanging(max_workers=3)
+        self.assert_broken(class_result)
+        self.assertLess(elapsed, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()